@@ -0,0 +1,58 @@
+"""
+ASGI entry point for SERVE_MODE=asgi: `gunicorn -c gunicorn.conf.py` serves asgi:app.
+
+asgiref's WsgiToAsgi runs the WSGI app through sync_to_async with
+thread_sensitive=True, which funnels every request of a process through one
+thread. ThreadPoolBridge keeps its message handling but runs each request on
+a thread pool sized like the gthread mode (serving.thread_count()).
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import SyncToAsync
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from serving import thread_count
+
+# The undecorated body of WsgiToAsgiInstance.run_wsgi_app
+_run_wsgi_app = WsgiToAsgiInstance.__dict__['run_wsgi_app'].func
+
+
+class _BridgedInstance(WsgiToAsgiInstance):
+    def __init__(self, wsgi_application, executor: ThreadPoolExecutor):
+        super().__init__(wsgi_application)
+        self.executor = executor
+
+    async def run_wsgi_app(self, body):
+        await SyncToAsync(_run_wsgi_app, thread_sensitive=False, executor=self.executor)(self, body)
+
+
+class ThreadPoolBridge(WsgiToAsgi):
+    """ASGI application running a WSGI application on a bounded thread pool."""
+
+    def __init__(self, wsgi_application, threads: int):
+        super().__init__(wsgi_application)
+        self.threads = threads
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    async def __call__(self, scope, receive, send):
+        await _BridgedInstance(self.wsgi_application, self.executor())(scope, receive, send)
+
+    def executor(self) -> ThreadPoolExecutor:
+        # Created in the worker process; thread pools do not survive fork
+        if self._executor is None or self._pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='wsgi-bridge')
+                    self._pid = os.getpid()
+        return self._executor
+
+    def shutdown(self) -> None:
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=True)
+
+
+from server import flask_app  # noqa: E402
+
+app = ThreadPoolBridge(flask_app, threads=thread_count())
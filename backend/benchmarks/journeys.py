@@ -0,0 +1,426 @@
+"""
+Load test the main user journeys against a synthetic dataset at scale and
+compare the results with a stored baseline.
+
+  login             POST /api/auth/login (real bcrypt checks)
+  coach_dashboard   coach profile, client roster, plan list, one client's progress
+  user_plan         the client's training plan and progress history
+  progress_logging  POST /api/user/progress
+  admin_audit_logs  newest audit entries, unfiltered and filtered by action
+
+The dataset has `--coaches` coaches with `--clients` clients each, plans
+with `--exercises` exercises, `--history-days` of progress records and body
+metrics per client, and `--audit-rows` audit entries. It is seeded once,
+with bulk inserts and a fixed random seed, on the first run against an
+empty database. Every virtual user picks journeys by `--mix` weight from
+its own seeded random stream, so runs are repeatable.
+
+Run from backend/, either starting gunicorn itself (like serve_modes.py)
+or against a running server:
+
+    python benchmarks/journeys.py --coaches 20 --clients 25 --audit-rows 2000000 \\
+        --concurrency 32 --duration 60 --save-baseline benchmarks/results/baseline.json
+    python benchmarks/journeys.py --concurrency 32 --duration 60 \\
+        --baseline benchmarks/results/baseline.json
+
+With --baseline the run exits with status 1 when any request's p50, p95
+or p99 latency is more than --tolerance slower than the baseline's, or
+throughput is that much lower. Baselines only compare runs made on the
+same hardware against the same dataset and settings; the dataset and
+settings are stored with the results and a mismatch is reported.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import subprocess
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.serve_modes import (  # noqa: E402
+    SEED_EMAIL_DOMAIN, mint_tokens, start_server, stop_server, summarize
+)
+
+PASSWORD = 'journey-benchmark'
+ADMIN_EMAIL = f'journey-admin@{SEED_EMAIL_DOMAIN}'
+JOURNEYS = ('login', 'coach_dashboard', 'user_plan', 'progress_logging', 'admin_audit_logs')
+DEFAULT_MIX = 'login=1,coach_dashboard=3,user_plan=6,progress_logging=3,admin_audit_logs=1'
+BATCH_SIZE = 10000
+# Latency changes smaller than this are noise, whatever the percentage
+NOISE_FLOOR_MS = 2.0
+
+
+def coach_email(coach: int) -> str:
+    return f'journey-coach-{coach}@{SEED_EMAIL_DOMAIN}'
+
+
+def client_email(coach: int, client: int) -> str:
+    return f'journey-client-{coach}-{client}@{SEED_EMAIL_DOMAIN}'
+
+
+def _insert(model, rows):
+    from sqlalchemy import insert
+    from database import db
+
+    for start in range(0, len(rows), BATCH_SIZE):
+        db.session.execute(insert(model), rows[start:start + BATCH_SIZE])
+
+
+def seed(args):
+    """Create the dataset unless the first coach already exists."""
+    from server import flask_app
+    from database import db, create_schema
+    from models.user import User, UserProfile, CoachProfile, CoachClient, UserTrainingPlan
+    from models.training_plan import TrainingPlan, PlanExercise
+    from models.progress_tracking import ProgressTracking
+    from models.body_metrics import BodyMetrics
+    from models.audit_log import AuditLog
+    from services.password_service import password_service
+    from services.progress_rollup_service import ProgressRollupService
+
+    create_schema(flask_app)
+    with flask_app.app_context():
+        if User.query.filter_by(email=coach_email(0)).first() is not None:
+            print("Dataset already seeded; drop it to seed with other sizes")
+            return
+
+        started = time.perf_counter()
+        rng = random.Random(args.seed)
+        now = datetime.utcnow()
+        history_start = now - timedelta(days=args.history_days)
+        # One hash for everyone; logins still pay for a full bcrypt check
+        password_hash = password_service.hash(PASSWORD)
+
+        admin = User(email=ADMIN_EMAIL, first_name='Journey', last_name='Admin', user_type='admin',
+                     password_hash=password_hash)
+        db.session.add(admin)
+        clients_by_coach = {}
+        for coach_index in range(args.coaches):
+            coach = User(email=coach_email(coach_index), first_name='Journey', last_name=f'Coach {coach_index}',
+                         user_type='coach', password_hash=password_hash)
+            clients = [
+                User(email=client_email(coach_index, client_index), first_name='Journey',
+                     last_name=f'Client {coach_index}-{client_index}', user_type='user', password_hash=password_hash)
+                for client_index in range(args.clients)
+            ]
+            db.session.add_all([coach] + clients)
+            clients_by_coach[coach] = clients
+        db.session.flush()
+
+        profiles, plans = {}, {}
+        for coach in clients_by_coach:
+            profiles[coach] = CoachProfile(user_id=coach.user_id, specializations='Strength', experience_years=5)
+            plans[coach] = [
+                TrainingPlan(coach_id=coach.user_id, title=f'{coach.last_name} block {p}', description='Periodized block',
+                             difficulty_level='intermediate', duration_weeks=12, training_frequency=4,
+                             training_objective='Strength', focus_areas='Full body', exercise_types='Compound')
+                for p in range(args.plans)
+            ]
+            db.session.add(profiles[coach])
+            db.session.add_all(plans[coach])
+        db.session.flush()
+
+        exercises_per_day = 5
+        _insert(PlanExercise, [
+            {'plan_id': plan.plan_id, 'name': f'Exercise {i}', 'description': 'Controlled tempo, full range of motion.',
+             'sets': '4', 'reps': '8-10', 'intensity': 'RPE 8', 'rest_period': '90s',
+             'week_number': i // (exercises_per_day * 4) + 1, 'day_number': i // exercises_per_day % 4 + 1,
+             'order_in_day': i % exercises_per_day}
+            for coach_plans in plans.values() for plan in coach_plans for i in range(args.exercises)
+        ])
+        exercise_ids = defaultdict(list)
+        for exercise_id, plan_id in db.session.query(PlanExercise.exercise_id, PlanExercise.plan_id):
+            exercise_ids[plan_id].append(exercise_id)
+
+        assignments, relations, user_profiles, progress, metrics = [], [], [], [], []
+        for coach, clients in clients_by_coach.items():
+            for client in clients:
+                plan = rng.choice(plans[coach])
+                user_profiles.append({'user_id': client.user_id, 'height': rng.randint(155, 200),
+                                      'weight': rng.randint(50, 110), 'fitness_level': 'intermediate'})
+                relations.append({'coach_id': profiles[coach].profile_id, 'client_id': client.user_id,
+                                  'status': 'active', 'assigned_at': history_start})
+                assignments.append({'user_id': client.user_id, 'plan_id': plan.plan_id,
+                                    'start_date': history_start, 'status': 'in_progress'})
+                weight = rng.uniform(60, 100)
+                for day in range(args.history_days):
+                    date = history_start + timedelta(days=day, hours=rng.randint(6, 20))
+                    if day % args.log_every == 0:
+                        progress.append({
+                            'user_id': client.user_id, 'exercise_id': rng.choice(exercise_ids[plan.plan_id]),
+                            'date': date, 'sets_completed': 4, 'reps_completed': rng.randint(6, 12),
+                            'weight_used': rng.randint(20, 160), 'rating': rng.randint(1, 5)
+                        })
+                    if day % 7 == 0:
+                        weight += rng.uniform(-0.6, 0.5)
+                        metrics.append({'user_id': client.user_id, 'date': date, 'weight': round(weight, 2),
+                                        'body_fat': round(rng.uniform(10, 30), 2)})
+        _insert(UserProfile, user_profiles)
+        _insert(CoachClient, relations)
+        _insert(UserTrainingPlan, assignments)
+        _insert(ProgressTracking, progress)
+        _insert(BodyMetrics, metrics)
+        db.session.commit()
+
+        user_ids = [admin.user_id] + [user.user_id for coach, clients in clients_by_coach.items() for user in [coach] + clients]
+        actions = [('update', 'user'), ('update', 'training_plan'), ('create', 'training_plan'),
+                   ('update', 'coach_profile'), ('delete', 'training_plan'), ('logout', 'user')]
+        span = args.history_days * 86400
+        for start in range(0, args.audit_rows, BATCH_SIZE):
+            rows = []
+            for _ in range(min(BATCH_SIZE, args.audit_rows - start)):
+                action, entity_type = rng.choice(actions)
+                rows.append({
+                    'user_id': rng.choice(user_ids), 'action': action, 'entity_type': entity_type,
+                    'entity_id': rng.randint(1, 10000), 'details': f'{action} {entity_type}',
+                    'ip_address': '10.0.0.1', 'user_agent': 'journey-benchmark',
+                    'created_at': history_start + timedelta(seconds=rng.randint(0, span))
+                })
+            _insert(AuditLog, rows)
+            db.session.commit()
+
+        # Bulk inserts skip the flush hooks that keep rollups current
+        ProgressRollupService(db.session).rebuild()
+        print(f"Seeded {len(user_ids)} users, {sum(len(ids) for ids in exercise_ids.values())} exercises, "
+              f"{len(progress)} progress records, {len(metrics)} body metrics and {args.audit_rows} audit entries "
+              f"in {time.perf_counter() - started:.0f}s")
+
+
+def load_actors():
+    """Ids of the seeded coaches and clients, with each coach's profile and clients and each client's exercises."""
+    from server import flask_app
+    from database import db
+    from models.user import User, CoachProfile, CoachClient, UserTrainingPlan
+    from models.training_plan import PlanExercise
+
+    with flask_app.app_context():
+        admin = User.query.filter_by(email=ADMIN_EMAIL).one()
+        coaches = User.query.filter(User.email.like(f'journey-coach-%@{SEED_EMAIL_DOMAIN}')).all()
+        roster = defaultdict(list)
+        for coach_id, client_id in db.session.query(CoachProfile.user_id, CoachClient.client_id)\
+                .join(CoachClient, CoachClient.coach_id == CoachProfile.profile_id):
+            roster[coach_id].append(client_id)
+        exercises = defaultdict(list)
+        for user_id, exercise_id in db.session.query(UserTrainingPlan.user_id, PlanExercise.exercise_id)\
+                .join(PlanExercise, PlanExercise.plan_id == UserTrainingPlan.plan_id):
+            exercises[user_id].append(exercise_id)
+        clients = {
+            user.user_id: user.email
+            for user in User.query.filter(User.email.like(f'journey-client-%@{SEED_EMAIL_DOMAIN}')).all()
+        }
+        return {
+            'admin': admin.user_id,
+            'coaches': {coach.user_id: roster[coach.user_id] for coach in coaches},
+            'clients': clients,
+            'exercises': dict(exercises)
+        }
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name not in JOURNEYS:
+            raise SystemExit(f"Unknown journey {name}; choose from {', '.join(JOURNEYS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def journey_steps(name, rng, actors, tokens):
+    """(step, method, path, token, body) for one run of a journey by a randomly picked user."""
+    if name == 'login':
+        email = rng.choice(list(actors['clients'].values()))
+        return [('login', 'POST', '/api/auth/login', None, {'email': email, 'password': PASSWORD})]
+    if name == 'coach_dashboard':
+        coach_id = rng.choice(list(actors['coaches']))
+        token = tokens[coach_id]
+        client_id = rng.choice(actors['coaches'][coach_id])
+        return [
+            ('profile', 'GET', '/api/coach/profile', token, None),
+            ('clients', 'GET', '/api/coach/clients', token, None),
+            ('plans', 'GET', '/api/training-plans', token, None),
+            ('client_progress', 'GET', f'/api/coach/clients/{client_id}/progress', token, None)
+        ]
+    if name == 'user_plan':
+        client_id = rng.choice(list(actors['clients']))
+        return [
+            ('training_plan', 'GET', '/api/user/training-plan', tokens[client_id], None),
+            ('progress', 'GET', '/api/user/progress', tokens[client_id], None)
+        ]
+    if name == 'progress_logging':
+        client_id = rng.choice(list(actors['clients']))
+        body = {'exercise_id': rng.choice(actors['exercises'][client_id]), 'sets_completed': 4,
+                'reps_completed': rng.randint(6, 12), 'weight_used': rng.randint(20, 160), 'rating': rng.randint(1, 5)}
+        return [('log', 'POST', '/api/user/progress', tokens[client_id], body)]
+    token = tokens[actors['admin']]
+    return [
+        ('latest', 'GET', '/api/admin/audit-logs?per_page=50&count=none', token, None),
+        ('by_action', 'GET', '/api/admin/audit-logs?per_page=50&count=none&action=update', token, None)
+    ]
+
+
+async def drive(base_url, actors, tokens, mix, concurrency, duration, warmup, seed):
+    samples = []
+    errors = defaultdict(int)
+    completed = defaultdict(int)
+    names, weights = list(mix), list(mix.values())
+    started = time.perf_counter()
+    measure_from = started + warmup
+    deadline = measure_from + duration
+
+    async def run(client, user):
+        rng = random.Random(seed * 1000 + user)
+        while time.perf_counter() < deadline:
+            journey = rng.choices(names, weights)[0]
+            journey_started = time.perf_counter()
+            for step, method, path, token, body in journey_steps(journey, rng, actors, tokens):
+                name = f'{journey}.{step}'
+                headers = {'Authorization': f'Bearer {token}'} if token else {}
+                sent = time.perf_counter()
+                try:
+                    response = await client.request(method, path, headers=headers, json=body)
+                    status = response.status_code
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                if sent >= measure_from:
+                    samples.append((name, time.perf_counter() - sent))
+                    if status not in (200, 201):
+                        errors[f'{name}:{status}'] += 1
+            if journey_started >= measure_from:
+                completed[journey] += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        await asyncio.gather(*(run(client, user) for user in range(concurrency)))
+    return samples, dict(errors), dict(completed)
+
+
+def compare(results, baseline, tolerance):
+    """Print the change from the baseline per request and return the regressions."""
+    regressions = []
+    if results['settings'] != baseline.get('settings'):
+        print("warning: the baseline was recorded with other settings or dataset sizes:")
+        print(f"  baseline {baseline.get('settings')}\n  current  {results['settings']}")
+
+    old, new = baseline['throughput_rps'], results['throughput_rps']
+    print(f"\n{'throughput':34} {old:>10} {new:>10} req/s  {(new - old) / old * 100 if old else 0:+7.1f}%")
+    if old and new < old * (1 - tolerance):
+        regressions.append(f"throughput fell from {old} to {new} req/s")
+
+    print(f"{'request':34} {'base p95':>10} {'p95':>10}       change")
+    for name, current in results['endpoints'].items():
+        previous = baseline['endpoints'].get(name)
+        if previous is None:
+            print(f"{name:34} {'-':>10} {current['p95_ms']:>10}ms  (new)")
+            continue
+        change = (current['p95_ms'] - previous['p95_ms']) / previous['p95_ms'] * 100 if previous['p95_ms'] else 0.0
+        print(f"{name:34} {previous['p95_ms']:>10} {current['p95_ms']:>10}ms  {change:+7.1f}%")
+        for key in ('p50_ms', 'p95_ms', 'p99_ms'):
+            if current[key] > previous[key] * (1 + tolerance) and current[key] - previous[key] > NOISE_FLOOR_MS:
+                regressions.append(f"{name} {key[:3]} rose from {previous[key]}ms to {current[key]}ms")
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    dataset = parser.add_argument_group('dataset (seeded once)')
+    dataset.add_argument('--coaches', type=int, default=10)
+    dataset.add_argument('--clients', type=int, default=20, help='Clients per coach')
+    dataset.add_argument('--plans', type=int, default=2, help='Training plans per coach')
+    dataset.add_argument('--exercises', type=int, default=300, help='Exercises per training plan')
+    dataset.add_argument('--history-days', type=int, default=730, help='Days of progress and body metrics per client')
+    dataset.add_argument('--log-every', type=int, default=2, help='Days between progress records')
+    dataset.add_argument('--audit-rows', type=int, default=1000000)
+    dataset.add_argument('--seed', type=int, default=42, help='Random seed for the dataset and the request stream')
+
+    load = parser.add_argument_group('load')
+    load.add_argument('--mix', default=DEFAULT_MIX, help='Journey weights, e.g. user_plan=6,login=1')
+    load.add_argument('--concurrency', type=int, default=16, help='Virtual users')
+    load.add_argument('--duration', type=float, default=30.0, help='Measured seconds')
+    load.add_argument('--warmup', type=float, default=5.0, help='Unmeasured seconds before measuring')
+    load.add_argument('--base-url', help='Drive a running server instead of starting gunicorn')
+    load.add_argument('--mode', default='wsgi', choices=['wsgi', 'asgi'], help='Serving mode when starting gunicorn')
+    load.add_argument('--port', type=int, default=8899)
+
+    report = parser.add_argument_group('results')
+    report.add_argument('--output', help='Write the results as JSON to this file')
+    report.add_argument('--baseline', help='Compare with results saved by --save-baseline')
+    report.add_argument('--tolerance', type=float, default=0.10, help='Allowed slowdown before failing (0.10 = 10%%)')
+    report.add_argument('--save-baseline', help='Write the results to this file as the new baseline')
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    seed(args)
+    actors = load_actors()
+    tokens = mint_tokens([actors['admin']] + list(actors['coaches']) + list(actors['clients']))
+
+    process = None
+    base_url = args.base_url
+    if base_url is None:
+        process = start_server(args.mode, args.port, dict(os.environ, AUDIT_SINK=os.getenv('AUDIT_SINK', 'batched')))
+        base_url = f'http://127.0.0.1:{args.port}'
+    try:
+        samples, errors, completed = asyncio.run(drive(
+            base_url, actors, tokens, mix, args.concurrency, args.duration, args.warmup, args.seed
+        ))
+    finally:
+        if process is not None:
+            stop_server(process)
+
+    results = {
+        'recorded_at': datetime.utcnow().isoformat(),
+        'revision': git_revision(),
+        'host': platform.node(),
+        'settings': {
+            'coaches': args.coaches, 'clients': args.clients, 'plans': args.plans, 'exercises': args.exercises,
+            'history_days': args.history_days, 'log_every': args.log_every, 'audit_rows': args.audit_rows,
+            'seed': args.seed, 'mix': mix, 'concurrency': args.concurrency, 'duration': args.duration,
+            'mode': args.mode if args.base_url is None else 'external'
+        },
+        'journeys_completed': completed,
+        **summarize(samples, errors, args.duration)
+    }
+    print(f"{results['throughput_rps']} req/s  p50 {results['p50_ms']}ms  p95 {results['p95_ms']}ms  "
+          f"p99 {results['p99_ms']}ms  errors {sum(errors.values())}")
+    for name, stats in results['endpoints'].items():
+        print(f"  {name:32} {stats['requests']:>7}  p50 {stats['p50_ms']:>8}ms  p95 {stats['p95_ms']:>8}ms  "
+              f"p99 {stats['p99_ms']:>8}ms")
+    for name, count in sorted(errors.items()):
+        print(f"  error {name}: {count}")
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, 'w') as output_file:
+                json.dump(results, output_file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.tolerance:.0%}")
+
+
+if __name__ == '__main__':
+    main()
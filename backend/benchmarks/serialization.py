@@ -0,0 +1,165 @@
+"""
+Compare response serialization before and after the serializer registry on
+the large admin payloads (GET /api/admin/training-plans and
+GET /api/admin/meal-plans).
+
+  legacy    model.to_dict() rendered with Flask's stdlib json provider
+  compiled  the registered serializers rendered with orjson
+
+Both paths serialize the same preloaded objects, so the numbers measure only
+building the dicts and encoding them. The endpoints are then timed end to end
+through the test client. Run from backend/:
+
+    python benchmarks/serialization.py --plans 200 --exercises 60 --meals 42
+
+Data comes from the usual DATABASE_SWITCH / SQLITE_PATH / POSTGRES_* settings
+and is seeded on the first run.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.serve_modes import SEED_EMAIL_DOMAIN, percentile  # noqa: E402
+
+COACH_EMAIL = f'serialization-coach@{SEED_EMAIL_DOMAIN}'
+ADMIN_EMAIL = f'serialization-admin@{SEED_EMAIL_DOMAIN}'
+
+
+def seed(plans: int, exercises: int, meals: int):
+    """Create `plans` training plans and as many meal plans under one coach, unless already seeded."""
+    from server import flask_app
+    from database import db, create_schema
+    from models.user import User
+    from models.training_plan import TrainingPlan, PlanExercise
+    from models.meal_plan import MealPlan, Meal
+
+    create_schema(flask_app)
+    with flask_app.app_context():
+        if User.query.filter_by(email=COACH_EMAIL).first() is not None:
+            return
+        coach = User(email=COACH_EMAIL, first_name='Bench', last_name='Coach', user_type='coach', password_hash='!')
+        admin = User(email=ADMIN_EMAIL, first_name='Bench', last_name='Admin', user_type='admin', password_hash='!')
+        db.session.add_all([coach, admin])
+        db.session.flush()
+        now = datetime.utcnow()
+        for p in range(plans):
+            plan = TrainingPlan(coach_id=coach.user_id, title=f'Plan {p}', description='Strength block ' * 8,
+                                difficulty_level='intermediate', duration_weeks=12, training_frequency=4,
+                                training_objective='Hypertrophy', focus_areas='Legs, Back', exercise_types='Compound')
+            plan.exercises = [
+                PlanExercise(name=f'Exercise {i}', description='Controlled tempo, full range of motion.',
+                             sets='4', reps='8-10', intensity='RPE 8', rest_period='90s',
+                             week_number=i // 12 + 1, day_number=i // 3 % 4 + 1, order_in_day=i % 3)
+                for i in range(exercises)
+            ]
+            meal_plan = MealPlan(coach_id=coach.user_id, name=f'Meal plan {p}', description='Lean bulk',
+                                 total_calories=2800, total_protein=180, total_carbs=320, total_fats=80, updated_at=now)
+            meal_plan.meals = [
+                Meal(name=f'Meal {i}', description='Chicken, rice and vegetables',
+                     ingredients='200g chicken breast, 150g rice, 100g broccoli',
+                     cooking_instructions='Grill the chicken, steam the rest.', calories=650,
+                     protein=45, carbs=70, fats=15, meal_type='lunch', day_of_week=f'day {i % 7}', updated_at=now)
+                for i in range(meals)
+            ]
+            db.session.add_all([plan, meal_plan])
+        db.session.commit()
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def report(name, samples):
+    print(f"  {name:28} median {statistics.median(samples):9.2f}ms  p95 {percentile(samples, 95):9.2f}ms")
+    return {'median_ms': round(statistics.median(samples), 3), 'p95_ms': round(percentile(samples, 95), 3)}
+
+
+def compare_in_process(repeat):
+    from flask.json.provider import DefaultJSONProvider
+    from sqlalchemy.orm import selectinload, joinedload
+    from server import flask_app
+    from models.training_plan import TrainingPlan
+    from models.meal_plan import MealPlan
+    from serialization import serialize, dumps
+
+    stdlib = DefaultJSONProvider(flask_app)
+    results = {}
+    with flask_app.app_context():
+        payloads = {
+            'training_plans': TrainingPlan.query.options(
+                selectinload(TrainingPlan.exercises), joinedload(TrainingPlan.coach)
+            ).all(),
+            'meal_plans': MealPlan.query.options(selectinload(MealPlan.meals), joinedload(MealPlan.coach)).all()
+        }
+        for name, objects in payloads.items():
+            legacy = json.loads(stdlib.dumps([obj.to_dict() for obj in objects]))
+            compiled = json.loads(dumps(serialize(objects)))
+            assert legacy == compiled, f"{name}: compiled serializer output differs from to_dict()"
+
+            size = len(dumps(serialize(objects)))
+            print(f"{name}: {len(objects)} objects, {size / 1024:.0f} KiB")
+            results[name] = {
+                'objects': len(objects),
+                'bytes': size,
+                'legacy_build': report('to_dict()', timed(lambda: [obj.to_dict() for obj in objects], repeat)),
+                'compiled_build': report('compiled serializer', timed(lambda: serialize(objects), repeat)),
+                'legacy_total': report('to_dict() + json', timed(
+                    lambda: stdlib.dumps([obj.to_dict() for obj in objects]), repeat)),
+                'compiled_total': report('compiled + orjson', timed(lambda: dumps(serialize(objects)), repeat))
+            }
+            speedup = results[name]['legacy_total']['median_ms'] / results[name]['compiled_total']['median_ms']
+            results[name]['speedup'] = round(speedup, 2)
+            print(f"  speedup {speedup:.1f}x")
+    return results
+
+
+def time_endpoints(repeat):
+    from flask_jwt_extended import create_access_token
+    from server import flask_app
+    from models.user import User
+
+    with flask_app.app_context():
+        token = create_access_token(identity=User.query.filter_by(email=ADMIN_EMAIL).first().user_id)
+    headers = {'Authorization': f'Bearer {token}'}
+    client = flask_app.test_client()
+
+    results = {}
+    print("endpoints (queries included):")
+    for path in ('/api/admin/training-plans', '/api/admin/meal-plans',
+                 '/api/admin/training-plans?fields=plan_id,title,exercises.name'):
+        assert client.get(path, headers=headers).status_code == 200, path
+        results[path] = report(path.removeprefix('/api/admin/'), timed(lambda: client.get(path, headers=headers), repeat))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--plans', type=int, default=200)
+    parser.add_argument('--exercises', type=int, default=60, help='Exercises per training plan')
+    parser.add_argument('--meals', type=int, default=42, help='Meals per meal plan')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    args = parser.parse_args()
+
+    seed(args.plans, args.exercises, args.meals)
+    results = {'in_process': compare_in_process(args.repeat), 'endpoints': time_endpoints(max(3, args.repeat // 4))}
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
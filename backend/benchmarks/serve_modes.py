@@ -0,0 +1,250 @@
+"""
+Compare the wsgi (gthread) and asgi (uvicorn + thread-pool bridge) serving
+modes on real endpoints.
+
+For each mode this starts `gunicorn -c gunicorn.conf.py`, drives a fixed mix
+of authenticated GET requests at each concurrency level, and reports
+throughput and latency percentiles. Run from backend/:
+
+    python benchmarks/serve_modes.py --concurrency 8 32 64 --duration 20
+
+The database comes from the usual DATABASE_SWITCH / SQLITE_PATH / POSTGRES_*
+settings; a small dataset is seeded on the first run. Use a
+PostgreSQL database for numbers that mean anything: SQLite serializes writers
+and has no real connection pool.
+"""
+import os
+import sys
+import json
+import time
+import random
+import signal
+import asyncio
+import argparse
+import subprocess
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+SEED_EMAIL_DOMAIN = 'bench.train-sync.test'
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def seed(clients: int, exercises: int):
+    """Create a coach with `clients` clients on one plan, unless already seeded. Returns (coach_id, client_ids, admin_id)."""
+    from server import flask_app
+    from database import db, create_schema
+    from models.user import User, UserProfile, CoachProfile, CoachClient, UserTrainingPlan
+    from models.training_plan import TrainingPlan, PlanExercise
+    from models.progress_tracking import ProgressTracking
+
+    create_schema(flask_app)
+    with flask_app.app_context():
+        coach_email = f'coach@{SEED_EMAIL_DOMAIN}'
+        coach = User.query.filter_by(email=coach_email).first()
+        if coach is None:
+            # Password hashes are never checked; the benchmark mints tokens directly
+            coach = User(email=coach_email, first_name='Bench', last_name='Coach', user_type='coach', password_hash='!')
+            admin = User(email=f'admin@{SEED_EMAIL_DOMAIN}', first_name='Bench', last_name='Admin', user_type='admin', password_hash='!')
+            db.session.add_all([coach, admin])
+            db.session.flush()
+            profile = CoachProfile(user_id=coach.user_id)
+            plan = TrainingPlan(coach_id=coach.user_id, title='Benchmark plan', duration_weeks=12, training_frequency=3)
+            db.session.add_all([profile, plan])
+            db.session.flush()
+            db.session.add_all([
+                PlanExercise(plan_id=plan.plan_id, name=f'Exercise {i}', sets='3', reps='10',
+                             week_number=i // 9 + 1, day_number=i // 3 % 3 + 1, order_in_day=i % 3)
+                for i in range(exercises)
+            ])
+            db.session.flush()
+            exercise_ids = [exercise.exercise_id for exercise in plan.exercises]
+            start = datetime.utcnow() - timedelta(days=60)
+            for i in range(clients):
+                client = User(email=f'client{i}@{SEED_EMAIL_DOMAIN}', first_name='Bench', last_name=f'Client {i}',
+                              user_type='user', password_hash='!')
+                db.session.add(client)
+                db.session.flush()
+                db.session.add(UserProfile(user_id=client.user_id))
+                db.session.add(CoachClient(coach_id=profile.profile_id, client_id=client.user_id, status='active'))
+                db.session.add(UserTrainingPlan(user_id=client.user_id, plan_id=plan.plan_id, start_date=start))
+                for day in range(0, 60, 2):
+                    record = ProgressTracking(client.user_id, random.choice(exercise_ids), 3, 10, weight_used=random.randint(20, 120))
+                    record.date = start + timedelta(days=day)
+                    db.session.add(record)
+            db.session.commit()
+
+        admin = User.query.filter_by(email=f'admin@{SEED_EMAIL_DOMAIN}').first()
+        client_ids = [user.user_id for user in User.query.filter(User.email.like(f'client%@{SEED_EMAIL_DOMAIN}')).all()]
+        return coach.user_id, client_ids, admin.user_id
+
+
+def mint_tokens(user_ids):
+    from flask_jwt_extended import create_access_token
+    from server import flask_app
+    from database import db
+    from models.user import User
+    from services.token_versions import token_versions, build_token_claims
+
+    with flask_app.app_context():
+        tokens = {}
+        for user_id in user_ids:
+            user = db.session.get(User, user_id)
+            tokens[user_id] = create_access_token(
+                identity=user.user_id,
+                additional_claims=build_token_claims(user, token_versions.get(user.user_id))
+            )
+        return tokens
+
+
+def request_mix(coach_id, client_ids, admin_id, tokens):
+    """(name, path, token) triples, cycled by every client task."""
+    mix = [('health', '/health', None)]
+    for client_id in client_ids[:10]:
+        mix.append(('user_training_plan', '/api/user/training-plan', tokens[client_id]))
+        mix.append(('user_progress', '/api/user/progress', tokens[client_id]))
+    mix.append(('coach_clients', '/api/coach/clients', tokens[coach_id]))
+    mix.append(('coach_client_progress', f'/api/coach/clients/{client_ids[0]}/progress', tokens[coach_id]))
+    mix.append(('admin_audit_logs', '/api/admin/audit-logs?per_page=50&count=none', tokens[admin_id]))
+    return mix
+
+
+async def drive(base_url, mix, concurrency, duration, warmup):
+    samples = []
+    errors = defaultdict(int)
+    started = time.perf_counter()
+    measure_from = started + warmup
+    deadline = measure_from + duration
+
+    async def run(client, offset):
+        index = offset
+        while time.perf_counter() < deadline:
+            name, path, token = mix[index % len(mix)]
+            index += 1
+            headers = {'Authorization': f'Bearer {token}'} if token else {}
+            sent = time.perf_counter()
+            try:
+                response = await client.get(path, headers=headers)
+                status = response.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - sent
+            if sent >= measure_from:
+                samples.append((name, elapsed))
+                if status != 200:
+                    errors[f'{name}:{status}'] += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        await asyncio.gather(*(run(client, offset) for offset in range(concurrency)))
+    return samples, dict(errors)
+
+
+def summarize(samples, errors, duration):
+    by_endpoint = defaultdict(list)
+    for name, elapsed in samples:
+        by_endpoint[name].append(elapsed * 1000)
+    latencies = [elapsed * 1000 for _, elapsed in samples]
+
+    def stats(values):
+        return {
+            'requests': len(values),
+            'p50_ms': round(percentile(values, 50), 2),
+            'p95_ms': round(percentile(values, 95), 2),
+            'p99_ms': round(percentile(values, 99), 2)
+        }
+
+    return {
+        'throughput_rps': round(len(samples) / duration, 1),
+        'errors': errors,
+        **stats(latencies),
+        'endpoints': {name: stats(values) for name, values in sorted(by_endpoint.items())}
+    }
+
+
+def start_server(mode, port, env):
+    env = dict(env, SERVE_MODE=mode, PORT=str(port), ACCESS_LOG='')
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'],
+        cwd=BACKEND_DIR, env=env, start_new_session=True
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn ({mode}) exited with code {process.returncode}")
+        try:
+            if httpx.get(f'http://127.0.0.1:{port}/health', timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.25)
+    stop_server(process)
+    raise RuntimeError(f"gunicorn ({mode}) did not become healthy")
+
+
+def stop_server(process):
+    os.killpg(process.pid, signal.SIGTERM)
+    try:
+        process.wait(timeout=60)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', nargs='+', default=['wsgi', 'asgi'], choices=['wsgi', 'asgi'])
+    parser.add_argument('--concurrency', nargs='+', type=int, default=[8, 32, 64])
+    parser.add_argument('--duration', type=float, default=20.0, help='Measured seconds per run')
+    parser.add_argument('--warmup', type=float, default=3.0, help='Unmeasured seconds before each run')
+    parser.add_argument('--port', type=int, default=8899)
+    parser.add_argument('--workers', type=int, help='Override WORKERS for both modes')
+    parser.add_argument('--threads', type=int, help='Override THREADS for both modes')
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--exercises', type=int, default=36)
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    args = parser.parse_args()
+
+    env = dict(os.environ, AUDIT_SINK=os.getenv('AUDIT_SINK', 'batched'))
+    if args.workers:
+        env['WORKERS'] = str(args.workers)
+    if args.threads:
+        env['THREADS'] = str(args.threads)
+
+    coach_id, client_ids, admin_id = seed(args.clients, args.exercises)
+    tokens = mint_tokens([coach_id, admin_id] + client_ids[:10])
+    mix = request_mix(coach_id, client_ids, admin_id, tokens)
+
+    results = []
+    for mode in args.modes:
+        process = start_server(mode, args.port, env)
+        try:
+            for concurrency in args.concurrency:
+                samples, errors = asyncio.run(drive(
+                    f'http://127.0.0.1:{args.port}', mix, concurrency, args.duration, args.warmup
+                ))
+                result = {'mode': mode, 'concurrency': concurrency, **summarize(samples, errors, args.duration)}
+                results.append(result)
+                print(f"{mode:5} c={concurrency:<4} {result['throughput_rps']:>8} req/s  "
+                      f"p50 {result['p50_ms']:>8}ms  p95 {result['p95_ms']:>8}ms  p99 {result['p99_ms']:>8}ms  "
+                      f"errors {sum(errors.values())}", flush=True)
+        finally:
+            stop_server(process)
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,20 +1,34 @@
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import declarative_base
-from sqlalchemy import text
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool, QueuePool
+import logging
 import os
+from datetime import datetime, timezone
 from dotenv import load_dotenv
+from services.replica_routing import RoutingSession, REPLICA_BIND_PREFIX, replica_urls
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 
 # Base class for SQLAlchemy models
 Base = declarative_base()
 
-# Initialize SQLAlchemy
-db = SQLAlchemy(model_class=Base)
+# Initialize SQLAlchemy; the session can send reads of opted-in requests to a replica
+db = SQLAlchemy(model_class=Base, session_options={'class_': RoutingSession})
 
-# Database configuration
-def init_db(app):
+def utc_now():
+    """
+    The current UTC time to the microsecond, for updated_at columns that feed
+    ETags. The database's now() has one-second resolution on SQLite, so two
+    writes within a second would leave a resource's validators unchanged.
+    """
+    return datetime.now(timezone.utc)
+
+def database_uri():
+    """The database URI selected by DATABASE_SWITCH."""
     # Configure database based on environment variable
     db_switch = os.getenv("DATABASE_SWITCH", "sqlite").lower()
     
@@ -28,7 +42,7 @@ def init_db(app):
             pg_db = os.getenv('POSTGRES_DB')
             
             # Set the database URI
-            app.config["SQLALCHEMY_DATABASE_URI"] = (
+            return (
                 f"postgresql://{pg_user}:{pg_password}"
                 f"@{pg_host}:{pg_port}"
                 f"/{pg_db}"
@@ -39,26 +53,165 @@ def init_db(app):
             raise
     elif db_switch == "sqlite":
         try:
-            sqlite_path = os.getenv("SQLITE_PATH", "sqlite:///database.db")
-            app.config["SQLALCHEMY_DATABASE_URI"] = sqlite_path
+            return os.getenv("SQLITE_PATH", "sqlite:///database.db")
         except Exception as e:
             print(f"SQLite configuration error: {e}")
             raise
     else:
         raise ValueError(f"Unsupported database type: {db_switch}")
-    
+
+
+def pgbouncer_mode():
+    return os.getenv('DB_PGBOUNCER', 'false').lower() == 'true'
+
+
+def engine_options(uri):
+    """
+    SQLALCHEMY_ENGINE_OPTIONS for a database URI, from the DB_POOL_* environment variables.
+
+    Each gunicorn worker gets its own pool of DB_POOL_SIZE connections plus up
+    to DB_MAX_OVERFLOW temporary ones (serving.py sizes threads to match).
+    Connections are pinged before use and recycled after DB_POOL_RECYCLE
+    seconds, so a failover or idle timeout costs a reconnect rather than a
+    failed request.
+
+    With DB_PGBOUNCER=true the pooling is left to PgBouncer: every checkout
+    opens a fresh connection to it (NullPool), and psycopg 3 is told not to
+    prepare statements, which transaction pooling cannot route. psycopg2 never
+    uses server-side prepared statements.
+    """
+    if not uri.startswith('postgresql'):
+        # SQLite connections are local files; SQLAlchemy's defaults fit
+        return {}
+    if pgbouncer_mode():
+        options = {'poolclass': NullPool}
+        if uri.startswith('postgresql+psycopg:'):
+            options['connect_args'] = {'prepare_threshold': None}
+        return options
+    return {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', '5')),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', '10')),
+        'pool_timeout': float(os.getenv('DB_POOL_TIMEOUT', '30')),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', '1800')),
+        'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+    }
+
+
+def replica_engine_options(uri):
+    """
+    engine_options() for a read replica, which also gives up connecting after
+    DB_REPLICA_CONNECT_TIMEOUT seconds (default 2). Replica health is checked
+    on the request path, and an unreachable host would otherwise hold that
+    request for the OS connect timeout before reads fall back to the primary.
+    """
+    options = engine_options(uri)
+    if uri.startswith('postgresql'):
+        options['connect_args'] = {
+            **options.get('connect_args', {}),
+            'connect_timeout': int(os.getenv('DB_REPLICA_CONNECT_TIMEOUT', '2'))
+        }
+    return options
+
+
+# Database configuration
+def init_db(app):
+    uri = database_uri()
+    app.config["SQLALCHEMY_DATABASE_URI"] = uri
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(uri)
+    # Read replicas are extra binds that only RoutingSession selects
+    app.config["SQLALCHEMY_BINDS"] = {
+        f"{REPLICA_BIND_PREFIX}{index}": {'url': replica_uri, **replica_engine_options(replica_uri)}
+        for index, replica_uri in enumerate(replica_urls())
+    }
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
     
-    # Initialize the app with SQLAlchemy first
+    # Initialize the app with SQLAlchemy; no connection is opened until first use
     db.init_app(app)
-    
-    # Now we can use db.session within the app context
+
+
+def create_schema(app):
+    """
+    Create missing tables, indexes and audit partitions.
+
+    Run by the bootstrap CLI command (and the dev server), never per worker.
+    """
     with app.app_context():
-        if db_switch == "postgresql":
+        is_postgresql = db.engine.dialect.name == 'postgresql'
+        if is_postgresql:
             # Create schema if it doesn't exist
             db.session.execute(text('CREATE SCHEMA IF NOT EXISTS public'))
             db.session.commit()
+
+            # audit_logs is range-partitioned by month; create it before create_all() makes a plain table
+            from services.audit_storage import audit_storage
+            audit_storage.create_partitioned_table()
         
-        # Create all tables
-        db.create_all()
+        # Create all tables, on the primary only; replicas follow it
+        db.create_all(bind_key=None)
+
+        # create_all skips indexes of tables that already exist; add any that were introduced later
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(db.engine, checkfirst=True)
+
+        if is_postgresql:
+            audit_storage.ensure_partitions()
         print("Database tables created successfully (if they didn't exist)")
+
+
+def pool_stats():
+    """Checked-out, idle and overflow connections of this process's pool. Needs an app context."""
+    pool = db.engine.pool
+    stats = {
+        'pid': os.getpid(),
+        'pool_class': type(pool).__name__,
+        'status': pool.status()
+    }
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            checked_in=pool.checkedin(),
+            overflow=max(pool.overflow(), 0),
+            timeout=pool.timeout()
+        )
+    return stats
+
+
+def check_connection_budget(workers, pool_capacity):
+    """
+    Warn when `workers` processes, each able to open `pool_capacity`
+    connections, could exceed PostgreSQL's max_connections.
+
+    Meant for a process manager's startup hook; it opens one short-lived
+    connection and never raises.
+
+    Returns:
+        bool: False when the budget is exceeded, True otherwise (or when it cannot be checked)
+    """
+    uri = database_uri()
+    if not uri.startswith('postgresql') or pgbouncer_mode():
+        # PgBouncer bounds the server connections itself
+        return True
+    engine = create_engine(uri, poolclass=NullPool)
+    try:
+        with engine.connect() as connection:
+            max_connections = int(connection.execute(text('SHOW max_connections')).scalar())
+            reserved = int(connection.execute(text('SHOW superuser_reserved_connections')).scalar())
+    except Exception as e:
+        logger.warning(f"Could not check the database connection budget: {str(e)}")
+        return True
+    finally:
+        engine.dispose()
+
+    available = max_connections - reserved
+    needed = workers * pool_capacity
+    if needed > available:
+        logger.warning(
+            f"{workers} workers x {pool_capacity} pooled connections = {needed}, "
+            f"but the database accepts only {available} ({max_connections} max_connections, "
+            f"{reserved} reserved). Lower WORKERS, DB_POOL_SIZE or DB_MAX_OVERFLOW, or set DB_PGBOUNCER=true."
+        )
+        return False
+    logger.info(f"Database connection budget: {needed} of {available} connections")
+    return True
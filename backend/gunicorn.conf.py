@@ -0,0 +1,77 @@
+# gunicorn settings for both serving modes; see serving.py.
+#   SERVE_MODE=wsgi gunicorn -c gunicorn.conf.py   (gthread workers, the default)
+#   SERVE_MODE=asgi gunicorn -c gunicorn.conf.py   (uvicorn workers + thread-pool bridge)
+import os
+import shutil
+import tempfile
+from serving import serve_mode, worker_count, thread_count, db_pool_capacity
+
+mode = serve_mode()
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8888')}"
+workers = worker_count()
+
+# The local response cache lives in each worker and misses the others' invalidations
+if workers > 1 and os.getenv('CACHE_BACKEND', 'none').lower() == 'local':
+    raise RuntimeError("CACHE_BACKEND=local cannot be shared by several workers; use redis, or none")
+
+if mode == 'wsgi':
+    wsgi_app = 'server:flask_app'
+    worker_class = 'gthread'
+    threads = thread_count()
+else:
+    wsgi_app = 'asgi:app'
+    worker_class = 'serving.BridgeUvicornWorker'
+
+# A worker silent for `timeout` seconds is killed; on shutdown or reload,
+# in-flight requests get `graceful_timeout` seconds to finish
+timeout = int(os.getenv('TIMEOUT', '120'))
+graceful_timeout = int(os.getenv('GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.getenv('KEEPALIVE', '5'))
+
+# Recycle workers now and then so slow leaks cannot build up; jitter keeps them from restarting together
+max_requests = int(os.getenv('MAX_REQUESTS', '0'))
+max_requests_jitter = int(os.getenv('MAX_REQUESTS_JITTER', str(max_requests // 10)))
+
+# Each worker imports the app itself; create_app() is cheap and nothing is shared across fork
+preload_app = False
+forwarded_allow_ips = os.getenv('FORWARDED_ALLOW_IPS', '*')
+accesslog = os.getenv('ACCESS_LOG', '-') or None
+
+# Workers write their metrics to files here and /metrics sums them (services/metrics.py).
+# Set before any worker imports prometheus_client, which picks the storage at import
+metrics_dir = os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'fitnessapp-metrics')
+)
+
+
+def on_starting(server):
+    server.log.info(
+        f"Serving in {mode} mode: {workers} workers x {thread_count()} threads, "
+        f"DB pool capacity {db_pool_capacity()} per worker"
+    )
+    # Warn before the database starts refusing connections under load
+    from database import check_connection_budget
+    check_connection_budget(workers, db_pool_capacity())
+    # Samples left by a previous run would be added to this one's
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+
+
+def child_exit(server, worker):
+    # Drop the dead worker's live gauges (pool and audit queue); its counters keep counting towards the totals
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def worker_exit(server, worker):
+    # Write queued audit entries and stop the hashing pool before the worker goes away
+    import sys
+    server_module = sys.modules.get('server')
+    if server_module is None:
+        return
+    server_module.flask_app.extensions['audit_sink'].shutdown()
+    server_module.password_service.shutdown()
+    asgi_module = sys.modules.get('asgi')
+    if asgi_module is not None:
+        asgi_module.app.shutdown()
@@ -1,10 +1,17 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from database import db
 
 class AuditLog(db.Model):
     __tablename__ = 'audit_logs'
+    # Each index ends in (created_at, id) to serve keyset pagination for its filter
+    __table_args__ = (
+        Index('ix_audit_logs_created_at_id', 'created_at', 'id'),
+        Index('ix_audit_logs_action_created_at_id', 'action', 'created_at', 'id'),
+        Index('ix_audit_logs_entity_type_created_at_id', 'entity_type', 'created_at', 'id'),
+        Index('ix_audit_logs_user_id_created_at_id', 'user_id', 'created_at', 'id'),
+    )
 
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.user_id'), nullable=False)
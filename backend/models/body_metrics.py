@@ -1,9 +1,13 @@
 from database import db
+from serialization import serializable
 from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Numeric, Text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from datetime import datetime
 
+@serializable(fields=(
+    'metric_id', 'user_id', 'date', 'weight', 'height', 'bmi', 'body_fat', 'muscle_mass', 'photo_url', 'notes'
+))
 class BodyMetrics(db.Model):
     __tablename__ = "body_metrics"
 
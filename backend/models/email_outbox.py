@@ -0,0 +1,49 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, Text, DateTime, Index
+from database import db
+
+class EmailOutbox(db.Model):
+    """
+    One queued transactional email. Rows are added in the same transaction as
+    the change that triggers them and delivered by the email worker
+    (services/email_outbox.py), so requests never wait on the mail provider.
+    """
+    __tablename__ = 'email_outbox'
+    # The worker polls for due rows per status, oldest first
+    __table_args__ = (
+        Index('ix_email_outbox_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
+
+    email_id = Column(Integer, primary_key=True)
+    provider = Column(String(20), nullable=False)  # 'brevo', 'smtp' or 'file'
+    status = Column(String(20), nullable=False, default='pending')  # pending, sending, sent or dead
+    to_email = Column(String(255), nullable=False)
+    to_name = Column(String(255))
+    sender_email = Column(String(255), nullable=False)
+    sender_name = Column(String(255))
+    reply_to_email = Column(String(255))
+    reply_to_name = Column(String(255))
+    subject = Column(String(255), nullable=False)
+    html_content = Column(Text, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=8)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    locked_until = Column(DateTime)  # lease of the worker currently sending it
+    last_error = Column(String(500))
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime)
+
+    def to_dict(self):
+        return {
+            'email_id': self.email_id,
+            'provider': self.provider,
+            'status': self.status,
+            'to_email': self.to_email,
+            'subject': self.subject,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'next_attempt_at': self.next_attempt_at.isoformat() if self.next_attempt_at else None,
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'sent_at': self.sent_at.isoformat() if self.sent_at else None
+        }
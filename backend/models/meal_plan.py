@@ -1,10 +1,23 @@
 from sqlalchemy import String, DateTime, ForeignKey, JSON, Text, Integer
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.sql import func
-from database import db
+from database import db, utc_now
+from serialization import serializable, Nested, Computed
 import uuid
 from datetime import datetime
 
+@serializable(
+    fields=('id', 'coach_id', 'name', 'description', 'total_calories', 'total_protein', 'total_carbs',
+            'total_fats', 'dietary_preferences', 'created_at', 'updated_at'),
+    extra={
+        'coach': Computed(lambda plan: {
+            'first_name': plan.coach.first_name,
+            'last_name': plan.coach.last_name,
+            'full_name': f"{plan.coach.first_name} {plan.coach.last_name}"
+        } if plan.coach else None, load=('coach',)),
+        'meals': Nested()
+    }
+)
 class MealPlan(db.Model):
     __tablename__ = "meal_plans"
 
@@ -18,7 +31,7 @@ class MealPlan(db.Model):
     total_fats: Mapped[int] = mapped_column(Integer, nullable=True)
     dietary_preferences: Mapped[str] = mapped_column(Text, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
-    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), onupdate=func.now())
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), onupdate=utc_now)
 
     # Relationships
     coach = relationship("User", back_populates="created_meal_plans")
@@ -46,6 +59,10 @@ class MealPlan(db.Model):
             'meals': [meal.to_dict() for meal in self.meals]
         }
 
+@serializable(fields=(
+    'id', 'meal_plan_id', 'name', 'description', 'ingredients', 'cooking_instructions', 'calories',
+    'protein', 'carbs', 'fats', 'meal_type', 'day_of_week', 'meal_time', 'created_at', 'updated_at'
+))
 class Meal(db.Model):
     __tablename__ = "meals"
 
@@ -63,7 +80,7 @@ class Meal(db.Model):
     day_of_week: Mapped[str] = mapped_column(String(20), nullable=False)
     meal_time: Mapped[str] = mapped_column(String(20), nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
-    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), onupdate=func.now())
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), onupdate=utc_now)
 
     # Relationships
     meal_plan = relationship("MealPlan", back_populates="meals")
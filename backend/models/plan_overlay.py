@@ -0,0 +1,31 @@
+from database import db
+from sqlalchemy import Column, Integer, DateTime, ForeignKey
+from sqlalchemy.sql import func
+
+class PlanOverlay(db.Model):
+    """
+    A copy-on-write clone of a template plan. The plan shows the template's
+    exercises, except those hidden in plan_exercise_overrides, plus its own
+    plan_exercises rows (new exercises and edited copies of template ones).
+    Maintained by services/plan_overlay.py.
+    """
+    __tablename__ = "plan_overlays"
+
+    plan_id = Column(Integer, ForeignKey("training_plans.plan_id", ondelete="CASCADE"), primary_key=True)
+    # A template's overlays are materialized before it is deleted, so this never dangles
+    template_id = Column(Integer, ForeignKey("training_plans.plan_id"), nullable=False, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def to_dict(self):
+        return {
+            'plan_id': self.plan_id,
+            'template_id': self.template_id,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+class PlanExerciseOverride(db.Model):
+    """A template exercise an overlay plan does not show: removed, or replaced by an edited copy."""
+    __tablename__ = "plan_exercise_overrides"
+
+    plan_id = Column(Integer, ForeignKey("plan_overlays.plan_id", ondelete="CASCADE"), primary_key=True)
+    exercise_id = Column(Integer, ForeignKey("plan_exercises.exercise_id", ondelete="CASCADE"), primary_key=True)
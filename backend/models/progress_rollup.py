@@ -0,0 +1,41 @@
+from database import db
+from sqlalchemy import Column, Integer, String, Date, DateTime, Float, Index, UniqueConstraint
+from datetime import datetime
+
+class ProgressRollup(db.Model):
+    """
+    Pre-aggregated ProgressTracking totals for one user, exercise and day or week.
+    Maintained by services/progress_rollup_service.py; never written by hand.
+    """
+    __tablename__ = "progress_rollups"
+    __table_args__ = (
+        UniqueConstraint('user_id', 'exercise_id', 'period', 'period_start', name='uq_progress_rollups_bucket'),
+        Index('ix_progress_rollups_user_period', 'user_id', 'period', 'period_start'),
+        Index('ix_progress_rollups_exercise_period', 'exercise_id', 'period'),
+    )
+
+    rollup_id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    exercise_id = Column(Integer, nullable=False)
+    period = Column(String(10), nullable=False)  # 'day' or 'week'
+    period_start = Column(Date, nullable=False)  # the day, or the Monday of the week
+    volume = Column(Float, default=0.0)  # sum of sets x reps x weight
+    max_weight = Column(Float)
+    est_1rm = Column(Float)  # best Epley estimate in the bucket
+    session_count = Column(Integer, default=0)
+    rating_sum = Column(Integer, default=0)
+    rating_count = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'user_id': self.user_id,
+            'exercise_id': self.exercise_id,
+            'period': self.period,
+            'period_start': self.period_start.isoformat(),
+            'volume': self.volume,
+            'max_weight': self.max_weight,
+            'est_1rm': round(self.est_1rm, 2) if self.est_1rm is not None else None,
+            'session_count': self.session_count,
+            'avg_rating': round(self.rating_sum / self.rating_count, 2) if self.rating_count else None
+        }
@@ -1,8 +1,15 @@
 from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Numeric
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
-from database import db
+from database import db, utc_now
+from serialization import serializable, Nested
 
+@serializable(
+    fields=('plan_id', 'coach_id', 'title', 'description', 'difficulty_level', 'duration_weeks',
+            'training_frequency', 'training_objective', 'focus_areas', 'exercise_types',
+            'specific_instructions', 'created_at', 'updated_at'),
+    extra={'exercises': Nested(), 'coach': Nested(fields=('first_name', 'last_name'))}
+)
 class TrainingPlan(db.Model):
     __tablename__ = "training_plans"
 
@@ -18,7 +25,7 @@ class TrainingPlan(db.Model):
     exercise_types = Column(Text)
     specific_instructions = Column(Text)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=utc_now)
 
     # Relationships
     coach = relationship("User", back_populates="created_plans")
@@ -47,6 +54,10 @@ class TrainingPlan(db.Model):
             } if self.coach else None
         }
 
+@serializable(fields=(
+    'exercise_id', 'plan_id', 'name', 'description', 'sets', 'reps', 'intensity', 'rest_period',
+    'special_instructions', 'week_number', 'day_number', 'order_in_day', 'video_url', 'image_url'
+))
 class PlanExercise(db.Model):
     __tablename__ = "plan_exercises"
 
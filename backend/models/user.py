@@ -1,13 +1,19 @@
 from datetime import datetime
-from sqlalchemy import String, DateTime, Boolean, Text, ForeignKey, Column, Integer, DECIMAL, Numeric
+from sqlalchemy import String, DateTime, Boolean, Text, ForeignKey, Column, Integer, DECIMAL, Numeric, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-import bcrypt
 from database import db
+from serialization import serializable, Computed
+from services.password_service import password_service
 from models.meal_plan import MealPlan
 from models.audit_log import AuditLog
 import secrets
 from datetime import timedelta
 
+@serializable(
+    fields=('user_id', 'email', 'first_name', 'last_name', 'user_type', 'profile_image_url', 'is_active',
+            'created_at', 'updated_at', 'last_login'),
+    extra={'balance': Computed(lambda user: float(user.balance) if user.balance else 0.00, load=('balance',))}
+)
 class User(db.Model):
     __tablename__ = 'users'
     
@@ -45,15 +51,16 @@ class User(db.Model):
         return f'<User {self.email}>'
     
     def set_password(self, password: str):
-        # Generate a salt and hash the password
-        salt = bcrypt.gensalt()
-        password_bytes = password.encode('utf-8')
-        self.password_hash = bcrypt.hashpw(password_bytes, salt).decode('utf-8')
+        # Hashing runs in the password service's process pool; raises PasswordServiceBusy when it is saturated
+        self.password_hash = password_service.hash(password)
     
     def check_password(self, password: str) -> bool:
         # Check if the password matches
-        password_bytes = password.encode('utf-8')
-        return bcrypt.checkpw(password_bytes, self.password_hash.encode('utf-8'))
+        return password_service.check(password, self.password_hash)
+
+    def password_needs_rehash(self) -> bool:
+        # True when the stored hash uses a different bcrypt cost than BCRYPT_ROUNDS
+        return password_service.needs_rehash(self.password_hash)
     
     def to_dict(self):
         return {
@@ -179,7 +186,11 @@ class CoachClient(db.Model):
 
 class UserTrainingPlan(db.Model):
     __tablename__ = 'user_training_plans'
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        # Plan analytics count assignments by status per plan
+        Index('ix_user_training_plans_plan_status', 'plan_id', 'status'),
+        {'extend_existing': True}
+    )
     
     assignment_id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[int] = mapped_column(ForeignKey('users.user_id', ondelete='CASCADE'))
@@ -366,4 +377,18 @@ class PasswordResetToken(db.Model):
             'is_used': True,
             'used_at': datetime.utcnow()
         })
-        db.session.commit()
\ No newline at end of file
+        db.session.commit()
+
+class UserTokenVersion(db.Model):
+    """
+    Model for storing the per-user access token version.
+    Tokens carry the version they were issued with; bumping it revokes them.
+    """
+    __tablename__ = 'user_token_versions'
+
+    user_id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<UserTokenVersion {self.user_id}: {self.version}>'
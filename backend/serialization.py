@@ -0,0 +1,298 @@
+"""
+Response serialization: orjson rendering for jsonify and per-model
+serializers that are compiled once and reused.
+
+Models register the fields they expose with @serializable. The first time
+a model is serialized with a given field set, a plain function building the
+dict is generated for it (no per-field loops or isinstance checks at request
+time). Numeric columns become floats in that function; datetimes are left
+as they are, because orjson writes them as ISO 8601 itself, exactly like the
+isoformat() calls in the models' to_dict methods.
+
+Routes may ask for a sparse field set with ?fields=title,exercises.name
+(nested fields use dotted names) and choose which relations to embed with
+?include=exercises,coach. load_options() turns the same field set into
+loader options, so columns and relations that are not rendered are not
+fetched either.
+"""
+import threading
+from decimal import Decimal
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+import orjson
+from flask import request
+from flask.json.provider import JSONProvider
+from sqlalchemy import Numeric, inspect
+from sqlalchemy.orm import joinedload, load_only, noload, selectinload
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+# Field sets come from query strings; stop caching new ones past this many
+MAX_COMPILED = 1024
+
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if hasattr(value, '__html__'):
+        return str(value.__html__())
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(value) -> bytes:
+    return orjson.dumps(value, default=_default, option=ORJSON_OPTIONS)
+
+
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider backed by orjson; jsonify() and request.get_json() go through it."""
+
+    mimetype = 'application/json'
+
+    def dumps(self, obj, **kwargs) -> str:
+        return dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj), mimetype=self.mimetype)
+
+
+class Nested:
+    """A relationship rendered with the related model's serializer, optionally limited to `fields`."""
+
+    def __init__(self, fields: Optional[Iterable[str]] = None):
+        self.fields = tuple(fields) if fields is not None else None
+
+
+class Computed:
+    """A value derived from the whole object; `load` names the columns and relations it reads."""
+
+    def __init__(self, fn, load: Iterable[str] = ()):
+        self.fn = fn
+        self.load = tuple(load)
+
+
+class SerializerRegistry:
+    def __init__(self):
+        self._specs = {}  # model -> {name: None (column) | Nested | Computed}
+        self._compiled = {}  # (model, frozenset of fields or None) -> function
+        self._loads = {}  # (model, frozenset of fields or None) -> loader options
+        # Compiling a model compiles its nested models too, under the same lock
+        self._lock = threading.RLock()
+
+    def register(self, model, fields: Iterable[str], extra: Optional[Dict] = None):
+        spec = {name: None for name in fields}
+        spec.update(extra or {})
+        self._specs[model] = spec
+        return model
+
+    def serialize(self, value, fields: Optional[Iterable[str]] = None):
+        """Serialize a model instance, or a list of them, to JSON-ready data."""
+        if isinstance(value, (list, tuple)):
+            if not value:
+                return []
+            serializer = self.get(type(value[0]), fields)
+            return [serializer(item) for item in value]
+        if value is None:
+            return None
+        return self.get(type(value), fields)(value)
+
+    def get(self, model, fields: Optional[Iterable[str]] = None):
+        key = (model, frozenset(fields) if fields is not None else None)
+        serializer = self._compiled.get(key)
+        if serializer is None:
+            with self._lock:
+                serializer = self._compiled.get(key)
+                if serializer is None:
+                    serializer = self._compile(model, key[1])
+                    if len(self._compiled) < MAX_COMPILED:
+                        self._compiled[key] = serializer
+        return serializer
+
+    def field_names(self, model) -> Tuple[str, ...]:
+        return tuple(self._spec(model))
+
+    def resolve_fields(self, model, fields: Optional[Iterable[str]] = None,
+                       include: Optional[Iterable[str]] = None) -> Optional[FrozenSet[str]]:
+        """
+        Combine ?fields= and ?include= into one field set for serialize() and
+        load_options(). Without `fields` every plain field is kept; without
+        `include` every relation is embedded unless `fields` lists what it wants.
+        None means everything.
+        """
+        if fields is None and include is None:
+            return None
+        spec = self._spec(model)
+        relations = {name for name in spec if self._is_relation(model, spec[name])}
+        for name in include or ():
+            if name not in relations:
+                raise ValueError(f"Cannot include {name} in {model.__name__}")
+
+        if fields is None:
+            selected = {name for name in spec if name not in relations}
+            selected.update(include if include is not None else relations)
+            return frozenset(selected)
+        selected = set(fields)
+        # A relation named in include keeps whatever nested fields `fields` already picked for it
+        picked = {field.partition('.')[0] for field in selected}
+        selected.update(name for name in include or () if name not in picked)
+        return frozenset(selected)
+
+    def load_options(self, model, fields: Optional[Iterable[str]] = None) -> List:
+        """Loader options fetching exactly what serialize(..., fields) reads, for Query.options()."""
+        key = (model, frozenset(fields) if fields is not None else None)
+        options = self._loads.get(key)
+        if options is None:
+            options = self._build_load_options(model, key[1])
+            if len(self._loads) < MAX_COMPILED:
+                self._loads[key] = options
+        return options
+
+    def _build_load_options(self, model, fields: Optional[FrozenSet[str]]) -> List:
+        spec = self._spec(model)
+        selected, nested_fields = self._select(model, spec, fields)
+        mapper = inspect(model)
+
+        options, columns, loaded = [], set(), set()
+        for name in selected:
+            kind = spec[name]
+            if isinstance(kind, Nested):
+                target = mapper.relationships[name].mapper.class_
+                options.append(self._relation_loader(model, name).options(
+                    *self.load_options(target, nested_fields.get(name, kind.fields))
+                ))
+                loaded.add(name)
+            elif isinstance(kind, Computed):
+                for dependency in kind.load:
+                    if dependency in mapper.relationships:
+                        options.append(self._relation_loader(model, dependency))
+                        loaded.add(dependency)
+                    else:
+                        columns.add(dependency)
+            else:
+                columns.add(name)
+
+        for name in loaded:
+            # Many-to-one loads need the foreign key on this side
+            relationship = mapper.relationships[name]
+            if not relationship.uselist:
+                columns.update(mapper.get_property_by_column(column).key for column in relationship.local_columns)
+        options.extend(
+            noload(getattr(model, relationship.key)) for relationship in mapper.relationships
+            if relationship.key in spec and relationship.key not in loaded
+        )
+        if fields is not None:
+            options.insert(0, load_only(*(getattr(model, name) for name in sorted(columns))))
+        return options
+
+    @staticmethod
+    def _relation_loader(model, name):
+        attribute = getattr(model, name)
+        return selectinload(attribute) if attribute.property.uselist else joinedload(attribute)
+
+    @staticmethod
+    def _is_relation(model, kind) -> bool:
+        relationships = inspect(model).relationships
+        if isinstance(kind, Nested):
+            return True
+        return isinstance(kind, Computed) and any(name in relationships for name in kind.load)
+
+    def _spec(self, model) -> Dict:
+        for cls in model.__mro__:
+            if cls in self._specs:
+                return self._specs[cls]
+        raise LookupError(f"No serializer registered for {model.__name__}")
+
+    def _compile(self, model, fields: Optional[FrozenSet[str]]):
+        spec = self._spec(model)
+        selected, nested_fields = self._select(model, spec, fields)
+        mapper = inspect(model)
+
+        namespace = {'_float': _to_float}
+        entries = []
+        for index, name in enumerate(selected):
+            kind = spec[name]
+            if isinstance(kind, Computed):
+                namespace[f'_fn{index}'] = kind.fn
+                entries.append(f"{name!r}: _fn{index}(obj)")
+            elif isinstance(kind, Nested):
+                relationship = mapper.relationships[name]
+                target_fields = nested_fields.get(name, kind.fields)
+                namespace[f'_s{index}'] = self.get(relationship.mapper.class_, target_fields)
+                if relationship.uselist:
+                    entries.append(f"{name!r}: [_s{index}(item) for item in obj.{name}]")
+                else:
+                    entries.append(f"{name!r}: _s{index}(obj.{name}) if obj.{name} is not None else None")
+            else:
+                # Loaded column values sit in the instance dict; the attribute is only
+                # needed (and may lazy-load) when the value was expired or deferred
+                value = f"(values[{name!r}] if {name!r} in values else obj.{name})"
+                if name in mapper.columns and isinstance(mapper.columns[name].type, Numeric):
+                    value = f"_float{value}"
+                entries.append(f"{name!r}: {value}")
+
+        source = (
+            "def serialize(obj):\n"
+            "    values = obj.__dict__\n"
+            "    return {\n        " + ",\n        ".join(entries) + "\n    }\n"
+        )
+        exec(compile(source, f"<serializer {model.__name__}>", 'exec'), namespace)
+        return namespace['serialize']
+
+    def _select(self, model, spec, fields):
+        """Top-level names to render, in registration order, and the fields asked of each nested relation."""
+        if fields is None:
+            return list(spec), {}
+
+        top, nested = set(), {}
+        for field in fields:
+            name, _, rest = field.partition('.')
+            if name not in spec:
+                raise ValueError(f"Unknown field for {model.__name__}: {name}")
+            if rest:
+                if not isinstance(spec[name], Nested):
+                    raise ValueError(f"Field {name} has no nested fields")
+                nested.setdefault(name, set()).add(rest)
+            top.add(name)
+        # 'exercises' together with 'exercises.name' means the whole relation
+        nested = {name: frozenset(sub) for name, sub in nested.items() if name not in fields}
+        return [name for name in spec if name in top], nested
+
+
+def _to_float(value):
+    return float(value) if value is not None else None
+
+
+serializers = SerializerRegistry()
+
+
+def serializable(fields: Iterable[str], extra: Optional[Dict] = None):
+    """Class decorator registering the fields a model exposes in API responses."""
+    def decorator(model):
+        return serializers.register(model, fields, extra)
+    return decorator
+
+
+def serialize(value, fields: Optional[Iterable[str]] = None):
+    return serializers.serialize(value, fields)
+
+
+def load_options(model, fields: Optional[Iterable[str]] = None) -> List:
+    return serializers.load_options(model, fields)
+
+
+def _list_arg(name) -> Optional[FrozenSet[str]]:
+    raw = request.args.get(name)
+    if raw is None:
+        return None
+    return frozenset(item.strip() for item in raw.split(',') if item.strip())
+
+
+def requested_fields(model) -> Optional[FrozenSet[str]]:
+    """
+    The field set asked for with ?fields= and ?include=, or None for every
+    field. An empty ?include= embeds no relations.
+    """
+    fields = _list_arg('fields')
+    return serializers.resolve_fields(model, fields or None, _list_arg('include'))
@@ -1,35 +1,59 @@
-from flask import Flask, request, jsonify, send_file, redirect, send_from_directory
-from flask_migrate import Migrate
+import time
+# Measured from the first line so create_app() can report total startup time
+_IMPORT_STARTED = time.perf_counter()
+
+from flask import Flask, Blueprint, current_app, request, jsonify, send_file, redirect, send_from_directory
 from werkzeug.middleware.proxy_fix import ProxyFix
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity, get_jwt
 import os
+import json
+import click
+import signal
 import logging
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from services.subscription_service import SubscriptionService
 from services.contactus_form import handle_contact_form  # Add this import
-from database import init_db, db
+from database import init_db, create_schema, pool_stats, db
 from models.user import User, UserProfile, CoachProfile, CoachClient, UserTrainingPlan, UserMealPlan, InviteLink
 from models.settings import SystemSettings
 from models.training_plan import TrainingPlan, PlanExercise
 from models.audit_log import AuditLog
 from functools import wraps
 from init_db import create_admin_user
-from services.send_mail import EmailService
+from services.brevo_init import brevo_service
 from services.email_template import EmailTemplate
 from services.openai_service import OpenAIService
 from models.meal_plan import MealPlan, Meal
-import openai
 from models.progress_tracking import ProgressTracking
 from models.body_metrics import BodyMetrics
 import bcrypt
 from werkzeug.utils import secure_filename
 import uuid
-from sqlalchemy import desc, asc
-import stripe
+from sqlalchemy import desc, asc, select
+from sqlalchemy.orm import selectinload, joinedload, noload
 import secrets
 from services.invite_email import InviteEmail
+from services.coach_roster_service import CoachRosterService
+from services.training_plan_service import TrainingPlanService
+from services.plan_diff import PlanDiffService, PlanVersionConflict, plan_version
+from services.plan_overlay import PlanOverlayService, visible_exercises, with_templates
+from services.audit_log_service import AuditLogService
+from services.audit_storage import audit_storage
+from services.progress_rollup_service import ProgressRollupService, register_rollup_hooks
+from services.audit_sink import create_audit_sink
+from services.token_versions import token_versions, build_token_claims
+from services.password_service import password_service, PasswordServiceBusy
+from services.email_outbox import EmailOutboxService, create_outbox_worker
+from services.replica_routing import read_replica, init_replica_routing, replica_router
+from serialization import OrjsonProvider, serialize, requested_fields, load_options
+from services.conditional_get import conditional_get, collection_version, version_key, register_touch_hooks
+from services.response_cache import response_cache, register_cache_hooks, overlay_tags
+from services.system_settings import system_settings, init_maintenance_mode
+from services.query_tracker import init_query_tracking
+from services.request_profiler import init_profiler, request_profiler
+from services.metrics import init_metrics, render_metrics, CONTENT_TYPE as METRICS_CONTENT_TYPE
 from werkzeug.security import generate_password_hash
 from models.user import PasswordResetToken  # Changed from models.password_reset_token
 
@@ -56,39 +80,67 @@ else:
     ]
     YOUR_DOMAIN = CORS_ORIGINS[0]
 YOUR_DOMAIN = CORS_ORIGINS[0]
-# Create Flask app
-flask_app = Flask(__name__)
-flask_app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'your-secret-key')  # Change in production
-flask_app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(days=1)
-flask_app.config['JWT_ERROR_MESSAGE_KEY'] = 'error'
-flask_app.config['JWT_ALGORITHM'] = 'HS256'  # Explicitly set the algorithm
-flask_app.config['JWT_TOKEN_LOCATION'] = ['headers']  # Only look for tokens in headers
-flask_app.config['JWT_HEADER_NAME'] = 'Authorization'  # Header name
-flask_app.config['JWT_HEADER_TYPE'] = 'Bearer'  # Header type
-
-# Add timeout configuration
-flask_app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(minutes=10)  # 10 minutes session timeout
-flask_app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max request size
-
-# Initialize JWT
-jwt = JWTManager(flask_app)
-
-# Init BREVO
-email_service = EmailService()
-
-# Configure CORS
-CORS(flask_app, resources={
-    r"/api/*": {
-        "origins": ["http://localhost:3000"],
-        "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization"]
-    }
-})
-
-# Initialize database
-init_db(flask_app)
-# migration = Migrate(flask_app, db)
-# logger.info(f"The migration result is {migration}")
+# Created unbound; create_app() attaches it to the app
+jwt = JWTManager()
+
+@jwt.token_in_blocklist_loader
+def check_token_version(jwt_header, jwt_payload):
+    # Tokens issued before role claims existed carry no version; routes fall back to a User lookup for them
+    if 'ver' not in jwt_payload:
+        return False
+    return token_versions.get(jwt_payload['sub']) != jwt_payload['ver']
+
+# All routes and CLI commands live on this blueprint; create_app() registers it
+api = Blueprint('api', __name__, cli_group=None)
+
+
+@api.cli.command('bootstrap')
+@click.option('--rebuild-rollups', is_flag=True, help='Also recompute every progress rollup')
+@click.option('--check-services', is_flag=True, help='Also validate the Brevo API key against the API')
+def bootstrap(rebuild_rollups, check_services):
+    """One-shot schema and seed tasks; run once per deploy, before starting workers."""
+    started = time.perf_counter()
+    create_schema(current_app)
+    created = create_missing_coach_profiles()
+    logger.info(f"Created {created} missing coach profiles")
+    if os.getenv('ADMIN_EMAIL') and os.getenv('ADMIN_PASSWORD'):
+        create_admin_user(current_app)
+    else:
+        logger.warning("ADMIN_EMAIL or ADMIN_PASSWORD not set; skipping admin user creation")
+    if rebuild_rollups:
+        ProgressRollupService(db.session).rebuild()
+    if check_services:
+        brevo_service.initialize_brevo(validate=True)
+    logger.info(f"Bootstrap finished in {(time.perf_counter() - started) * 1000:.0f}ms")
+
+
+@api.cli.command('email-worker')
+@click.option('--once', is_flag=True, help='Exit once no email is due instead of polling forever')
+def email_worker(once):
+    """Deliver queued emails from the outbox, retrying failures with backoff."""
+    worker = create_outbox_worker()
+    # Finish in-flight sends on SIGTERM (container stop) instead of leaving them to the lease
+    signal.signal(signal.SIGTERM, lambda signum, frame: worker.stop())
+    try:
+        worker.run(once=once)
+    except KeyboardInterrupt:
+        worker.stop()
+
+
+@api.cli.command('audit-maintenance')
+def audit_maintenance():
+    """Create upcoming audit partitions (or rotate old months) and archive months past retention."""
+    # Run daily from cron: flask --app server audit-maintenance
+    result = audit_storage.maintain()
+    logger.info(f"Audit maintenance finished: {result}")
+
+
+@api.cli.command('rebuild-progress-rollups')
+@click.option('--user-id', type=int, default=None, help='Only rebuild this user\'s rollups')
+def rebuild_progress_rollups(user_id):
+    """Recompute daily and weekly progress rollups from ProgressTracking."""
+    written = ProgressRollupService(db.session).rebuild(user_id)
+    logger.info(f"Rebuilt {written} progress rollups")
 
 
 def log_audit(user_id, action, entity_type, entity_id, details=None):
@@ -103,77 +155,76 @@ def log_audit(user_id, action, entity_type, entity_id, details=None):
         details (str, optional): Additional details about the action
     """
     try:
-        # Get the IP address from the request
-        ip_address = request.remote_addr
-        
-        # Create new audit log entry
-        audit_log = AuditLog(
-            user_id=user_id,
-            action=action,
-            entity_type=entity_type,
-            entity_id=entity_id,
-            details=details,
-            ip_address=ip_address
-        )
-        
-        db.session.add(audit_log)
-        db.session.commit()
-        logger.info(f"Created audit log entry: {action} on {entity_type} {entity_id} by user {user_id}")
+        # Some callers pass a dict of details; the column stores text
+        if details is not None and not isinstance(details, str):
+            details = json.dumps(details, default=str)
+
+        # Create new audit log entry; request data must be captured here, not in the sink
+        current_app.extensions['audit_sink'].emit({
+            'user_id': user_id,
+            'action': action,
+            'entity_type': entity_type,
+            'entity_id': entity_id,
+            'details': details[:500] if details else details,
+            'ip_address': request.remote_addr,
+            'user_agent': request.user_agent.string[:255] if request.user_agent.string else None,
+            'created_at': datetime.utcnow()
+        })
+        logger.info(f"Queued audit log entry: {action} on {entity_type} {entity_id} by user {user_id}")
         
     except Exception as e:
         logger.error(f"Error creating audit log: {str(e)}")
-        db.session.rollback()
         # Don't raise the exception - we don't want audit logging to break the main functionality
 
 def create_missing_coach_profiles():
+    """Create a default CoachProfile for every coach without one. Returns the number created."""
     try:
-        # Find all users with type 'coach'
-        coach_users = User.query.filter_by(user_type='coach').all()
-        created_count = 0
-        
-        for user in coach_users:
-            # Check if they have a coach profile
-            if not CoachProfile.query.filter_by(user_id=user.user_id).first():
-                # Create coach profile
-                coach_profile = CoachProfile(
-                    user_id=user.user_id,
-                    specializations='General Fitness',
-                    experience_years=0,
-                    rating=0.0,
-                    bio=''
-                )
-                db.session.add(coach_profile)
-                created_count += 1
-                logger.info(f"Created missing coach profile for user {user.user_id}")
-        
-        if created_count > 0:
+        # One anti-join instead of a profile lookup per coach
+        coach_ids = db.session.query(User.user_id)\
+            .outerjoin(CoachProfile, CoachProfile.user_id == User.user_id)\
+            .filter(User.user_type == 'coach', CoachProfile.profile_id.is_(None))\
+            .all()
+
+        for (user_id,) in coach_ids:
+            coach_profile = CoachProfile(
+                user_id=user_id,
+                specializations='General Fitness',
+                experience_years=0,
+                rating=0.0,
+                bio=''
+            )
+            db.session.add(coach_profile)
+            logger.info(f"Created missing coach profile for user {user_id}")
+
+        if coach_ids:
             db.session.commit()
-            logger.info(f"Created {created_count} missing coach profiles")
+            logger.info(f"Created {len(coach_ids)} missing coach profiles")
+        return len(coach_ids)
     except Exception as e:
         logger.error(f"Error creating missing coach profiles: {str(e)}")
         db.session.rollback()
-
-# Create missing coach profiles within application context
-with flask_app.app_context():
-    create_missing_coach_profiles()
-    # Create admin user
-    create_admin_user(flask_app)
-
-# Support for reverse proxy headers
-flask_app.wsgi_app = ProxyFix(flask_app.wsgi_app, x_for=1, x_proto=1, x_host=1)
+        return 0
 
 # Initialize subscription service
 subscription_service = SubscriptionService(ENVIRONMENT)
 
+
+def get_stripe():
+    """The stripe module, imported and configured on first use because the SDK is slow to import."""
+    import stripe
+    if stripe.api_key is None:
+        stripe.api_key = os.getenv('STRIPE_SECRET_KEY')
+    return stripe
+
 # Contact form endpoint
-@flask_app.route('/api/contact/send', methods=['POST'])
+@api.route('/api/contact/send', methods=['POST'])
 def contact_form():
     """
     Handle contact form submissions
     """
     return handle_contact_form()
 
-@flask_app.route('/api/subscribe', methods=['POST'])
+@api.route('/api/subscribe', methods=['POST'])
 def subscribe():
     try:
         logger.info(f"Received request headers: {dict(request.headers)}")
@@ -200,7 +251,7 @@ def subscribe():
         logger.error(error_msg)
         return jsonify({'error': error_msg}), 500
 
-@flask_app.route('/api/auth/register', methods=['POST'])
+@api.route('/api/auth/register', methods=['POST'])
 def register():
     try:
         data = request.get_json()
@@ -234,6 +285,9 @@ def register():
 
             user_type = invite.user_type
             invite.is_used = True
+        elif not system_settings.get().allow_registrations:
+            # Invitations still work while open registration is closed
+            return jsonify({'error': 'Registrations are currently closed'}), 403
 
         # Create new user
         new_user = User(
@@ -273,6 +327,9 @@ def register():
             'user': new_user.to_dict()
         }), 201
 
+    except PasswordServiceBusy:
+        db.session.rollback()
+        return jsonify({'error': 'Server is busy, please try again shortly'}), 429, {'Retry-After': '1'}
     except Exception as e:
         db.session.rollback()
         logger.error(f"Registration error: {str(e)}")
@@ -281,7 +338,7 @@ def register():
 
 
 
-@flask_app.route('/canceled', methods=['POST'])
+@api.route('/canceled', methods=['POST'])
 def canceled():
     data = request.get_json()
     logger.info(f"Canceled request received: {data}")
@@ -325,7 +382,7 @@ def canceled():
 
 
 
-@flask_app.route('/success', methods=['POST'])
+@api.route('/success', methods=['POST'])
 def success():
     data = request.get_json()
     logger.info(f"Success request received: {data}")
@@ -369,13 +426,13 @@ def success():
         return jsonify({'error': 'Subscription update failed'}), 500        
 
 
-@flask_app.route('/checkout', methods=['POST'])
+@api.route('/checkout', methods=['POST'])
 def init_checkout_session():
     try:
         placeholder1 = ""
         placeholder2 = ""
         data = request.get_json()
-        checkout_session = stripe.checkout.Session.create(
+        checkout_session = get_stripe().checkout.Session.create(
             customer_email='customer@example.com',
             submit_type='auto',
             billing_address_collection='auto',
@@ -400,7 +457,7 @@ def init_checkout_session():
     return redirect(checkout_session.url, code=303)
 
 
-@flask_app.route('/api/auth/login', methods=['POST'])
+@api.route('/api/auth/login', methods=['POST'])
 def login():
     data = request.get_json()
     email = data.get('email')
@@ -410,24 +467,37 @@ def login():
         return jsonify({'error': 'Email and password are required'}), 400
 
     user = User.query.filter_by(email=email).first()
-    if not user or not user.check_password(password):
-        return jsonify({'error': 'Invalid email or password'}), 401
+    try:
+        if not user or not user.check_password(password):
+            return jsonify({'error': 'Invalid email or password'}), 401
+    except PasswordServiceBusy:
+        return jsonify({'error': 'Server is busy, please try again shortly'}), 429, {'Retry-After': '1'}
 
     if not user.is_active:
         return jsonify({'error': 'Account is deactivated'}), 403
 
+    # Upgrade hashes made with an outdated cost factor while we have the plaintext
+    if user.password_needs_rehash():
+        try:
+            user.set_password(password)
+        except PasswordServiceBusy:
+            logger.info(f"Skipped password rehash for user {user.user_id}: hashing queue is full")
+
     # Update last login time
     user.last_login = datetime.utcnow()
     db.session.commit()
 
-    # Create access token
-    access_token = create_access_token(identity=user.user_id)
+    # Create access token; role claims let protected routes skip the User lookup
+    access_token = create_access_token(
+        identity=user.user_id,
+        additional_claims=build_token_claims(user, token_versions.get(user.user_id))
+    )
     return jsonify({
         'access_token': access_token,
         'user': user.to_dict()
     })
 
-@flask_app.route('/api/auth/request-password-reset', methods=['POST'])
+@api.route('/api/auth/request-password-reset', methods=['POST'])
 def request_password_reset():
     data = request.get_json()
     email = data.get('email')
@@ -458,7 +528,7 @@ def request_password_reset():
         'reset_url': reset_url  # Remove this in production
     })
 
-@flask_app.route('/api/auth/reset-password', methods=['POST'])
+@api.route('/api/auth/reset-password', methods=['POST'])
 def reset_password():
     data = request.get_json()
     token = data.get('token')
@@ -496,11 +566,14 @@ def reset_password():
         db.session.commit()
         return jsonify({'message': 'Password has been reset successfully'}), 200
 
+    except PasswordServiceBusy:
+        db.session.rollback()
+        return jsonify({'error': 'Server is busy, please try again shortly'}), 429, {'Retry-After': '1'}
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Failed to reset password'}), 500
 
-@flask_app.route('/api/auth/logout', methods=['POST'])
+@api.route('/api/auth/logout', methods=['POST'])
 @jwt_required()
 def logout():
     try:
@@ -521,7 +594,7 @@ def logout():
         logger.error(f"Logout error: {str(e)}")
         return jsonify({'error': 'Logout failed'}), 500
 
-@flask_app.route('/api/auth/me', methods=['GET'])
+@api.route('/api/auth/me', methods=['GET'])
 @jwt_required()
 def get_current_user():
     try:
@@ -547,7 +620,7 @@ def get_current_user():
         logger.error(f"Get current user error: {str(e)}")
         return jsonify({'error': 'Failed to get user info'}), 500
 
-@flask_app.route('/api/profile', methods=['GET'])
+@api.route('/api/profile', methods=['GET'])
 @jwt_required()
 def get_user_profile():
     try:
@@ -566,7 +639,7 @@ def get_user_profile():
         logger.error(f"Get profile error: {str(e)}")
         return jsonify({'error': 'Failed to get profile info'}), 500
 
-@flask_app.route('/api/profile', methods=['PUT'])
+@api.route('/api/profile', methods=['PUT'])
 @jwt_required()
 def update_user_profile():
     try:
@@ -614,7 +687,7 @@ def update_user_profile():
         logger.error(f"Error updating profile: {str(e)}")
         return jsonify({'error': 'Failed to update profile'}), 500
 
-@flask_app.route('/api/user', methods=['PUT'])
+@api.route('/api/user', methods=['PUT'])
 @jwt_required()
 def update_user():
     try:
@@ -683,14 +756,42 @@ def update_user():
             'user': user.to_dict()
         }), 200
             
+    except PasswordServiceBusy:
+        db.session.rollback()
+        return jsonify({'error': 'Server is busy, please try again shortly'}), 429, {'Retry-After': '1'}
     except Exception as e:
         logger.error(f"Update user error for user {current_user_id if 'current_user_id' in locals() else 'unknown'}: {str(e)}")
         return jsonify({'error': 'Failed to update user'}), 500
 
-@flask_app.route('/')
+@api.route('/')
 def home():
     return f"Hello from {ENVIRONMENT} environment!"
 
+def get_current_role():
+    """
+    Get the current user's role from the access token claims.
+    
+    Falls back to loading the User for tokens issued before role claims existed.
+    Coach profiles are created lazily, so a coach token issued before its
+    profile existed has its profile looked up.
+    
+    Returns:
+        tuple: (user_type, coach_profile_id); user_type is None if the user no longer exists
+    """
+    claims = get_jwt()
+    if 'user_type' in claims:
+        coach_profile_id = claims.get('coach_profile_id')
+        if claims['user_type'] == 'coach' and coach_profile_id is None:
+            coach_profile_id = db.session.scalar(
+                select(CoachProfile.profile_id).where(CoachProfile.user_id == get_jwt_identity())
+            )
+        return claims['user_type'], coach_profile_id
+
+    user = db.session.get(User, get_jwt_identity())
+    if not user:
+        return None, None
+    return user.user_type, user.coach_profile.profile_id if user.coach_profile else None
+
 def admin_required(fn):
     @wraps(fn)
     @jwt_required()
@@ -699,15 +800,15 @@ def admin_required(fn):
             current_user_id = get_jwt_identity()
             logger.info(f"Admin check for user ID: {current_user_id}")
             
-            user = User.query.get(current_user_id)
+            user_type, _ = get_current_role()
             
-            if not user:
+            if not user_type:
                 logger.error(f"Admin check failed: User {current_user_id} not found")
                 return jsonify({'error': 'User not found'}), 404
                 
-            logger.info(f"User type: {user.user_type}")
+            logger.info(f"User type: {user_type}")
             
-            if user.user_type != 'admin':
+            if user_type != 'admin':
                 logger.error(f"Admin check failed: User {current_user_id} is not an admin")
                 return jsonify({'error': 'Admin access required'}), 403
                 
@@ -718,7 +819,7 @@ def admin_required(fn):
     return wrapper
 
 # Admin Dashboard Statistics
-@flask_app.route('/api/admin/stats', methods=['GET'])
+@api.route('/api/admin/stats', methods=['GET'])
 @admin_required
 def get_admin_stats():
     try:
@@ -749,19 +850,84 @@ def get_admin_stats():
         logger.error(f"Error fetching admin stats: {str(e)}")
         return jsonify({'error': 'Failed to fetch admin statistics'}), 500
 
+@api.route('/api/admin/password-hashing/stats', methods=['GET'])
+@admin_required
+def get_password_hashing_stats():
+    # Queue depth and rejections of this worker's password hashing pool
+    return jsonify(password_service.stats()), 200
+
+@api.route('/api/admin/db-pool/stats', methods=['GET'])
+@admin_required
+def get_db_pool_stats():
+    # Connection pool of the worker that served this request
+    options = {key: value for key, value in current_app.config['SQLALCHEMY_ENGINE_OPTIONS'].items() if key != 'poolclass'}
+    return jsonify({**pool_stats(), 'options': options, 'replicas': replica_router.stats()}), 200
+
+@api.route('/api/admin/cache/stats', methods=['GET'])
+@admin_required
+def get_cache_stats():
+    # Counters are per worker; generations and shared entries are shared
+    return jsonify(response_cache.stats()), 200
+
+@api.route('/api/admin/profiles', methods=['GET'])
+@admin_required
+def get_request_profiles():
+    # Profiles saved on this host by any worker, newest first
+    limit = min(request.args.get('limit', 50, type=int), 200)
+    return jsonify({'profiles': request_profiler.recent(limit)}), 200
+
+@api.route('/api/admin/profiles/<profile_id>', methods=['GET'])
+@admin_required
+def get_request_profile(profile_id):
+    profile = request_profiler.get(profile_id)
+    if profile is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    if request.args.get('format') == 'folded':
+        # Collapsed stacks for flamegraph.pl or speedscope
+        return request_profiler.folded(profile), 200, {
+            'Content-Type': 'text/plain; charset=utf-8',
+            'Content-Disposition': f'attachment; filename={profile_id}.folded'
+        }
+    return jsonify(profile), 200
+
+@api.route('/api/admin/email-outbox', methods=['GET'])
+@admin_required
+def get_email_outbox():
+    # Queue counts, worker lag and the most recent dead-lettered emails
+    outbox = EmailOutboxService(db.session)
+    return jsonify({
+        **outbox.stats(),
+        'dead': [email.to_dict() for email in outbox.get_dead()]
+    }), 200
+
+@api.route('/api/admin/email-outbox/<int:email_id>/retry', methods=['POST'])
+@admin_required
+def retry_outbox_email(email_id):
+    try:
+        email = EmailOutboxService(db.session).retry(email_id)
+        log_audit(get_jwt_identity(), 'retry', 'email_outbox', email_id)
+        return jsonify({'message': 'Email queued for retry', 'email': email.to_dict()}), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 404 if str(e) == "Email not found" else 400
+
 # User Management Endpoints
-@flask_app.route('/api/admin/users', methods=['GET'])
+@api.route('/api/admin/users', methods=['GET'])
 @admin_required
+@read_replica
+@conditional_get(lambda: collection_version(User))
 def get_all_users():
     try:
-        users = User.query.all()
-        return jsonify([user.to_dict() for user in users]), 200
+        fields = requested_fields(User)
+        users = User.query.options(*load_options(User, fields)).all()
+        return jsonify(serialize(users, fields)), 200
         
+    except ValueError as e:
+        return jsonify({'error': f'Invalid parameter value: {str(e)}'}), 422
     except Exception as e:
         logger.error(f"Error fetching users: {str(e)}")
         return jsonify({'error': 'Failed to fetch users'}), 500
 
-@flask_app.route('/api/admin/users/<int:user_id>', methods=['PUT'])
+@api.route('/api/admin/users/<int:user_id>', methods=['PUT'])
 @admin_required
 def admin_update_user(user_id):
     try:
@@ -812,6 +978,10 @@ def admin_update_user(user_id):
         
         db.session.commit()
 
+        # Role and coach profile are embedded in the user's tokens; revoke them
+        if 'user_type' in data and data['user_type'] != old_values['user_type']:
+            token_versions.bump(user_id)
+
         # Create audit log with changed fields
         changed_fields = []
         for field in ['first_name', 'last_name', 'email', 'user_type']:
@@ -835,7 +1005,7 @@ def admin_update_user(user_id):
         db.session.rollback()
         return jsonify({'error': 'Failed to update user'}), 500
 
-@flask_app.route('/api/admin/users/<int:user_id>', methods=['DELETE'])
+@api.route('/api/admin/users/<int:user_id>', methods=['DELETE'])
 @admin_required
 def delete_user(user_id):
     try:
@@ -870,6 +1040,7 @@ def delete_user(user_id):
             # 4. Delete progress records
             logger.info(f"Deleting progress records for user {user_id}")
             ProgressTracking.query.filter_by(user_id=user_id).delete()
+            ProgressRollupService(db.session).delete_for_user(user_id)
 
             # 5. Delete body metrics
             logger.info(f"Deleting body metrics for user {user_id}")
@@ -887,7 +1058,7 @@ def delete_user(user_id):
 
             # 8. Delete audit logs
             logger.info(f"Deleting audit logs for user {user_id}")
-            AuditLog.query.filter_by(user_id=user_id).delete()
+            audit_storage.delete_for_user(user_id)
 
             # 9. Finally delete the user
             logger.info(f"Deleting user {user_id}")
@@ -895,6 +1066,13 @@ def delete_user(user_id):
             
             # Commit all changes
             db.session.commit()
+            token_versions.bump(user_id)
+
+            # Months already exported from the database live in archive files
+            try:
+                audit_storage.purge_user_from_archives(user_id)
+            except (OSError, ValueError) as e:
+                logger.error(f"Could not remove audit logs of user {user_id} from the archives: {str(e)}")
 
             # Create final audit log for the deletion
             admin_user_id = get_jwt_identity()
@@ -917,7 +1095,7 @@ def delete_user(user_id):
         logger.error(f"Error in delete_user endpoint for user {user_id}: {str(e)}")
         return jsonify({'error': 'Failed to delete user'}), 500
 
-@flask_app.route('/api/admin/users/<int:user_id>/status', methods=['PATCH'])
+@api.route('/api/admin/users/<int:user_id>/status', methods=['PATCH'])
 @admin_required
 def toggle_user_status(user_id):
     try:
@@ -952,6 +1130,7 @@ def toggle_user_status(user_id):
         
         try:
             db.session.commit()
+            token_versions.bump(user_id)
 
             # Create audit log
             admin_user_id = get_jwt_identity()
@@ -976,7 +1155,7 @@ def toggle_user_status(user_id):
         return jsonify({'error': 'Failed to update user status'}), 500
 
 # System Settings Endpoints
-@flask_app.route('/api/admin/settings', methods=['GET'])
+@api.route('/api/admin/settings', methods=['GET'])
 @admin_required
 def get_system_settings():
     try:
@@ -993,7 +1172,7 @@ def get_system_settings():
         logger.error(f"Error fetching system settings: {str(e)}")
         return jsonify({'error': 'Failed to fetch system settings'}), 500
 
-@flask_app.route('/api/admin/settings', methods=['PUT'])
+@api.route('/api/admin/settings', methods=['PUT'])
 @admin_required
 def update_system_settings():
     try:
@@ -1018,6 +1197,8 @@ def update_system_settings():
         settings.updated_by = get_jwt_identity()
         
         db.session.commit()
+        # Applies in this worker now and in the others within SETTINGS_CACHE_TTL seconds
+        system_settings.invalidate()
         return jsonify(settings.to_dict()), 200
         
     except Exception as e:
@@ -1025,8 +1206,17 @@ def update_system_settings():
         return jsonify({'error': 'Failed to update system settings'}), 500
 
 # Coach Profile Endpoints
-@flask_app.route('/api/coach/profile', methods=['GET'])
+def _coach_profile_version():
+    # The profile reports clients_count, so client assignments are part of its version
+    profile_ids = select(CoachProfile.profile_id).where(CoachProfile.user_id == get_jwt_identity())
+    return (
+        collection_version(CoachProfile, CoachProfile.profile_id.in_(profile_ids)) +
+        collection_version(CoachClient, CoachClient.coach_id.in_(profile_ids))
+    )
+
+@api.route('/api/coach/profile', methods=['GET'])
 @jwt_required()
+@conditional_get(_coach_profile_version)
 def get_coach_profile():
     try:
         current_user_id = get_jwt_identity()
@@ -1048,7 +1238,7 @@ def get_coach_profile():
         logger.error(f"Get coach profile error: {str(e)}")
         return jsonify({'error': 'Failed to get coach profile'}), 500
 
-@flask_app.route('/api/coach/profile', methods=['PUT'])
+@api.route('/api/coach/profile', methods=['PUT'])
 @jwt_required()
 def update_coach_profile():
     try:
@@ -1091,7 +1281,7 @@ def update_coach_profile():
         logger.error(f"Error updating coach profile: {str(e)}")
         return jsonify({'error': 'Failed to update coach profile'}), 500
 
-@flask_app.route('/api/admin/users/<int:user_id>/coach-profile', methods=['GET'])
+@api.route('/api/admin/users/<int:user_id>/coach-profile', methods=['GET'])
 @admin_required
 def get_user_coach_profile(user_id):
     try:
@@ -1112,7 +1302,7 @@ def get_user_coach_profile(user_id):
         logger.error(f"Get user coach profile error: {str(e)}")
         return jsonify({'error': 'Failed to get coach profile'}), 500
 
-@flask_app.route('/api/admin/users/<int:user_id>/coach-profile', methods=['PUT'])
+@api.route('/api/admin/users/<int:user_id>/coach-profile', methods=['PUT'])
 @admin_required
 def admin_update_coach_profile(user_id):
     try:
@@ -1154,18 +1344,18 @@ def admin_update_coach_profile(user_id):
         return jsonify({'error': 'Failed to update coach profile'}), 500
 
 # Coach Statistics Endpoint
-@flask_app.route('/api/coach/stats', methods=['GET'])
+@api.route('/api/coach/stats', methods=['GET'])
 @jwt_required()
 def get_coach_stats():
     try:
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user_type, coach_profile_id = get_current_role()
         
-        if not user or user.user_type != 'coach':
+        if user_type != 'coach':
             return jsonify({'error': 'Access denied: User is not a coach'}), 403
             
         # Get coach profile
-        coach_profile = user.coach_profile
+        coach_profile = db.session.get(CoachProfile, coach_profile_id) if coach_profile_id else None
         if not coach_profile:
             return jsonify({'error': 'Coach profile not found'}), 404
 
@@ -1208,7 +1398,7 @@ def get_coach_stats():
         return jsonify({'error': 'Failed to fetch coach statistics'}), 500
 
 # Admin endpoint to deactivate a coach-client assignment
-@flask_app.route('/api/admin/coach-clients/<int:coach_id>/deactivate', methods=['PATCH'])
+@api.route('/api/admin/coach-clients/<int:coach_id>/deactivate', methods=['PATCH'])
 @admin_required
 def deactivate_coach_assignment(coach_id):
     try:
@@ -1261,14 +1451,14 @@ def deactivate_coach_assignment(coach_id):
         return jsonify({'error': 'Failed to deactivate coach assignment'}), 500
 
 # Admin endpoint to assign a client to a coach
-@flask_app.route('/api/admin/assign-client', methods=['POST'])
+@api.route('/api/admin/assign-client', methods=['POST'])
 @jwt_required()
 def assign_client():
     try:
         # Check if user is admin
         current_user_id = get_jwt_identity()
-        admin = User.query.get(current_user_id)
-        if not admin or admin.user_type != 'admin':
+        user_type, _ = get_current_role()
+        if user_type != 'admin':
             return jsonify({'error': 'Unauthorized access'}), 403
 
         data = request.get_json()
@@ -1294,6 +1484,11 @@ def assign_client():
         if existing_assignment and existing_assignment.coach_id == coach.coach_profile.profile_id:
             return jsonify({'error': 'Client is already assigned to this coach'}), 400
 
+        max_clients = system_settings.get().max_users_per_trainer
+        active_clients = CoachClient.query.filter_by(coach_id=coach.coach_profile.profile_id, status='active').count()
+        if max_clients and active_clients >= max_clients:
+            return jsonify({'error': f'Coach already has the maximum of {max_clients} clients'}), 400
+
         # Create new coach-client relationship
         new_assignment = CoachClient(
             coach_id=coach.coach_profile.profile_id,
@@ -1323,7 +1518,7 @@ def assign_client():
         return jsonify({'error': 'Failed to assign client'}), 500
 
 # Coach endpoint to get their clients
-@flask_app.route('/api/coach/clients', methods=['GET'])
+@api.route('/api/coach/clients', methods=['GET'])
 @jwt_required()
 def get_coach_clients():
     try:
@@ -1331,87 +1526,49 @@ def get_coach_clients():
         current_user_id = get_jwt_identity()
         logger.info(f"[get_coach_clients] Current user ID: {current_user_id}")
         
-        coach = User.query.get(current_user_id)
-        logger.info(f"[get_coach_clients] Coach user type: {coach.user_type if coach else 'None'}")
+        user_type, coach_profile_id = get_current_role()
+        logger.info(f"[get_coach_clients] Coach user type: {user_type}")
         
-        if not coach or coach.user_type != 'coach' or not coach.coach_profile:
-            logger.error(f"[get_coach_clients] Access denied - User type: {coach.user_type if coach else 'None'}, Has coach profile: {bool(coach.coach_profile if coach else None)}")
+        if user_type != 'coach' or not coach_profile_id:
+            logger.error(f"[get_coach_clients] Access denied - User type: {user_type}, Has coach profile: {bool(coach_profile_id)}")
             return jsonify({'error': 'Unauthorized access'}), 403
 
         # Log debug information
-        logger.info(f"[get_coach_clients] Coach profile ID: {coach.coach_profile.profile_id}")
+        logger.info(f"[get_coach_clients] Coach profile ID: {coach_profile_id}")
 
-        # Get all active clients for this coach
-        coach_clients = CoachClient.query.filter_by(
-            coach_id=coach.coach_profile.profile_id,
-            status='active'
-        ).all()
-
-        # Log the query results
-        logger.info(f"[get_coach_clients] Found {len(coach_clients)} active clients")
+        fields = request.args.get('fields')
+        try:
+            response_data = CoachRosterService(db.session).get_roster(
+                coach_profile_id,
+                sort_by=request.args.get('sort_by', 'full_name'),
+                sort_order=request.args.get('sort_order', 'asc'),
+                page=request.args.get('page', 1, type=int),
+                per_page=request.args.get('per_page', type=int),
+                fields=[field.strip() for field in fields.split(',') if field.strip()] if fields else None
+            )
+        except ValueError as e:
+            logger.error(f"[get_coach_clients] Invalid roster parameters: {str(e)}")
+            return jsonify({'error': str(e)}), 422
 
-        # Include more client information in response
-        clients_data = []
-        for client_rel in coach_clients:
-            client = User.query.get(client_rel.client_id)
-            if client:
-                # Get the client's profile
-                client_profile = UserProfile.query.filter_by(user_id=client.user_id).first()
-                
-                # Get the client's assigned training plan
-                assigned_plan = UserTrainingPlan.query.filter_by(
-                    user_id=client.user_id,
-                    status='in_progress'
-                ).first()
-
-                # Get the latest body metrics
-                latest_metrics = BodyMetrics.query.filter_by(
-                    user_id=client.user_id
-                ).order_by(BodyMetrics.date.desc()).first()
-                
-                client_data = {
-                    'id': client_rel.id,
-                    'client_id': client.user_id,
-                    'first_name': client.first_name,
-                    'last_name': client.last_name,
-                    'full_name': f"{client.first_name} {client.last_name}",
-                    'email': client.email,
-                    'profile_image_url': client.profile_image_url,
-                    'assigned_at': client_rel.assigned_at.isoformat() if client_rel.assigned_at else None,
-                    'status': client_rel.status,
-                    'profile': client_profile.to_dict() if client_profile else None,
-                    'assigned_plan_id': assigned_plan.plan_id if assigned_plan else None,
-                    'latest_metrics': latest_metrics.to_dict() if latest_metrics else None
-                }
-                clients_data.append(client_data)
-                logger.info(f"[get_coach_clients] Added client data: {client_data['full_name']}")
-
-        # Sort clients by name
-        clients_data.sort(key=lambda x: x['full_name'])
-
-        response_data = {
-            'clients': clients_data,
-            'total_count': len(clients_data)
-        }
-        logger.info(f"[get_coach_clients] Sending response with {len(clients_data)} clients")
+        logger.info(f"[get_coach_clients] Sending response with {len(response_data['clients'])} of {response_data['total_count']} clients")
         return jsonify(response_data), 200
 
     except Exception as e:
         logger.error(f"[get_coach_clients] Error retrieving coach clients: {str(e)}")
         return jsonify({'error': 'Failed to retrieve clients'}), 500
 
-@flask_app.route('/api/admin/coach-clients', methods=['GET'])
+@api.route('/api/admin/coach-clients', methods=['GET'])
 @jwt_required()
 def get_all_coach_clients():
     try:
         # Check if user is admin
         current_user_id = get_jwt_identity()
-        admin = User.query.get(current_user_id)
-        if not admin or admin.user_type != 'admin':
+        user_type, _ = get_current_role()
+        if user_type != 'admin':
             return jsonify({'error': 'Unauthorized access'}), 403
 
-        # Get all coach-client relationships
-        all_assignments = CoachClient.query.all()
+        # Get all coach-client relationships; to_dict() reads each client
+        all_assignments = CoachClient.query.options(joinedload(CoachClient.client)).all()
 
         return jsonify({
             'assignments': [assignment.to_dict() for assignment in all_assignments]
@@ -1421,19 +1578,20 @@ def get_all_coach_clients():
         logger.error(f"Error retrieving all coach-client assignments: {str(e)}")
         return jsonify({'error': 'Failed to retrieve assignments'}), 500
 
-@flask_app.route('/api/debug/coach-clients', methods=['GET'])
+@api.route('/api/debug/coach-clients', methods=['GET'])
 @jwt_required()
 def debug_coach_clients():
     try:
-        # Get all coach-client relationships
-        all_relationships = CoachClient.query.all()
+        # Get all coach-client relationships, with both users joined in
+        all_relationships = CoachClient.query.options(
+            joinedload(CoachClient.coach).joinedload(CoachProfile.user), joinedload(CoachClient.client)
+        ).all()
         logger.info(f"[debug] Total coach-client relationships: {len(all_relationships)}")
         
         relationships_data = []
         for rel in all_relationships:
-            coach_profile = CoachProfile.query.get(rel.coach_id)
-            coach = User.query.get(coach_profile.user_id) if coach_profile else None
-            client = User.query.get(rel.client_id)
+            coach = rel.coach.user if rel.coach else None
+            client = rel.client
             
             rel_data = {
                 'id': rel.id,
@@ -1457,7 +1615,7 @@ def debug_coach_clients():
         return jsonify({'error': str(e)}), 500
 
 # Coach Settings Endpoints
-@flask_app.route('/api/coach/settings', methods=['GET'])
+@api.route('/api/coach/settings', methods=['GET'])
 @jwt_required()
 def get_coach_settings():
     try:
@@ -1488,7 +1646,7 @@ def get_coach_settings():
         logger.error(f"Error fetching coach settings: {str(e)}")
         return jsonify({'error': 'Failed to fetch coach settings'}), 500
 
-@flask_app.route('/api/coach/settings', methods=['PUT'])
+@api.route('/api/coach/settings', methods=['PUT'])
 @jwt_required()
 def update_coach_settings():
     try:
@@ -1559,37 +1717,84 @@ def update_coach_settings():
         return jsonify({'error': 'Failed to update coach settings'}), 500
 
 # Add Flask routes for training plans
-@flask_app.route('/api/training-plans', methods=['GET'])
+def _fields_key(fields):
+    return ','.join(sorted(fields)) if fields is not None else '*'
+
+def _plan_version(plan_id):
+    """collection_version() of a plan's response: the plan, its template if it is an overlay, and its coach."""
+    return collection_version(TrainingPlan, with_templates([plan_id]), joined=(TrainingPlan.coach,))
+
+def _cached_plan(plan_id):
+    """
+    plan.to_dict() for a training plan, with the exercises it shows, from the response cache; None if it does not exist.
+    Entries are keyed by the plan's version as well, so a cached body always matches the ETag it is sent with.
+    """
+    def load():
+        plan = db.session.get(TrainingPlan, plan_id, options=[noload(TrainingPlan.exercises), joinedload(TrainingPlan.coach)])
+        if not plan:
+            return None
+        # Overlay plans show their template's exercises as well as their own
+        exercises = PlanDiffService(db.session).exercises(plan_id)
+        return {**plan.to_dict(), 'exercises': [exercise.to_dict() for exercise in exercises]}
+    if not response_cache.enabled:
+        return load()
+    return response_cache.get_or_load(
+        f'training_plan:{plan_id}:{version_key(_plan_version(plan_id))}', [f'plan:{plan_id}'], load, db.session
+    )
+
+def _with_overlay_exercises(plans, rendered, fields):
+    """serialize() embeds a plan's own exercises; give overlay plans the ones they show."""
+    if not rendered or 'exercises' not in rendered[0]:
+        return rendered
+    nested = {field.partition('.')[2] for field in fields or () if field.startswith('exercises.')}
+    exercise_fields = nested if nested and 'exercises' not in fields else None
+    shown = PlanOverlayService(db.session).exercises_by_plan([plan.plan_id for plan in plans])
+    for plan, data in zip(plans, rendered):
+        if plan.plan_id in shown:
+            data['exercises'] = serialize(shown[plan.plan_id], exercise_fields)
+    return rendered
+
+@api.route('/api/training-plans', methods=['GET'])
 @jwt_required()
+@conditional_get(lambda: collection_version(TrainingPlan, TrainingPlan.coach_id == get_jwt_identity(), joined=(TrainingPlan.coach,)))
 def get_training_plans():
     try:
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user_type, _ = get_current_role()
         
-        if not user or user.user_type != 'coach':
+        if user_type != 'coach':
             return jsonify({'error': 'Access denied: User is not a coach'}), 403
             
-        training_plans = TrainingPlan.query.filter_by(coach_id=current_user_id).all()
-        return jsonify([plan.to_dict() for plan in training_plans]), 200
+        fields = requested_fields(TrainingPlan)
+
+        def load():
+            training_plans = TrainingPlan.query.options(*load_options(TrainingPlan, fields)).filter_by(coach_id=current_user_id).all()
+            return _with_overlay_exercises(training_plans, serialize(training_plans, fields), fields)
+
+        return jsonify(response_cache.get_or_load(
+            f"training_plans:coach:{current_user_id}:{_fields_key(fields)}", [f'coach:{current_user_id}'], load, db.session
+        )), 200
             
+    except ValueError as e:
+        return jsonify({'error': f'Invalid parameter value: {str(e)}'}), 422
     except Exception as e:
         logger.error(f"Error fetching training plans: {str(e)}")
         return jsonify({'error': 'Failed to fetch training plans'}), 500
 
-@flask_app.route('/api/training-plans', methods=['POST'])
+@api.route('/api/training-plans', methods=['POST'])
 @jwt_required()
 def create_training_plan():
     try:
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user_type, _ = get_current_role()
         
-        if not user or user.user_type not in ['coach', 'admin']:
+        if user_type not in ['coach', 'admin']:
             return jsonify({'error': 'Not authorized'}), 403
             
         data = request.get_json()
         
         new_plan = TrainingPlan(
-            coach_id=user.user_id,
+            coach_id=current_user_id,
             title=data.get('title'),
             description=data.get('description'),
             difficulty_level=data.get('difficulty_level'),
@@ -1603,7 +1808,7 @@ def create_training_plan():
 
         # Log the training plan creation
         log_audit(
-            user_id=user.user_id,
+            user_id=current_user_id,
             action='create',
             entity_type='training_plan',
             entity_id=new_plan.plan_id,
@@ -1616,51 +1821,71 @@ def create_training_plan():
         logger.error(f"Error creating training plan: {str(e)}")
         return jsonify({'error': 'Failed to create training plan'}), 500
 
-@flask_app.route('/api/training-plans/<int:plan_id>', methods=['GET'])
+@api.route('/api/training-plans/<int:plan_id>', methods=['GET'])
 @jwt_required()
+@conditional_get(lambda plan_id: _plan_version(plan_id))
 def get_training_plan(plan_id):
     try:
         logger.info(f"Fetching training plan with ID: {plan_id}")
         current_user_id = get_jwt_identity()
-        user = db.session.get(User, current_user_id)
+        user_type, _ = get_current_role()
         
-        if not user:
+        if not user_type:
             logger.error(f"User not found for ID: {current_user_id}")
             return jsonify({'error': 'User not found'}), 404
             
-        plan = TrainingPlan.query.get(plan_id)
-        if not plan:
+        plan_data = _cached_plan(plan_id)
+        if not plan_data:
             logger.error(f"Training plan not found for ID: {plan_id}")
             return jsonify({'error': 'Training plan not found'}), 404
             
         # Check if user is authorized to view this plan
-        if user.user_type != 'coach' and plan.coach_id != current_user_id:
+        if user_type != 'coach' and plan_data['coach_id'] != current_user_id:
             logger.error(f"User {current_user_id} not authorized to view plan {plan_id}")
             return jsonify({'error': 'Not authorized to view this plan'}), 403
-            
-        plan_data = plan.to_dict()
-        exercises = PlanExercise.query.filter_by(plan_id=plan_id).all()
-        plan_data['exercises'] = [exercise.to_dict() for exercise in exercises]
         
-        logger.info(f"Successfully fetched plan {plan_id} with {len(exercises)} exercises")
+        logger.info(f"Successfully fetched plan {plan_id} with {len(plan_data['exercises'])} exercises")
         return jsonify(plan_data), 200
             
     except Exception as e:
         logger.error(f"Error fetching training plan: {str(e)}")
         return jsonify({'error': 'Failed to fetch training plan'}), 500
 
-@flask_app.route('/api/training-plans/<int:plan_id>', methods=['PUT'])
+@api.route('/api/training-plans/<int:plan_id>/analytics', methods=['GET'])
+@jwt_required()
+def get_training_plan_analytics(plan_id):
+    try:
+        current_user_id = get_jwt_identity()
+        user_type, _ = get_current_role()
+
+        coach_id = db.session.query(TrainingPlan.coach_id).filter(TrainingPlan.plan_id == plan_id).scalar()
+        if coach_id is None:
+            return jsonify({'error': 'Training plan not found'}), 404
+
+        # Only the plan's coach and admins can see how its assignees are doing
+        if user_type != 'admin' and not (user_type == 'coach' and coach_id == current_user_id):
+            return jsonify({'error': 'Not authorized to view analytics for this plan'}), 403
+
+        return jsonify(TrainingPlanService(db.session).get_plan_analytics(plan_id)), 200
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 404
+    except Exception as e:
+        logger.error(f"Error fetching training plan analytics: {str(e)}")
+        return jsonify({'error': 'Failed to fetch training plan analytics'}), 500
+
+@api.route('/api/training-plans/<int:plan_id>', methods=['PUT'])
 @jwt_required()
 def update_training_plan(plan_id):
     try:
         current_user_id = get_jwt_identity()
-        user = db.session.get(User, current_user_id)
+        user_type, _ = get_current_role()
         plan = TrainingPlan.query.get(plan_id)
         
         if not plan:
             return jsonify({'error': 'Training plan not found'}), 404
             
-        if plan.coach_id != current_user_id and user.user_type != 'admin':
+        if plan.coach_id != current_user_id and user_type != 'admin':
             return jsonify({'error': 'Not authorized'}), 403
             
         data = request.get_json()
@@ -1689,21 +1914,23 @@ def update_training_plan(plan_id):
         logger.error(f"Error updating training plan: {str(e)}")
         return jsonify({'error': 'Failed to update training plan'}), 500
 
-@flask_app.route('/api/training-plans/<int:plan_id>', methods=['DELETE'])
+@api.route('/api/training-plans/<int:plan_id>', methods=['DELETE'])
 @jwt_required()
 def delete_training_plan(plan_id):
     try:
         current_user_id = get_jwt_identity()
-        user = db.session.get(User, current_user_id)
+        user_type, _ = get_current_role()
         plan = TrainingPlan.query.get(plan_id)
         
         if not plan:
             return jsonify({'error': 'Training plan not found'}), 404
             
-        if plan.coach_id != current_user_id and user.user_type != 'admin':
+        if plan.coach_id != current_user_id and user_type != 'admin':
             return jsonify({'error': 'Not authorized'}), 403
 
         plan_title = plan.title  # Store title before deletion for audit log
+        # Overlays of this plan get their own copies of its exercises first
+        PlanOverlayService(db.session).release(plan_id)
         db.session.delete(plan)
         db.session.commit()
 
@@ -1722,17 +1949,78 @@ def delete_training_plan(plan_id):
         logger.error(f"Error deleting training plan: {str(e)}")
         return jsonify({'error': 'Failed to delete training plan'}), 500
 
+@api.route('/api/training-plans/<int:plan_id>/clone', methods=['POST'])
+@jwt_required()
+def clone_training_plan(plan_id):
+    """
+    Clone one of the coach's plans. With {"overlay": true} the clone is a
+    copy-on-write overlay: it shows the plan's exercises without copying them
+    and stores only the ones later changed in it, so personalised copies for
+    many clients cost a few rows each. Otherwise the exercises are copied.
+    """
+    try:
+        current_user_id = get_jwt_identity()
+        plan, error = _authored_plan(plan_id, current_user_id)
+        if error:
+            return error
+
+        data = request.get_json(silent=True) or {}
+        title = data.get('title') or f"{plan.title} (copy)"
+        overlay = bool(data.get('overlay', False))
+        clone = TrainingPlanService(db.session).clone_training_plan(plan_id, title, overlay=overlay)
+
+        log_audit(
+            user_id=current_user_id,
+            action='create',
+            entity_type='training_plan',
+            entity_id=clone.plan_id,
+            details=f"Cloned training plan '{plan.title}' as '{clone.title}'{' (overlay)' if overlay else ''}"
+        )
+        return jsonify(_cached_plan(clone.plan_id)), 201
+
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error cloning training plan {plan_id}: {str(e)}")
+        return jsonify({'error': 'Failed to clone training plan'}), 500
+
+@api.route('/api/training-plans/<int:plan_id>/materialize', methods=['POST'])
+@jwt_required()
+def materialize_training_plan(plan_id):
+    """Turn an overlay plan into an ordinary one with its own copy of every exercise it shows."""
+    try:
+        current_user_id = get_jwt_identity()
+        plan, error = _authored_plan(plan_id, current_user_id, lock=True)
+        if error:
+            return error
+
+        copies = PlanOverlayService(db.session).materialize(plan_id)
+        db.session.commit()
+        if copies:
+            log_audit(
+                user_id=current_user_id,
+                action='update',
+                entity_type='training_plan',
+                entity_id=plan_id,
+                details=f"Materialized training plan '{plan.title}': copied {len(copies)} template exercises"
+            )
+        return jsonify({'plan_id': plan_id, 'copied': len(copies)}), 200
+
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error materializing training plan {plan_id}: {str(e)}")
+        return jsonify({'error': 'Failed to materialize training plan'}), 500
+
 # OpenAI API Endpoints
-@flask_app.route('/api/training-plans/<int:plan_id>/exercises', methods=['POST'])
+@api.route('/api/training-plans/<int:plan_id>/exercises', methods=['POST'])
 @jwt_required()
 def create_exercise(plan_id):
     try:
         logger.info(f"Creating new exercise for plan ID: {plan_id}")
         current_user_id = get_jwt_identity()
         current_user_id = int(current_user_id)  # Convert to integer
-        user = db.session.get(User, current_user_id)
+        user_type, _ = get_current_role()
         
-        if not user or user.user_type != 'coach':
+        if user_type != 'coach':
             logger.error(f"Access denied: User {current_user_id} is not a coach")
             return jsonify({'error': 'Access denied: User is not a coach'}), 403
             
@@ -1788,18 +2076,103 @@ def create_exercise(plan_id):
         db.session.rollback()
         return jsonify({'error': f'Failed to create exercise: {str(e)}'}), 500
 
-@flask_app.route('/api/training-plans/<int:plan_id>/exercises/<int:exercise_id>', methods=['PUT'])
+def _authored_plan(plan_id, current_user_id, lock=False):
+    """The plan and None if the current coach may edit it, else None and an error response."""
+    user_type, _ = get_current_role()
+    if user_type != 'coach':
+        return None, (jsonify({'error': 'Access denied: User is not a coach'}), 403)
+    query = TrainingPlan.query.filter_by(plan_id=plan_id)
+    # Locked so concurrent grid edits apply one after the other
+    plan = (query.with_for_update() if lock else query).first()
+    if not plan:
+        return None, (jsonify({'error': 'Training plan not found'}), 404)
+    if plan.coach_id != current_user_id:
+        return None, (jsonify({'error': 'Access denied: Not authorized to modify this plan'}), 403)
+    return plan, None
+
+@api.route('/api/training-plans/<int:plan_id>/exercises', methods=['GET'])
+@jwt_required()
+def get_exercise_grid(plan_id):
+    """The plan's exercises in grid order, with the version to send back to PUT."""
+    try:
+        plan, error = _authored_plan(plan_id, get_jwt_identity())
+        if error:
+            return error
+        exercises = PlanDiffService(db.session).exercises(plan_id)
+        return jsonify({
+            'version': plan_version(plan, exercises),
+            'exercises': [exercise.to_dict() for exercise in exercises]
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Error fetching exercises of plan {plan_id}: {str(e)}")
+        return jsonify({'error': 'Failed to fetch exercises'}), 500
+
+@api.route('/api/training-plans/<int:plan_id>/exercises', methods=['PUT'])
+@jwt_required()
+def replace_exercise_grid(plan_id):
+    """
+    Replace the plan's whole exercise grid in one transaction. The body is
+    {"exercises": [...], "version": "..."}; each exercise is its full state,
+    matched to the current ones by exercise_id or else by week, day and
+    order. Exercises left out are deleted. With a version the write only
+    happens if the plan has not changed since it was read (409 otherwise).
+    """
+    try:
+        current_user_id = get_jwt_identity()
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict) or 'exercises' not in data:
+            return jsonify({'error': 'exercises is required'}), 400
+
+        plan, error = _authored_plan(plan_id, current_user_id, lock=True)
+        if error:
+            return error
+
+        diff, version, exercises = PlanDiffService(db.session).replace_exercises(
+            plan, data['exercises'], data.get('version')
+        )
+        if not diff.empty:
+            # Bulk statements bypass the cache hooks
+            response_cache.invalidate([f'plan:{plan_id}', f'coach:{current_user_id}'] + overlay_tags(db.session, [plan_id]))
+            summary = diff.summary()
+            log_audit(
+                user_id=current_user_id,
+                action='bulk_update',
+                entity_type='training_plan',
+                entity_id=plan_id,
+                details=f"Edited exercises of training plan '{plan.title}': {summary['created']} added, "
+                        f"{summary['updated']} updated, {summary['deleted']} removed"
+            )
+
+        return jsonify({
+            'version': version,
+            **diff.summary(),
+            'exercises': [exercise.to_dict() for exercise in exercises]
+        }), 200
+
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 422
+    except PlanVersionConflict as e:
+        db.session.rollback()
+        return jsonify({'error': str(e), 'version': e.current_version}), 409
+    except Exception as e:
+        logger.error(f"Error replacing exercises of plan {plan_id}: {str(e)}")
+        db.session.rollback()
+        return jsonify({'error': 'Failed to update exercises'}), 500
+
+@api.route('/api/training-plans/<int:plan_id>/exercises/<int:exercise_id>', methods=['PUT'])
 @jwt_required()
 def update_exercise(plan_id, exercise_id):
     try:
         current_user_id = get_jwt_identity()
-        user = db.session.get(User, current_user_id)
+        user_type, _ = get_current_role()
         
-        if not user or user.user_type != 'coach':
+        if user_type != 'coach':
             return jsonify({'error': 'Access denied: User is not a coach'}), 403
             
-        exercise = PlanExercise.query.get(exercise_id)
-        if not exercise or exercise.plan_id != plan_id:
+        exercise = PlanExercise.query.filter(PlanExercise.exercise_id == exercise_id, visible_exercises(plan_id)).first()
+        if not exercise:
             return jsonify({'error': 'Exercise not found'}), 404
             
         plan = TrainingPlan.query.get(plan_id)
@@ -1810,6 +2183,10 @@ def update_exercise(plan_id, exercise_id):
         if not data:
             return jsonify({'error': 'No data provided'}), 400
 
+        if exercise.plan_id != plan_id:
+            # A template exercise shown by this overlay: edit a copy of it instead
+            exercise = PlanOverlayService(db.session).override(plan_id, exercise)
+
         # Store old values for audit log
         old_values = {
             'name': exercise.name,
@@ -1862,26 +2239,30 @@ def update_exercise(plan_id, exercise_id):
         db.session.rollback()
         return jsonify({'error': 'Failed to update exercise'}), 500
 
-@flask_app.route('/api/training-plans/<int:plan_id>/exercises/<int:exercise_id>', methods=['DELETE'])
+@api.route('/api/training-plans/<int:plan_id>/exercises/<int:exercise_id>', methods=['DELETE'])
 @jwt_required()
 def delete_exercise(plan_id, exercise_id):
     try:
         current_user_id = get_jwt_identity()
         current_user_id = int(current_user_id) 
-        user = db.session.get(User, current_user_id)
+        user_type, _ = get_current_role()
         
-        if not user or user.user_type != 'coach':
+        if user_type != 'coach':
             return jsonify({'error': 'Access denied: User is not a coach'}), 403
             
-        exercise = PlanExercise.query.get(exercise_id)
-        if not exercise or exercise.plan_id != plan_id:
+        exercise = PlanExercise.query.filter(PlanExercise.exercise_id == exercise_id, visible_exercises(plan_id)).first()
+        if not exercise:
             return jsonify({'error': 'Exercise not found'}), 404
             
         plan = TrainingPlan.query.get(plan_id)
         if int(plan.coach_id) != current_user_id:  # Convert plan.coach_id to integer as well
             return jsonify({'error': 'Access denied: Not authorized to modify this plan'}), 403
             
-        db.session.delete(exercise)
+        if exercise.plan_id != plan_id:
+            # A template exercise shown by this overlay: hide it, the template keeps it
+            PlanOverlayService(db.session).hide(plan_id, [exercise_id])
+        else:
+            db.session.delete(exercise)
         db.session.commit()
         return jsonify({'message': 'Exercise deleted successfully'}), 200
             
@@ -1890,37 +2271,41 @@ def delete_exercise(plan_id, exercise_id):
         db.session.rollback()
         return jsonify({'error': 'Failed to delete exercise'}), 500
 
-@flask_app.route('/api/meal-plans', methods=['GET'])
+@api.route('/api/meal-plans', methods=['GET'])
 @jwt_required()
+@conditional_get(lambda: collection_version(MealPlan, MealPlan.coach_id == get_jwt_identity(), joined=(MealPlan.coach,)))
 def get_meal_plans():
     try:
         current_user = get_jwt_identity()
-        user = db.session.get(User, current_user)
+        user_type, _ = get_current_role()
         
-        if not user or user.user_type != 'coach':
+        if user_type != 'coach':
             return jsonify({'error': 'Unauthorized access'}), 403
             
-        meal_plans = MealPlan.query.filter_by(coach_id=user.user_id).all()
-        return jsonify([plan.to_dict() for plan in meal_plans])
+        fields = requested_fields(MealPlan)
+        meal_plans = MealPlan.query.options(*load_options(MealPlan, fields)).filter_by(coach_id=current_user).all()
+        return jsonify(serialize(meal_plans, fields))
+    except ValueError as e:
+        return jsonify({'error': f'Invalid parameter value: {str(e)}'}), 422
     except Exception as e:
         print(f"Error fetching meal plans: {str(e)}")
         return jsonify({'error': 'Failed to fetch meal plans'}), 500
 
-@flask_app.route('/api/meal-plans', methods=['POST'])
+@api.route('/api/meal-plans', methods=['POST'])
 @jwt_required()
 def create_meal_plan():
     try:
         current_user = get_jwt_identity()
-        user = db.session.get(User, current_user)
+        user_type, _ = get_current_role()
         
-        if not user or user.user_type != 'coach':
+        if user_type != 'coach':
             return jsonify({'error': 'Unauthorized access'}), 403
             
         data = request.get_json()
         current_time = datetime.now()
         
         new_plan = MealPlan(
-            coach_id=user.user_id,
+            coach_id=current_user,
             name=data.get('name'),
             description=data.get('description'),
             total_calories=data.get('total_calories'),
@@ -1936,7 +2321,7 @@ def create_meal_plan():
         
         # Log the meal plan creation
         log_audit(
-            user_id=user.user_id,
+            user_id=current_user,
             action='create',
             entity_type='meal_plan',
             entity_id=new_plan.plan_id,
@@ -1949,19 +2334,19 @@ def create_meal_plan():
         print(f"Error creating meal plan: {str(e)}")
         return jsonify({'error': 'Failed to create meal plan'}), 500
 
-@flask_app.route('/api/meal-plans/<plan_id>', methods=['PUT'])
+@api.route('/api/meal-plans/<plan_id>', methods=['PUT'])
 @jwt_required()
 def update_meal_plan(plan_id):
     try:
         current_user = get_jwt_identity()
-        user = db.session.get(User, current_user)
+        user_type, _ = get_current_role()
         
-        if not user or user.user_type != 'coach':
+        if user_type != 'coach':
             return jsonify({'error': 'Unauthorized access'}), 403
             
         meal_plan = MealPlan.query.get(plan_id)
         
-        if not meal_plan or meal_plan.coach_id != user.user_id:
+        if not meal_plan or meal_plan.coach_id != current_user:
             return jsonify({'error': 'Meal plan not found'}), 404
             
         data = request.get_json()
@@ -1995,7 +2380,7 @@ def update_meal_plan(plan_id):
 
         if changed_fields:
             log_audit(
-                user_id=user.user_id,
+                user_id=current_user,
                 action='update',
                 entity_type='meal_plan',
                 entity_id=meal_plan.plan_id,
@@ -2008,19 +2393,19 @@ def update_meal_plan(plan_id):
         print(f"Error updating meal plan: {str(e)}")
         return jsonify({'error': 'Failed to update meal plan'}), 500
 
-@flask_app.route('/api/meal-plans/<plan_id>', methods=['DELETE'])
+@api.route('/api/meal-plans/<plan_id>', methods=['DELETE'])
 @jwt_required()
 def delete_meal_plan(plan_id):
     try:
         current_user = get_jwt_identity()
-        user = db.session.get(User, current_user)
+        user_type, _ = get_current_role()
         
-        if not user or user.user_type != 'coach':
+        if user_type != 'coach':
             return jsonify({'error': 'Unauthorized access'}), 403
             
         meal_plan = MealPlan.query.get(plan_id)
         
-        if not meal_plan or meal_plan.coach_id != user.user_id:
+        if not meal_plan or meal_plan.coach_id != current_user:
             return jsonify({'error': 'Meal plan not found'}), 404
 
         # Store meal plan details for audit log
@@ -2031,7 +2416,7 @@ def delete_meal_plan(plan_id):
 
         # Create audit log
         log_audit(
-            user_id=user.user_id,
+            user_id=current_user,
             action='delete',
             entity_type='meal_plan',
             entity_id=plan_id,
@@ -2044,38 +2429,51 @@ def delete_meal_plan(plan_id):
         print(f"Error deleting meal plan: {str(e)}")
         return jsonify({'error': 'Failed to delete meal plan'}), 500
 
-@flask_app.route('/api/meal-plans/<plan_id>/meals', methods=['GET'])
+@api.route('/api/meal-plans/<plan_id>/meals', methods=['GET'])
 @jwt_required()
+@conditional_get(lambda plan_id: collection_version(Meal, Meal.meal_plan_id == plan_id))
 def get_meals(plan_id):
     try:
         current_user = get_jwt_identity()
-        user = db.session.get(User, current_user)
+        user_type, _ = get_current_role()
         
-        if not user or user.user_type != 'coach':
+        if user_type != 'coach':
             return jsonify({'error': 'Unauthorized access'}), 403
             
-        meal_plan = MealPlan.query.get(plan_id)
-        if not meal_plan or meal_plan.coach_id != user.user_id:
+        fields = requested_fields(Meal)
+
+        def load():
+            meal_plan = db.session.get(MealPlan, plan_id)
+            if not meal_plan:
+                return None
+            meals = Meal.query.options(*load_options(Meal, fields)).filter_by(meal_plan_id=plan_id).all()
+            return {'coach_id': meal_plan.coach_id, 'meals': serialize(meals, fields)}
+
+        cached = response_cache.get_or_load(
+            f"meals:{plan_id}:{_fields_key(fields)}", [f'meal_plan:{plan_id}'], load, db.session
+        )
+        if not cached or cached['coach_id'] != current_user:
             return jsonify({'error': 'Meal plan not found'}), 404
             
-        meals = Meal.query.filter_by(meal_plan_id=plan_id).all()
-        return jsonify([meal.to_dict() for meal in meals])
+        return jsonify(cached['meals'])
+    except ValueError as e:
+        return jsonify({'error': f'Invalid parameter value: {str(e)}'}), 422
     except Exception as e:
         print(f"Error fetching meals: {str(e)}")
         return jsonify({'error': 'Failed to fetch meals'}), 500
 
-@flask_app.route('/api/meal-plans/<plan_id>/meals', methods=['POST'])
+@api.route('/api/meal-plans/<plan_id>/meals', methods=['POST'])
 @jwt_required()
 def create_meal(plan_id):
     try:
         current_user = get_jwt_identity()
-        user = db.session.get(User, current_user)
+        user_type, _ = get_current_role()
         
-        if not user or user.user_type != 'coach':
+        if user_type != 'coach':
             return jsonify({'error': 'Unauthorized access'}), 403
             
         meal_plan = MealPlan.query.get(plan_id)
-        if not meal_plan or meal_plan.coach_id != user.user_id:
+        if not meal_plan or meal_plan.coach_id != current_user:
             return jsonify({'error': 'Meal plan not found'}), 404
             
         data = request.get_json()
@@ -2109,7 +2507,7 @@ def create_meal(plan_id):
 
             # Create audit log
             log_audit(
-                user_id=user.user_id,
+                user_id=current_user,
                 action='create',
                 entity_type='meal',
                 entity_id=new_meal.meal_id,
@@ -2129,14 +2527,14 @@ def create_meal(plan_id):
         logger.error(f"Error creating meal: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-@flask_app.route('/api/meal-plans/<plan_id>/meals/<meal_id>', methods=['PUT'])
+@api.route('/api/meal-plans/<plan_id>/meals/<meal_id>', methods=['PUT'])
 @jwt_required()
 def update_meal(plan_id, meal_id):
     try:
         current_user = get_jwt_identity()
-        user = db.session.get(User, current_user)
+        user_type, _ = get_current_role()
         
-        if not user or user.user_type != 'coach':
+        if user_type != 'coach':
             return jsonify({'error': 'Unauthorized access'}), 403
             
         meal = Meal.query.get(meal_id)
@@ -2144,7 +2542,7 @@ def update_meal(plan_id, meal_id):
             return jsonify({'error': 'Meal not found'}), 404
             
         meal_plan = MealPlan.query.get(plan_id)
-        if not meal_plan or meal_plan.coach_id != user.user_id:
+        if not meal_plan or meal_plan.coach_id != current_user:
             return jsonify({'error': 'Unauthorized access'}), 403
             
         data = request.get_json()
@@ -2202,7 +2600,7 @@ def update_meal(plan_id, meal_id):
 
         if changed_fields:
             log_audit(
-                user_id=user.user_id,
+                user_id=current_user,
                 action='update',
                 entity_type='meal',
                 entity_id=meal.meal_id,
@@ -2217,14 +2615,14 @@ def update_meal(plan_id, meal_id):
         db.session.rollback()
         return jsonify({'error': f'Failed to update meal: {str(e)}'}), 500
 
-@flask_app.route('/api/meal-plans/<plan_id>/meals/<meal_id>', methods=['DELETE'])
+@api.route('/api/meal-plans/<plan_id>/meals/<meal_id>', methods=['DELETE'])
 @jwt_required()
 def delete_meal(plan_id, meal_id):
     try:
         current_user = get_jwt_identity()
-        user = db.session.get(User, current_user)
+        user_type, _ = get_current_role()
         
-        if not user or user.user_type != 'coach':
+        if user_type != 'coach':
             return jsonify({'error': 'Unauthorized access'}), 403
             
         meal = Meal.query.get(meal_id)
@@ -2232,7 +2630,7 @@ def delete_meal(plan_id, meal_id):
             return jsonify({'error': 'Meal not found'}), 404
             
         meal_plan = MealPlan.query.get(plan_id)
-        if not meal_plan or meal_plan.coach_id != user.user_id:
+        if not meal_plan or meal_plan.coach_id != current_user:
             return jsonify({'error': 'Unauthorized access'}), 403
 
         # Store meal details for audit log
@@ -2243,7 +2641,7 @@ def delete_meal(plan_id, meal_id):
 
         # Create audit log
         log_audit(
-            user_id=user.user_id,
+            user_id=current_user,
             action='delete',
             entity_type='meal',
             entity_id=meal_id,
@@ -2256,18 +2654,16 @@ def delete_meal(plan_id, meal_id):
         print(f"Error deleting meal: {str(e)}")
         return jsonify({'error': 'Failed to delete meal'}), 500
 
-@flask_app.route('/api/coach/clients/<int:client_id>/assign-plan', methods=['POST'])
+@api.route('/api/coach/clients/<int:client_id>/assign-plan', methods=['POST'])
 @jwt_required()
 def assign_training_plan(client_id):
     try:
         # Get the current user (coach)
         current_user_id = get_jwt_identity()
-        coach = db.session.get(User, current_user_id)
+        user_type, coach_profile_id = get_current_role()
         
-        if not coach or coach.user_type != 'coach' or not coach.coach_profile:
+        if user_type != 'coach' or not coach_profile_id:
             return jsonify({'error': 'Access denied: User is not a coach'}), 403
-            
-        coach_profile_id = coach.coach_profile.profile_id
         
         # Verify the client belongs to this coach
         client_relation = CoachClient.query.filter_by(
@@ -2358,8 +2754,17 @@ def assign_training_plan(client_id):
         db.session.rollback()
         return jsonify({'error': 'Failed to assign training plan'}), 500
 
-@flask_app.route('/api/user/training-plan', methods=['GET'])
+def _user_training_plan_version():
+    active_plan_ids = select(UserTrainingPlan.plan_id).where(
+        UserTrainingPlan.user_id == get_jwt_identity(),
+        UserTrainingPlan.status == 'in_progress'
+    )
+    return collection_version(TrainingPlan, with_templates(active_plan_ids), joined=(TrainingPlan.coach,))
+
+@api.route('/api/user/training-plan', methods=['GET'])
 @jwt_required()
+@read_replica
+@conditional_get(_user_training_plan_version)
 def get_user_training_plan():
     try:
         user_id = get_jwt_identity()
@@ -2381,21 +2786,17 @@ def get_user_training_plan():
             
         logger.info(f"[get_user_training_plan] Found assignment: {assignment.to_dict()}")
             
-        # Get the training plan details
-        plan = TrainingPlan.query.get(assignment.plan_id)
-        if not plan:
+        # Get the training plan details, exercises included
+        plan_data = _cached_plan(assignment.plan_id)
+        if not plan_data:
             logger.error(f"[get_user_training_plan] Training plan not found for ID: {assignment.plan_id}")
             return jsonify({'error': 'Training plan not found'}), 404
             
-        logger.info(f"[get_user_training_plan] Found training plan: {plan.title}")
-            
-        # Get all exercises for this plan
-        exercises = PlanExercise.query.filter_by(plan_id=plan.plan_id).all()
-        logger.info(f"[get_user_training_plan] Found {len(exercises)} exercises for plan: {plan.plan_id}")
+        logger.info(f"[get_user_training_plan] Found training plan: {plan_data['title']} with {len(plan_data['exercises'])} exercises")
         
         return jsonify({
-            'training_plan': plan.to_dict(),
-            'exercises': [exercise.to_dict() for exercise in exercises]
+            'training_plan': plan_data,
+            'exercises': plan_data['exercises']
         }), 200
         
     except Exception as e:
@@ -2404,7 +2805,7 @@ def get_user_training_plan():
 
 # Add these endpoints after the get_user_training_plan endpoint
 
-@flask_app.route('/api/user/progress', methods=['GET'])
+@api.route('/api/user/progress', methods=['GET'])
 @jwt_required()
 def get_user_progress():
     try:
@@ -2431,7 +2832,7 @@ def get_user_progress():
             return jsonify({'error': 'Training plan not found'}), 404
             
         # Get all exercises for this plan
-        exercises = PlanExercise.query.filter_by(plan_id=plan.plan_id).all()
+        exercises = PlanExercise.query.filter(visible_exercises(plan.plan_id)).all()
         exercise_ids = [exercise.exercise_id for exercise in exercises]
         
         # Get all progress records for these exercises
@@ -2459,7 +2860,7 @@ def get_user_progress():
         logger.error(f"Error fetching user progress: {str(e)}")
         return jsonify({'error': 'Failed to fetch progress records'}), 500
 
-@flask_app.route('/api/user/progress', methods=['POST'])
+@api.route('/api/user/progress', methods=['POST'])
 @jwt_required()
 def add_progress_record():
     try:
@@ -2510,7 +2911,7 @@ def add_progress_record():
         db.session.rollback()
         return jsonify({'error': 'Failed to add progress record'}), 500
 
-@flask_app.route('/api/user/progress/<int:record_id>', methods=['PUT'])
+@api.route('/api/user/progress/<int:record_id>', methods=['PUT'])
 @jwt_required()
 def update_progress_record(record_id):
     try:
@@ -2567,7 +2968,7 @@ def update_progress_record(record_id):
         db.session.rollback()
         return jsonify({'error': 'Failed to update progress record'}), 500
 
-@flask_app.route('/api/user/progress/<int:record_id>', methods=['DELETE'])
+@api.route('/api/user/progress/<int:record_id>', methods=['DELETE'])
 @jwt_required()
 def delete_progress_record(record_id):
     try:
@@ -2598,16 +2999,50 @@ def delete_progress_record(record_id):
         db.session.rollback()
         return jsonify({'error': 'Failed to delete progress record'}), 500
 
+def _parse_rollup_args():
+    # Shared query parameters of the progress rollup endpoints
+    exercise_ids = [int(exercise_id) for exercise_id in request.args.get('exercise_ids', '').split(',') if exercise_id.strip()]
+    start = request.args.get('from')
+    end = request.args.get('to')
+    return {
+        'period': request.args.get('period', 'week'),
+        'exercise_ids': exercise_ids or None,
+        'start': datetime.strptime(start, '%Y-%m-%d').date() if start else None,
+        'end': datetime.strptime(end, '%Y-%m-%d').date() if end else None
+    }
+
+@api.route('/api/user/progress/rollups', methods=['GET'])
+@jwt_required()
+def get_user_progress_rollups():
+    try:
+        user_id = get_jwt_identity()
+        try:
+            rollups = ProgressRollupService(db.session).get_rollups(user_id, **_parse_rollup_args())
+        except ValueError as e:
+            return jsonify({'error': f'Invalid parameter value: {str(e)}'}), 422
+
+        return jsonify({'rollups': [rollup.to_dict() for rollup in rollups]}), 200
+
+    except Exception as e:
+        logger.error(f"Error fetching progress rollups: {str(e)}")
+        return jsonify({'error': 'Failed to fetch progress rollups'}), 500
+
 # Body Metrics Endpoints
-@flask_app.route('/api/user/body-metrics', methods=['GET'])
+@api.route('/api/user/body-metrics', methods=['GET'])
 @jwt_required()
+@read_replica
 def get_body_metrics():
     try:
-        metrics = BodyMetrics.query.filter_by(user_id=get_jwt_identity()).order_by(BodyMetrics.date.desc()).all()
+        fields = requested_fields(BodyMetrics)
+        metrics = BodyMetrics.query.options(*load_options(BodyMetrics, fields)).filter_by(
+            user_id=get_jwt_identity()
+        ).order_by(BodyMetrics.date.desc()).all()
         return jsonify({
             'status': 'success',
-            'body_metrics': [metric.to_dict() for metric in metrics]
+            'body_metrics': serialize(metrics, fields)
         })
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': f'Invalid parameter value: {str(e)}'}), 422
     except Exception as e:
         print(f"Error fetching body metrics: {str(e)}")
         return jsonify({
@@ -2615,7 +3050,7 @@ def get_body_metrics():
             'message': 'Failed to fetch body metrics'
         }), 500
 
-@flask_app.route('/api/user/body-metrics', methods=['POST'])
+@api.route('/api/user/body-metrics', methods=['POST'])
 @jwt_required()
 def add_body_metrics():
     try:
@@ -2642,7 +3077,7 @@ def add_body_metrics():
             if photo.filename:
                 logger.info(f"[add_body_metrics] Processing photo: {photo.filename}")
                 filename = secure_filename(f"{uuid.uuid4()}_{photo.filename}")
-                photo_path = os.path.join(flask_app.config['UPLOAD_FOLDER'], 'progress_photos', filename)
+                photo_path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'progress_photos', filename)
                 logger.info(f"[add_body_metrics] Saving photo to: {photo_path}")
                 os.makedirs(os.path.dirname(photo_path), exist_ok=True)
                 photo.save(photo_path)
@@ -2731,7 +3166,7 @@ def add_body_metrics():
             'message': f'Failed to add body metrics: {str(e)}'
         }), 500
 
-@flask_app.route('/api/user/body-metrics/<int:metric_id>', methods=['PUT'])
+@api.route('/api/user/body-metrics/<int:metric_id>', methods=['PUT'])
 @jwt_required()
 def update_body_metrics(metric_id):
     try:
@@ -2761,12 +3196,12 @@ def update_body_metrics(metric_id):
             if photo.filename:
                 # Delete old photo if exists
                 if metric.photo_url:
-                    old_photo_path = os.path.join(flask_app.config['UPLOAD_FOLDER'], metric.photo_url.lstrip('/uploads/'))
+                    old_photo_path = os.path.join(current_app.config['UPLOAD_FOLDER'], metric.photo_url.lstrip('/uploads/'))
                     if os.path.exists(old_photo_path):
                         os.remove(old_photo_path)
 
                 filename = secure_filename(f"{uuid.uuid4()}_{photo.filename}")
-                photo_path = os.path.join(flask_app.config['UPLOAD_FOLDER'], 'progress_photos', filename)
+                photo_path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'progress_photos', filename)
                 os.makedirs(os.path.dirname(photo_path), exist_ok=True)
                 photo.save(photo_path)
                 metric.photo_url = f"/uploads/progress_photos/{filename}"
@@ -2840,31 +3275,26 @@ def update_body_metrics(metric_id):
             'message': 'Failed to update body metrics'
         }), 500
 
-# Configure upload folder
-UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
-flask_app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-os.makedirs(os.path.join(UPLOAD_FOLDER, 'progress_photos'), exist_ok=True)
-
 # Add route to serve uploaded files
-@flask_app.route('/uploads/<path:filename>')
+@api.route('/uploads/<path:filename>')
 def uploaded_file(filename):
-    return send_file(os.path.join(flask_app.config['UPLOAD_FOLDER'], filename))
+    return send_file(os.path.join(current_app.config['UPLOAD_FOLDER'], filename))
 
 # Coach endpoints for client progress
-@flask_app.route('/api/coach/clients/<int:client_id>/info', methods=['GET'])
+@api.route('/api/coach/clients/<int:client_id>/info', methods=['GET'])
 @jwt_required()
 def get_client_info(client_id):
     try:
         # Get the current user (coach)
         current_user_id = get_jwt_identity()
-        coach = User.query.get(current_user_id)
+        user_type, coach_profile_id = get_current_role()
         
-        if not coach or coach.user_type != 'coach' or not coach.coach_profile:
+        if user_type != 'coach' or not coach_profile_id:
             return jsonify({'error': 'Access denied: User is not a coach'}), 403
 
         # Verify client belongs to this coach
         client_relation = CoachClient.query.filter_by(
-            coach_id=coach.coach_profile.profile_id,
+            coach_id=coach_profile_id,
             client_id=client_id,
             status='active'
         ).first()
@@ -2890,20 +3320,21 @@ def get_client_info(client_id):
         logger.error(f"Error getting client info: {str(e)}")
         return jsonify({'error': 'Failed to get client info'}), 500
 
-@flask_app.route('/api/coach/clients/<int:client_id>/progress', methods=['GET'])
+@api.route('/api/coach/clients/<int:client_id>/progress', methods=['GET'])
 @jwt_required()
+@read_replica
 def get_client_progress(client_id):
     try:
         # Get the current user (coach)
         current_user_id = get_jwt_identity()
-        coach = User.query.get(current_user_id)
+        user_type, coach_profile_id = get_current_role()
         
-        if not coach or coach.user_type != 'coach' or not coach.coach_profile:
+        if user_type != 'coach' or not coach_profile_id:
             return jsonify({'error': 'Access denied: User is not a coach'}), 403
 
         # Verify client belongs to this coach
         client_relation = CoachClient.query.filter_by(
-            coach_id=coach.coach_profile.profile_id,
+            coach_id=coach_profile_id,
             client_id=client_id,
             status='active'
         ).first()
@@ -2911,11 +3342,12 @@ def get_client_progress(client_id):
         if not client_relation:
             return jsonify({'error': 'Client not found or not assigned to you'}), 404
 
-        # Get progress records
-        progress_records = ProgressTracking.query.filter_by(user_id=client_id).all()
+        # Get progress records, with their exercises in one extra query
+        progress_records = ProgressTracking.query.filter_by(user_id=client_id)\
+            .options(selectinload(ProgressTracking.exercise)).all()
         records = []
         for record in progress_records:
-            exercise = PlanExercise.query.get(record.exercise_id)
+            exercise = record.exercise
             record_data = record.to_dict()
             record_data['exercise'] = exercise.to_dict() if exercise else {'name': 'Unknown Exercise'}
             records.append(record_data)
@@ -2926,20 +3358,50 @@ def get_client_progress(client_id):
         logger.error(f"Error getting client progress: {str(e)}")
         return jsonify({'error': 'Failed to get client progress'}), 500
 
-@flask_app.route('/api/coach/clients/<int:client_id>/metrics', methods=['GET'])
+@api.route('/api/coach/clients/<int:client_id>/progress/rollups', methods=['GET'])
+@jwt_required()
+def get_client_progress_rollups(client_id):
+    try:
+        user_type, coach_profile_id = get_current_role()
+        
+        if user_type != 'coach' or not coach_profile_id:
+            return jsonify({'error': 'Access denied: User is not a coach'}), 403
+
+        # Verify client belongs to this coach
+        client_relation = CoachClient.query.filter_by(
+            coach_id=coach_profile_id,
+            client_id=client_id,
+            status='active'
+        ).first()
+        
+        if not client_relation:
+            return jsonify({'error': 'Client not found or not assigned to you'}), 404
+
+        try:
+            rollups = ProgressRollupService(db.session).get_rollups(client_id, **_parse_rollup_args())
+        except ValueError as e:
+            return jsonify({'error': f'Invalid parameter value: {str(e)}'}), 422
+
+        return jsonify({'rollups': [rollup.to_dict() for rollup in rollups]}), 200
+
+    except Exception as e:
+        logger.error(f"Error getting client progress rollups: {str(e)}")
+        return jsonify({'error': 'Failed to get client progress rollups'}), 500
+
+@api.route('/api/coach/clients/<int:client_id>/metrics', methods=['GET'])
 @jwt_required()
 def get_client_metrics(client_id):
     try:
         # Get the current user (coach)
         current_user_id = get_jwt_identity()
-        coach = User.query.get(current_user_id)
+        user_type, coach_profile_id = get_current_role()
         
-        if not coach or coach.user_type != 'coach' or not coach.coach_profile:
+        if user_type != 'coach' or not coach_profile_id:
             return jsonify({'error': 'Access denied: User is not a coach'}), 403
 
         # Verify client belongs to this coach
         client_relation = CoachClient.query.filter_by(
-            coach_id=coach.coach_profile.profile_id,
+            coach_id=coach_profile_id,
             client_id=client_id,
             status='active'
         ).first()
@@ -2957,20 +3419,20 @@ def get_client_metrics(client_id):
         logger.error(f"Error getting client metrics: {str(e)}")
         return jsonify({'error': 'Failed to get client metrics'}), 500
 
-@flask_app.route('/api/coach/clients/<int:client_id>/exercises', methods=['GET'])
+@api.route('/api/coach/clients/<int:client_id>/exercises', methods=['GET'])
 @jwt_required()
 def get_client_exercises(client_id):
     try:
         # Get the current user (coach)
         current_user_id = get_jwt_identity()
-        coach = User.query.get(current_user_id)
+        user_type, coach_profile_id = get_current_role()
         
-        if not coach or coach.user_type != 'coach' or not coach.coach_profile:
+        if user_type != 'coach' or not coach_profile_id:
             return jsonify({'error': 'Access denied: User is not a coach'}), 403
 
         # Verify client belongs to this coach
         client_relation = CoachClient.query.filter_by(
-            coach_id=coach.coach_profile.profile_id,
+            coach_id=coach_profile_id,
             client_id=client_id,
             status='active'
         ).first()
@@ -2997,31 +3459,35 @@ def get_client_exercises(client_id):
         logger.error(f"Error getting client exercises: {str(e)}")
         return jsonify({'error': 'Failed to get client exercises'}), 500
 
-@flask_app.route('/api/admin/training-plans', methods=['GET'])
+@api.route('/api/admin/training-plans', methods=['GET'])
 @jwt_required()
+@conditional_get(lambda: collection_version(TrainingPlan, joined=(TrainingPlan.coach,)))
 def get_all_training_plans():
     try:
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user_type, _ = get_current_role()
         
-        if not user or user.user_type != 'admin':
+        if user_type != 'admin':
             return jsonify({'error': 'Access denied: User is not an admin'}), 403
             
-        training_plans = TrainingPlan.query.all()
-        return jsonify([plan.to_dict() for plan in training_plans]), 200
+        fields = requested_fields(TrainingPlan)
+        training_plans = TrainingPlan.query.options(*load_options(TrainingPlan, fields)).all()
+        return jsonify(_with_overlay_exercises(training_plans, serialize(training_plans, fields), fields)), 200
             
+    except ValueError as e:
+        return jsonify({'error': f'Invalid parameter value: {str(e)}'}), 422
     except Exception as e:
         logger.error(f"Error fetching all training plans: {str(e)}")
         return jsonify({'error': 'Failed to fetch training plans'}), 500
 
-@flask_app.route('/api/coach/clients/<int:client_id>/assign-meal-plan', methods=['POST'])
+@api.route('/api/coach/clients/<int:client_id>/assign-meal-plan', methods=['POST'])
 @jwt_required()
 def assign_meal_plan(client_id):
     try:
         current_user_id = get_jwt_identity()
-        coach = User.query.get(current_user_id)
+        user_type, _ = get_current_role()
         
-        if not coach or coach.user_type != 'coach':
+        if user_type != 'coach':
             return jsonify({'error': 'Unauthorized access'}), 403
 
         data = request.get_json()
@@ -3077,60 +3543,64 @@ def assign_meal_plan(client_id):
         logger.error(f"Error assigning meal plan: {str(e)}")
         return jsonify({'error': 'Failed to assign meal plan'}), 500
 
-@flask_app.route('/api/admin/meal-plans', methods=['GET'])
+@api.route('/api/admin/meal-plans', methods=['GET'])
 @jwt_required()
+@conditional_get(lambda: collection_version(MealPlan, joined=(MealPlan.coach,)))
 def get_all_meal_plans():
     try:
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user_type, _ = get_current_role()
         
-        if not user or user.user_type != 'admin':
+        if user_type != 'admin':
             return jsonify({'error': 'Access denied: User is not an admin'}), 403
             
-        meal_plans = MealPlan.query.all()
-        return jsonify({'meal_plans': [plan.to_dict() for plan in meal_plans]}), 200
+        fields = requested_fields(MealPlan)
+        meal_plans = MealPlan.query.options(*load_options(MealPlan, fields)).all()
+        return jsonify({'meal_plans': serialize(meal_plans, fields)}), 200
             
+    except ValueError as e:
+        return jsonify({'error': f'Invalid parameter value: {str(e)}'}), 422
     except Exception as e:
         logger.error(f"Error fetching all meal plans: {str(e)}")
         return jsonify({'error': 'Failed to fetch meal plans'}), 500
 
-@flask_app.route('/api/admin/meal-plans/<plan_id>', methods=['GET'])
+@api.route('/api/admin/meal-plans/<plan_id>', methods=['GET'])
 @jwt_required()
+@conditional_get(lambda plan_id: collection_version(MealPlan, MealPlan.id == plan_id, joined=(MealPlan.coach,)))
 def get_admin_meal_plan(plan_id):
     try:
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user_type, _ = get_current_role()
         
-        if not user or user.user_type != 'admin':
+        if user_type != 'admin':
             return jsonify({'error': 'Access denied: User is not an admin'}), 403
             
         meal_plan = MealPlan.query.get(plan_id)
         if not meal_plan:
             return jsonify({'error': 'Meal plan not found'}), 404
             
-        return jsonify(meal_plan.to_dict()), 200
+        return jsonify(serialize(meal_plan, requested_fields(MealPlan))), 200
             
+    except ValueError as e:
+        return jsonify({'error': f'Invalid parameter value: {str(e)}'}), 422
     except Exception as e:
         logger.error(f"Error fetching meal plan: {str(e)}")
         return jsonify({'error': 'Failed to fetch meal plan'}), 500
 
-@flask_app.route('/api/admin/training-plans/<int:plan_id>', methods=['GET'])
+@api.route('/api/admin/training-plans/<int:plan_id>', methods=['GET'])
 @jwt_required()
+@conditional_get(lambda plan_id: _plan_version(plan_id))
 def get_admin_training_plan(plan_id):
     try:
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user_type, _ = get_current_role()
         
-        if not user or user.user_type != 'admin':
+        if user_type != 'admin':
             return jsonify({'error': 'Access denied: User is not an admin'}), 403
             
-        plan = TrainingPlan.query.get(plan_id)
-        if not plan:
+        plan_data = _cached_plan(plan_id)
+        if not plan_data:
             return jsonify({'error': 'Training plan not found'}), 404
-            
-        plan_data = plan.to_dict()
-        exercises = PlanExercise.query.filter_by(plan_id=plan_id).all()
-        plan_data['exercises'] = [exercise.to_dict() for exercise in exercises]
         
         return jsonify(plan_data), 200
             
@@ -3139,68 +3609,52 @@ def get_admin_training_plan(plan_id):
         return jsonify({'error': 'Failed to fetch training plan'}), 500
 
 # Audit Logs Endpoint
-@flask_app.route('/api/admin/audit-logs', methods=['GET'])
+@api.route('/api/admin/audit-logs', methods=['GET'])
 @admin_required
+@read_replica
 def get_audit_logs():
     try:
         logger.info(f"Received parameters: {request.args}")
         
         try:
-            page = request.args.get('page', 1, type=int)
             per_page = request.args.get('per_page', 10, type=int)
+            cursor = request.args.get('cursor')
+            # OFFSET paging is kept for old clients; pass cursor=next_cursor instead
+            page = request.args.get('page', type=int)
             sort_by = request.args.get('sort_by', 'created_at')
             sort_order = request.args.get('sort_order', 'desc')
+            count = request.args.get('count', 'exact')
             action = request.args.get('action')
             entity_type = request.args.get('entity_type')
+            user_id = request.args.get('user_id', type=int)
             user_type = request.args.get('user_type')
             user_search = request.args.get('user_search', '').strip()
             
-            logger.info(f"Parsed parameters: page={page}, per_page={per_page}, sort_by={sort_by}, sort_order={sort_order}")
-            logger.info(f"Filters: action={action}, entity_type={entity_type}, user_type={user_type}, user_search={user_search}")
+            logger.info(f"Parsed parameters: cursor={cursor}, page={page}, per_page={per_page}, sort_by={sort_by}, sort_order={sort_order}, count={count}")
+            logger.info(f"Filters: action={action}, entity_type={entity_type}, user_id={user_id}, user_type={user_type}, user_search={user_search}")
+
+            result = AuditLogService(db.session).get_logs(
+                per_page=per_page,
+                cursor=cursor,
+                page=page,
+                sort_by=sort_by,
+                sort_order=sort_order,
+                action=action,
+                entity_type=entity_type,
+                user_id=user_id,
+                user_type=user_type,
+                user_search=user_search,
+                count=count
+            )
             
         except ValueError as e:
             logger.error(f"Invalid parameter value: {str(e)}")
             return jsonify({'error': f'Invalid parameter value: {str(e)}'}), 422
 
-        query = AuditLog.query.join(User)
-
-        if action:
-            query = query.filter(AuditLog.action == action)
-        if entity_type:
-            query = query.filter(AuditLog.entity_type == entity_type)
-        if user_type:
-            query = query.filter(User.user_type == user_type)
-        if user_search:
-            search_term = f"%{user_search}%"
-            query = query.filter(
-                db.or_(
-                    User.first_name.ilike(search_term),
-                    User.last_name.ilike(search_term),
-                    User.email.ilike(search_term),
-                    db.func.concat(User.first_name, ' ', User.last_name).ilike(search_term)
-                )
-            )
-
-        valid_sort_fields = ['created_at', 'action', 'entity_type', 'entity_id']
-        if sort_by not in valid_sort_fields:
-            logger.error(f"Invalid sort field: {sort_by}")
-            return jsonify({
-                'error': f'Invalid sort field. Must be one of: {", ".join(valid_sort_fields)}'
-            }), 422
-
-        if sort_order == 'desc':
-            query = query.order_by(desc(getattr(AuditLog, sort_by)))
-        else:
-            query = query.order_by(asc(getattr(AuditLog, sort_by)))
-
-        total = query.count()
-        logger.info(f"Total records found: {total}")
-
-        logs = query.offset((page - 1) * per_page).limit(per_page).all()
-        logger.info(f"Retrieved {len(logs)} records for page {page}")
+        logger.info(f"Retrieved {len(result['logs'])} records, total={result['total']} (estimated: {result['total_is_estimate']})")
 
         serialized_logs = []
-        for log in logs:
+        for log in result['logs']:
             log_dict = {
                 'id': log.id,
                 'created_at': log.created_at.isoformat(),
@@ -3221,7 +3675,9 @@ def get_audit_logs():
 
         return jsonify({
             'logs': serialized_logs,
-            'total': total
+            'total': result['total'],
+            'total_is_estimate': result['total_is_estimate'],
+            'next_cursor': result['next_cursor']
         }), 200
 
     except Exception as e:
@@ -3229,7 +3685,7 @@ def get_audit_logs():
         return jsonify({'error': f'Failed to fetch audit logs: {str(e)}'}), 500
 
 
-@flask_app.route('/api/admin/invite-link', methods=['POST'])
+@api.route('/api/admin/invite-link', methods=['POST'])
 @admin_required
 def create_invite_link():
     try:
@@ -3273,21 +3729,16 @@ def create_invite_link():
         )
         
         db.session.add(invite)
-        db.session.commit()
 
-        # Send invitation email
-        try:
-            invite_email = InviteEmail(email, token, user_type)
-            html = invite_email.invite_mail()
-            email_service.send_email(
-                    to_email=email,
-                    subject="Invite to Train-Sync",
-                    html_content=html,
-                    sender_name="TrainSync"
-                )
-        except Exception as e:
-            # Log the error but don't fail the request
-            print(f"Failed to send invitation email: {str(e)}")
+        # Queue the invitation email; it is only sent if the invite is saved
+        invite_email = InviteEmail(email, token, user_type)
+        EmailOutboxService(db.session).enqueue(
+            to_email=email,
+            subject="Invite to Train-Sync",
+            html_content=invite_email.invite_mail(),
+            sender_name="TrainSync"
+        )
+        db.session.commit()
 
         # Log the action
         log_audit(
@@ -3307,7 +3758,7 @@ def create_invite_link():
         db.session.rollback()
         return jsonify({'error': f'Failed to create invite link: {str(e)}'}), 500
 
-@flask_app.route('/api/auth/verify-invite', methods=['GET'])
+@api.route('/api/auth/verify-invite', methods=['GET'])
 def verify_invite():
     token = request.args.get('token')
     if not token:
@@ -3327,7 +3778,7 @@ def verify_invite():
     }), 200
 
 
-@flask_app.route('/api/auth/setup-password', methods=['POST'])
+@api.route('/api/auth/setup-password', methods=['POST'])
 @jwt_required()
 def setup_password():
     try:
@@ -3388,6 +3839,114 @@ def validate_user_profile_data(data):
     except ValueError as e:
         return jsonify({'error': str(e)}), 400
 
+@api.route('/health')
+def health():
+    """Liveness probe for the container healthcheck; never touches the database or external services."""
+    return jsonify({'status': 'ok', 'startup': current_app.config['STARTUP_TIMINGS']}), 200
+
+
+@api.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint, summed over all gunicorn workers. Set METRICS_TOKEN to require a bearer token."""
+    token = os.getenv('METRICS_TOKEN')
+    if token and not secrets.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    return render_metrics(), 200, {'Content-Type': METRICS_CONTENT_TYPE}
+
+
+# Configure upload folder
+UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
+
+
+def create_app(config=None):
+    """
+    Create and configure the Flask app.
+
+    Does no database or network work, so every gunicorn worker starts quickly
+    and without network access. Schema creation and seeding are done once per
+    deploy by `flask --app server bootstrap`.
+
+    Args:
+        config (dict, optional): Overrides applied on top of the defaults
+
+    Returns:
+        Flask: The configured application
+    """
+    started = time.perf_counter()
+    app = Flask(__name__)
+    # jsonify renders with orjson; see serialization.py
+    app.json = OrjsonProvider(app)
+    app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'your-secret-key')  # Change in production
+    app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(days=1)
+    app.config['JWT_ERROR_MESSAGE_KEY'] = 'error'
+    app.config['JWT_ALGORITHM'] = 'HS256'  # Explicitly set the algorithm
+    app.config['JWT_TOKEN_LOCATION'] = ['headers']  # Only look for tokens in headers
+    app.config['JWT_HEADER_NAME'] = 'Authorization'  # Header name
+    app.config['JWT_HEADER_TYPE'] = 'Bearer'  # Header type
+
+    # Add timeout configuration
+    app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(minutes=10)  # 10 minutes session timeout
+    app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max request size
+    app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+    if config:
+        app.config.update(config)
+    os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], 'progress_photos'), exist_ok=True)
+
+    # Initialize JWT
+    jwt.init_app(app)
+
+    # Configure CORS
+    CORS(app, resources={
+        r"/api/*": {
+            "origins": ["http://localhost:3000"],
+            "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+            "allow_headers": ["Content-Type", "Authorization"]
+        }
+    })
+
+    # Bind the database; tables are created by the bootstrap command
+    init_db(app)
+    # First, so requests answered by the hooks below are counted and timed as well
+    init_query_tracking(app, debug=ENVIRONMENT == 'development')
+    init_profiler(app)
+    init_metrics(app)
+    init_replica_routing(app)
+    init_maintenance_mode(app)
+
+    # Audit entries are written by a pluggable sink (batched in the background by default)
+    app.extensions['audit_sink'] = create_audit_sink(app)
+
+    # Progress rollups are kept current by flush hooks on every ProgressTracking write
+    register_rollup_hooks()
+
+    # Writes to exercises and meals move their plan's updated_at, which conditional GETs validate against
+    register_touch_hooks()
+
+    # Cached plan and meal payloads are invalidated by the same ORM writes
+    register_cache_hooks()
+
+    app.register_blueprint(api)
+
+    # Support for reverse proxy headers
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1)
+
+    finished = time.perf_counter()
+    app.config['STARTUP_TIMINGS'] = {
+        'import_ms': round((started - _IMPORT_STARTED) * 1000, 1),
+        'create_app_ms': round((finished - started) * 1000, 1)
+    }
+    logger.info(
+        f"App created in {app.config['STARTUP_TIMINGS']['create_app_ms']}ms "
+        f"(module import took {app.config['STARTUP_TIMINGS']['import_ms']}ms, pid {os.getpid()})"
+    )
+    return app
+
+
+flask_app = create_app()
+
+
 if __name__ == '__main__':
+    # The dev server creates missing tables itself; deployments run the bootstrap command instead
+    with flask_app.app_context():
+        create_schema(flask_app)
     flask_app.run(host='0.0.0.0', port=8888, debug=True)
-                
\ No newline at end of file
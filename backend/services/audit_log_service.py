@@ -0,0 +1,152 @@
+import json
+import base64
+from datetime import datetime
+from sqlalchemy import or_, func, tuple_
+from sqlalchemy.orm import Session, contains_eager
+from typing import Dict, Optional
+from models.audit_log import AuditLog
+from models.user import User
+from services.audit_storage import audit_storage
+
+# Sortable columns; every sort is made unique by AuditLog.id so keyset pagination is stable
+AUDIT_SORT_COLUMNS = ('created_at', 'action', 'entity_type', 'entity_id')
+
+# 'estimated' uses the PostgreSQL planner and falls back to 'exact' elsewhere
+COUNT_MODES = ('exact', 'estimated', 'none')
+
+
+class AuditLogService:
+    """
+    Browses audit logs with keyset pagination on (sort column, id), across
+    the hot table and any rotated archive tables (see AuditStorage).
+
+    A page is fetched with `WHERE (sort_col, id) < (last_value, last_id)`
+    instead of OFFSET, so reading page 10,000 costs the same as page 1 when
+    an index covers the filter and sort (see AuditLog.__table_args__).
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get_logs(self, per_page: int = 10, cursor: Optional[str] = None,
+                 page: Optional[int] = None, sort_by: str = 'created_at',
+                 sort_order: str = 'desc', action: Optional[str] = None,
+                 entity_type: Optional[str] = None, user_id: Optional[int] = None,
+                 user_type: Optional[str] = None, user_search: Optional[str] = None,
+                 count: str = 'exact') -> Dict:
+        """
+        Get one page of audit logs.
+
+        Args:
+            per_page (int): Page size
+            cursor (str, optional): next_cursor from the previous page
+            page (int, optional): 1-based page number for OFFSET paging, ignored with a cursor
+            sort_by (str): One of AUDIT_SORT_COLUMNS
+            sort_order (str): 'asc' or 'desc'
+            action, entity_type, user_id, user_type, user_search: Optional filters
+            count (str): One of COUNT_MODES
+
+        Returns:
+            Dict: {'logs', 'total', 'total_is_estimate', 'next_cursor'}
+        """
+        if sort_by not in AUDIT_SORT_COLUMNS:
+            raise ValueError(f"Invalid sort field. Must be one of: {', '.join(AUDIT_SORT_COLUMNS)}")
+        if sort_order not in ('asc', 'desc'):
+            raise ValueError("Invalid sort order. Must be 'asc' or 'desc'")
+        if count not in COUNT_MODES:
+            raise ValueError(f"Invalid count mode. Must be one of: {', '.join(COUNT_MODES)}")
+        if per_page < 1 or (page is not None and page < 1):
+            raise ValueError("page and per_page must be positive integers")
+
+        log = audit_storage.log_source()
+        query = self.db.query(log).join(User, log.user_id == User.user_id)
+        if action:
+            query = query.filter(log.action == action)
+        if entity_type:
+            query = query.filter(log.entity_type == entity_type)
+        if user_id:
+            query = query.filter(log.user_id == user_id)
+        if user_type:
+            query = query.filter(User.user_type == user_type)
+        if user_search:
+            search_term = f"%{user_search}%"
+            query = query.filter(
+                or_(
+                    User.first_name.ilike(search_term),
+                    User.last_name.ilike(search_term),
+                    User.email.ilike(search_term),
+                    func.concat(User.first_name, ' ', User.last_name).ilike(search_term)
+                )
+            )
+
+        total, total_is_estimate = self._count(query, log, count)
+
+        sort_column = getattr(log, sort_by)
+        key = tuple_(sort_column, log.id)
+        if cursor:
+            last_value, last_id = self._decode_cursor(cursor, sort_by, sort_order)
+            boundary = tuple_(last_value, last_id)
+            query = query.filter(key < boundary if sort_order == 'desc' else key > boundary)
+
+        if sort_order == 'desc':
+            query = query.order_by(sort_column.desc(), log.id.desc())
+        else:
+            query = query.order_by(sort_column.asc(), log.id.asc())
+
+        if page and not cursor:
+            query = query.offset((page - 1) * per_page)
+
+        # One extra row tells us whether another page exists
+        logs = query.options(contains_eager(log.user)).limit(per_page + 1).all()
+        next_cursor = None
+        if len(logs) > per_page:
+            logs = logs[:per_page]
+            next_cursor = self._encode_cursor(logs[-1], sort_by, sort_order)
+
+        return {
+            'logs': logs,
+            'total': total,
+            'total_is_estimate': total_is_estimate,
+            'next_cursor': next_cursor
+        }
+
+    def _count(self, query, log, mode: str):
+        if mode == 'none':
+            return None, False
+        if mode == 'estimated' and self.db.get_bind().dialect.name == 'postgresql':
+            return self._estimate_rows(query, log), True
+        return query.order_by(None).with_entities(func.count(log.id)).scalar(), False
+
+    def _estimate_rows(self, query, log) -> int:
+        # The planner's row estimate comes from table statistics and costs no scan
+        connection = self.db.connection()
+        compiled = query.with_entities(log.id).statement.compile(dialect=connection.dialect)
+        plan = connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled.string}", compiled.params).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    @staticmethod
+    def _encode_cursor(log: AuditLog, sort_by: str, sort_order: str) -> str:
+        value = getattr(log, sort_by)
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        payload = json.dumps({'s': sort_by, 'o': sort_order, 'v': value, 'id': log.id})
+        return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def _decode_cursor(cursor: str, sort_by: str, sort_order: str):
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+            cursor_sort = (payload['s'], payload['o'])
+            value, last_id = payload['v'], int(payload['id'])
+        except (ValueError, KeyError, TypeError):
+            raise ValueError("Invalid cursor")
+        if cursor_sort != (sort_by, sort_order):
+            raise ValueError("Cursor does not match the requested sort")
+        if sort_by == 'created_at':
+            try:
+                value = datetime.fromisoformat(value)
+            except (ValueError, TypeError):
+                raise ValueError("Invalid cursor")
+        return value, last_id
@@ -0,0 +1,276 @@
+import os
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+from sqlalchemy import insert
+from sqlalchemy.exc import OperationalError, InterfaceError
+from database import db
+from models.audit_log import AuditLog
+
+logger = logging.getLogger(__name__)
+
+# What BatchedAuditSink does when its queue is full
+OVERFLOW_BLOCK = 'block'
+OVERFLOW_DROP = 'drop'
+OVERFLOW_SPILL = 'spill'
+
+
+class AuditSink:
+    """
+    Destination for audit log entries. An entry is a dict of AuditLog column
+    values (user_id, action, entity_type, entity_id, details, ip_address,
+    user_agent, created_at).
+    """
+
+    def emit(self, entry: Dict) -> None:
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        pass
+
+    def shutdown(self, timeout: Optional[float] = None) -> None:
+        pass
+
+    def stats(self) -> Dict:
+        return {}
+
+
+class SessionAuditSink(AuditSink):
+    """
+    Writes every entry immediately in its own transaction on the request's
+    session. This is the original log_audit behaviour.
+    """
+
+    def emit(self, entry: Dict) -> None:
+        try:
+            db.session.execute(insert(AuditLog), [entry])
+            db.session.commit()
+        except Exception as e:
+            logger.error(f"Error creating audit log: {str(e)}")
+            db.session.rollback()
+
+
+class BatchedAuditSink(AuditSink):
+    """
+    Queues entries in memory and writes them from a background thread with a
+    single multi-row INSERT per batch. A batch is flushed when it reaches
+    `batch_size` entries or when `flush_interval` seconds have passed since
+    its first entry, whichever comes first.
+
+    The queue is bounded by `max_queue`. When it is full, `overflow` decides
+    what happens to new entries:
+        - 'block': wait up to `block_timeout` seconds for room, then spill
+        - 'drop':  discard the entry and count it
+        - 'spill': append the entry to `spill_path` as a JSON line
+
+    Spilled entries, and batches that fail to insert, are replayed from the
+    spill file by the writer thread on its next start.
+    """
+
+    def __init__(self, app, batch_size: int = 200, flush_interval: float = 1.0,
+                 max_queue: int = 10000, overflow: str = OVERFLOW_SPILL,
+                 block_timeout: float = 0.5, spill_path: Optional[str] = None):
+        if overflow not in (OVERFLOW_BLOCK, OVERFLOW_DROP, OVERFLOW_SPILL):
+            raise ValueError(f"Unsupported audit overflow policy: {overflow}")
+
+        self.app = app
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.spill_path = spill_path
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._stopping = threading.Event()
+
+        self._written = 0
+        self._dropped = 0
+        self._spilled = 0
+        self._failed_batches = 0
+
+    def emit(self, entry: Dict) -> None:
+        self._ensure_started()
+        try:
+            if self.overflow == OVERFLOW_BLOCK:
+                self._queue.put(entry, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(entry)
+        except queue.Full:
+            if self.overflow == OVERFLOW_DROP:
+                self._dropped += 1
+                logger.warning(f"Audit queue full, dropped entry: {entry['action']} on {entry['entity_type']} {entry['entity_id']}")
+            else:
+                self._spill([entry])
+
+    def flush(self) -> None:
+        """Write everything currently queued from the calling thread."""
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch = []
+        if batch:
+            self._write(batch)
+
+    def shutdown(self, timeout: Optional[float] = 5.0) -> None:
+        """Stop the writer thread and drain the queue. Safe to call more than once."""
+        self._stopping.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive() and self._pid == os.getpid():
+            thread.join(timeout)
+        self.flush()
+
+    def stats(self) -> Dict:
+        return {
+            'queue_depth': self._queue.qsize(),
+            'queue_capacity': self._queue.maxsize,
+            'written': self._written,
+            'dropped': self._dropped,
+            'spilled': self._spilled,
+            'failed_batches': self._failed_batches
+        }
+
+    def _ensure_started(self) -> None:
+        # Threads do not survive fork, so each gunicorn worker starts its own writer
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._stopping.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        self._replay_spill()
+        while not self._stopping.is_set():
+            batch = []
+            try:
+                batch.append(self._queue.get(timeout=self.flush_interval))
+            except queue.Empty:
+                continue
+
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self._write(batch)
+
+    def _write(self, batch: List[Dict]) -> None:
+        with self.app.app_context():
+            try:
+                db.session.execute(insert(AuditLog), batch)
+                db.session.commit()
+                self._written += len(batch)
+            except (OperationalError, InterfaceError) as e:
+                # The database is unreachable; keep the entries for a later replay
+                db.session.rollback()
+                self._failed_batches += 1
+                logger.error(f"Error writing {len(batch)} audit log entries: {str(e)}")
+                self._spill(batch)
+            except Exception as e:
+                # A malformed entry fails the whole INSERT; isolate it and keep the rest
+                db.session.rollback()
+                self._failed_batches += 1
+                logger.error(f"Error writing {len(batch)} audit log entries, retrying one by one: {str(e)}")
+                for entry in batch:
+                    try:
+                        db.session.execute(insert(AuditLog), [entry])
+                        db.session.commit()
+                        self._written += 1
+                    except Exception as entry_error:
+                        db.session.rollback()
+                        self._dropped += 1
+                        logger.error(f"Dropped invalid audit log entry {entry['action']} on {entry['entity_type']} {entry['entity_id']}: {str(entry_error)}")
+
+    def _spill(self, entries: List[Dict]) -> None:
+        if not self.spill_path:
+            self._dropped += len(entries)
+            logger.error(f"No audit spill file configured, dropped {len(entries)} entries")
+            return
+        try:
+            with self._spill_lock, open(self.spill_path, 'a', encoding='utf-8') as spill_file:
+                for entry in entries:
+                    spill_file.write(json.dumps(entry, default=_encode_datetime) + '\n')
+            self._spilled += len(entries)
+        except OSError as e:
+            self._dropped += len(entries)
+            logger.error(f"Error spilling {len(entries)} audit log entries to {self.spill_path}: {str(e)}")
+
+    def _replay_spill(self) -> None:
+        if not self.spill_path or not os.path.exists(self.spill_path):
+            return
+
+        # Claim the file first so concurrent workers never replay the same entries
+        claimed_path = f"{self.spill_path}.{os.getpid()}.replay"
+        try:
+            with self._spill_lock:
+                os.replace(self.spill_path, claimed_path)
+        except OSError:
+            return
+
+        entries = []
+        with open(claimed_path, encoding='utf-8') as spill_file:
+            for line in spill_file:
+                if line.strip():
+                    entry = json.loads(line)
+                    if entry.get('created_at'):
+                        entry['created_at'] = datetime.fromisoformat(entry['created_at'])
+                    entries.append(entry)
+        os.remove(claimed_path)
+
+        logger.info(f"Replaying {len(entries)} spilled audit log entries")
+        for start in range(0, len(entries), self.batch_size):
+            self._write(entries[start:start + self.batch_size])
+
+
+def _encode_datetime(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def create_audit_sink(app) -> AuditSink:
+    """
+    Create the audit sink configured by the AUDIT_* environment variables and
+    register its drain-on-shutdown hook.
+    """
+    sink_type = os.getenv('AUDIT_SINK', 'batched').lower()
+
+    if sink_type == 'sync':
+        return SessionAuditSink()
+    if sink_type != 'batched':
+        raise ValueError(f"Unsupported audit sink: {sink_type}")
+
+    sink = BatchedAuditSink(
+        app,
+        batch_size=int(os.getenv('AUDIT_BATCH_SIZE', '200')),
+        flush_interval=float(os.getenv('AUDIT_FLUSH_INTERVAL', '1.0')),
+        max_queue=int(os.getenv('AUDIT_QUEUE_SIZE', '10000')),
+        overflow=os.getenv('AUDIT_OVERFLOW', OVERFLOW_SPILL).lower(),
+        block_timeout=float(os.getenv('AUDIT_BLOCK_TIMEOUT', '0.5')),
+        spill_path=os.getenv('AUDIT_SPILL_PATH', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'audit_spill.jsonl'))
+    )
+    # Gunicorn exits workers through sys.exit on recycle and graceful shutdown
+    atexit.register(sink.shutdown)
+    return sink
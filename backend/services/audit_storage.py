@@ -0,0 +1,368 @@
+import os
+import re
+import glob
+import gzip
+import json
+import time
+import logging
+import threading
+from datetime import datetime
+from typing import List, Optional
+from sqlalchemy import MetaData, Table, Column, Index, select, insert, delete, func, text, union_all, inspect
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import aliased
+from database import db
+from models.audit_log import AuditLog
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_TABLE_PREFIX = 'audit_logs_archive_'
+_PARTITION_NAME = re.compile(r'^audit_logs_(\d{4})(\d{2})$')
+_ARCHIVE_TABLE_NAME = re.compile(rf'^{ARCHIVE_TABLE_PREFIX}(\d{{4}})(\d{{2}})$')
+
+# Partitioned parent for PostgreSQL. The primary key must include the partition key,
+# so it is (id, created_at) here while the ORM keeps treating id as the identity.
+_PARTITIONED_DDL = """
+CREATE TABLE IF NOT EXISTS audit_logs (
+    id BIGINT GENERATED BY DEFAULT AS IDENTITY,
+    user_id INTEGER NOT NULL REFERENCES users (user_id),
+    action VARCHAR(255) NOT NULL,
+    entity_type VARCHAR(50) NOT NULL,
+    entity_id INTEGER NOT NULL,
+    details VARCHAR(500),
+    ip_address VARCHAR(45),
+    user_agent VARCHAR(255),
+    created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at)
+"""
+
+
+def _month_start(value: datetime) -> datetime:
+    return datetime(value.year, value.month, 1)
+
+
+def _add_months(value: datetime, months: int) -> datetime:
+    month_index = value.year * 12 + value.month - 1 + months
+    return datetime(month_index // 12, month_index % 12 + 1, 1)
+
+
+def _table_like(name: str, *args) -> Table:
+    # Same columns as audit_logs without the users FK, so archived rows never block user deletion
+    columns = [
+        Column(column.name, column.type, nullable=column.nullable) if column.foreign_keys else column._copy()
+        for column in AuditLog.__table__.columns
+    ]
+    return Table(name, MetaData(), *columns, *args)
+
+
+def _encode_datetime(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class AuditStorage:
+    """
+    Keeps audit_logs small enough that inserts and admin browsing stay fast.
+
+    On PostgreSQL, audit_logs is range-partitioned by month on created_at,
+    with one partition per month plus a DEFAULT partition. Partitions are
+    created `months_ahead` months in advance by ensure_partitions().
+
+    On SQLite, or on a PostgreSQL audit_logs created before partitioning,
+    rotate() moves every month older than `hot_months` into its own
+    audit_logs_archive_YYYYMM table. log_source() unions those tables with
+    the hot table so browsing still sees every row.
+
+    archive() writes each month past `retention_months` to a gzipped JSONL
+    file in `archive_dir` and then drops its partition or archive table.
+    purge_user_from_archives() removes a deleted user's entries from those files.
+    """
+
+    def __init__(self, archive_dir: str, retention_months: int = 12,
+                 hot_months: int = 1, months_ahead: int = 2,
+                 table_cache_ttl: float = 60.0):
+        self.archive_dir = archive_dir
+        self.retention_months = retention_months
+        self.hot_months = hot_months
+        self.months_ahead = months_ahead
+        self.table_cache_ttl = table_cache_ttl
+
+        self._archive_tables = None
+        self._archive_tables_expire = 0.0
+        self._lock = threading.Lock()
+
+    # Setup
+
+    def create_partitioned_table(self) -> None:
+        """Create audit_logs as a partitioned table on PostgreSQL, before create_all() would make a plain one."""
+        if db.engine.dialect.name != 'postgresql' or inspect(db.engine).has_table(AuditLog.__tablename__):
+            return
+        referenced = [fk.column.table for fk in AuditLog.__table__.foreign_keys]
+        db.metadata.create_all(db.engine, tables=referenced)
+        with db.engine.begin() as connection:
+            connection.execute(text(_PARTITIONED_DDL))
+        logger.info("Created partitioned audit_logs table")
+
+    def is_partitioned(self) -> bool:
+        if db.engine.dialect.name != 'postgresql':
+            return False
+        relkind = db.session.execute(
+            text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:name)"),
+            {'name': AuditLog.__tablename__}
+        ).scalar()
+        return relkind == 'p'
+
+    def ensure_partitions(self, now: Optional[datetime] = None) -> List[str]:
+        """
+        Create monthly partitions from the current month to `months_ahead`
+        months out, plus DEFAULT. When maintenance fell behind and a month's
+        rows landed in DEFAULT, that month's partition is created too and the
+        rows moved into it; PostgreSQL refuses a partition whose range DEFAULT
+        still holds. A month that fails is logged and retried on the next run.
+        """
+        if not self.is_partitioned():
+            return []
+        start = _month_start(now or datetime.utcnow())
+        db.session.execute(text("CREATE TABLE IF NOT EXISTS audit_logs_default PARTITION OF audit_logs DEFAULT"))
+        stranded = set(db.session.execute(
+            text("SELECT DISTINCT date_trunc('month', created_at) FROM audit_logs_default")
+        ).scalars())
+        upcoming = {_add_months(start, offset) for offset in range(self.months_ahead + 1)}
+
+        created = []
+        for month in sorted(upcoming | stranded):
+            name = f"audit_logs_{month:%Y%m}"
+            if db.session.execute(text("SELECT to_regclass(:name)"), {'name': name}).scalar() is not None:
+                continue
+            try:
+                with db.session.begin_nested():
+                    if month in stranded:
+                        self._partition_from_default(name, month)
+                    else:
+                        db.session.execute(text(self._partition_ddl(name, month)))
+                created.append(name)
+            except SQLAlchemyError as e:
+                logger.error(f"Could not create audit log partition {name}: {str(e)}")
+        db.session.commit()
+        if created:
+            logger.info(f"Created audit log partitions: {', '.join(created)}")
+        return created
+
+    # Rotation fallback
+
+    def rotate(self, now: Optional[datetime] = None) -> List[str]:
+        """Move months older than `hot_months` out of audit_logs into archive tables."""
+        if self.is_partitioned():
+            return []
+        hot_start = _add_months(_month_start(now or datetime.utcnow()), -(self.hot_months - 1))
+        newest_id = db.session.execute(select(func.max(AuditLog.id))).scalar()
+        if newest_id is None:
+            return []
+
+        rotated = []
+        for month in self._months_to_rotate(hot_start, newest_id):
+            # SQLite hands out max(id) + 1 after deletes, so the newest row always stays
+            # hot; otherwise new rows could reuse ids that now live in an archive table
+            in_month = (
+                (AuditLog.created_at >= month) &
+                (AuditLog.created_at < _add_months(month, 1)) &
+                (AuditLog.id < newest_id)
+            )
+            archive_table = self._archive_table(month, create=True)
+            columns = [column.name for column in AuditLog.__table__.columns]
+            moved = db.session.execute(
+                insert(archive_table).from_select(columns, select(*AuditLog.__table__.columns).where(in_month))
+            ).rowcount
+            db.session.execute(delete(AuditLog).where(in_month))
+            db.session.commit()
+            rotated.append(archive_table.name)
+            logger.info(f"Rotated {moved} audit log entries into {archive_table.name}")
+
+        self._invalidate_table_cache()
+        return rotated
+
+    # Archival
+
+    def archive(self, now: Optional[datetime] = None) -> List[str]:
+        """Export months past the retention window to gzipped JSONL and drop them from the database."""
+        cutoff = _add_months(_month_start(now or datetime.utcnow()), -self.retention_months)
+        if self.is_partitioned():
+            tables = self._pg_partitions()
+        else:
+            tables = [(month, self._archive_table(month)) for month in self._archive_months()]
+
+        os.makedirs(self.archive_dir, exist_ok=True)
+        files = []
+        for month, table in tables:
+            if month >= cutoff:
+                continue
+            if db.session.execute(select(table.c.id).limit(1)).first() is None:
+                # Nothing to keep; an empty export would only litter the archive
+                db.session.execute(text(f"DROP TABLE {table.name}"))
+                db.session.commit()
+                logger.info(f"Dropped empty {table.name}")
+                continue
+            path = self._export(table, month)
+            db.session.execute(text(f"DROP TABLE {table.name}"))
+            db.session.commit()
+            files.append(path)
+            logger.info(f"Archived {table.name} to {path}")
+
+        self._invalidate_table_cache()
+        return files
+
+    def maintain(self, now: Optional[datetime] = None) -> dict:
+        """Run the periodic job: create upcoming partitions or rotate, then archive expired months."""
+        return {
+            'partitions_created': self.ensure_partitions(now),
+            'tables_rotated': self.rotate(now),
+            'files_archived': self.archive(now)
+        }
+
+    # Reads
+
+    def log_source(self):
+        """The entity to query audit logs from: AuditLog itself, or AuditLog aliased over hot + archive tables."""
+        tables = self.archive_tables()
+        if not tables:
+            return AuditLog
+        hot = AuditLog.__table__
+        parts = [select(*hot.columns)] + [select(*table.columns) for table in tables]
+        return aliased(AuditLog, union_all(*parts).subquery('audit_logs_all'))
+
+    def archive_tables(self) -> List[Table]:
+        with self._lock:
+            if self._archive_tables is not None and self._archive_tables_expire > time.monotonic():
+                return self._archive_tables
+        tables = [] if self.is_partitioned() else [self._archive_table(month) for month in self._archive_months()]
+        with self._lock:
+            self._archive_tables = tables
+            self._archive_tables_expire = time.monotonic() + self.table_cache_ttl
+        return tables
+
+    def delete_for_user(self, user_id: int) -> None:
+        """
+        Delete a user's audit logs from the hot table and every archive table.
+        Months already exported to files are not touched; call
+        purge_user_from_archives() once the deletion has committed.
+        """
+        db.session.execute(delete(AuditLog).where(AuditLog.user_id == user_id))
+        for table in self.archive_tables():
+            db.session.execute(delete(table).where(table.c.user_id == user_id))
+
+    def purge_user_from_archives(self, user_id: int) -> List[str]:
+        """
+        Remove a user's entries from the gzipped JSONL files archive() wrote.
+        Each file is rewritten beside the original and swapped in, so readers
+        never see a half-written archive.
+
+        Returns:
+            List[str]: The archive files that held entries of the user
+        """
+        rewritten = []
+        for path in sorted(glob.glob(os.path.join(self.archive_dir, 'audit_logs_*.jsonl.gz'))):
+            partial_path = f"{path}.partial"
+            removed = 0
+            with gzip.open(path, 'rt', encoding='utf-8') as source, \
+                    gzip.open(partial_path, 'wt', encoding='utf-8') as target:
+                for line in source:
+                    if json.loads(line).get('user_id') == user_id:
+                        removed += 1
+                    else:
+                        target.write(line)
+            if removed:
+                os.replace(partial_path, path)
+                rewritten.append(path)
+                logger.info(f"Removed {removed} audit log entries of user {user_id} from {path}")
+            else:
+                os.remove(partial_path)
+        return rewritten
+
+    # Helpers
+
+    def _months_to_rotate(self, hot_start: datetime, newest_id: int) -> List[datetime]:
+        """The months before `hot_start` that hold rows to rotate, one indexed lookup per month found."""
+        months = []
+        after = None
+        while True:
+            criteria = [AuditLog.created_at < hot_start, AuditLog.id < newest_id]
+            if after is not None:
+                criteria.append(AuditLog.created_at >= after)
+            oldest = db.session.execute(select(func.min(AuditLog.created_at)).where(*criteria)).scalar()
+            if oldest is None:
+                return months
+            months.append(_month_start(oldest))
+            after = _add_months(months[-1], 1)
+
+    def _partition_ddl(self, name: str, month: datetime) -> str:
+        return (f"CREATE TABLE {name} PARTITION OF audit_logs "
+                f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{_add_months(month, 1):%Y-%m-%d}')")
+
+    def _partition_from_default(self, name: str, month: datetime) -> None:
+        # DEFAULT is detached while the month's rows move out of it, all in one transaction
+        db.session.execute(text("ALTER TABLE audit_logs DETACH PARTITION audit_logs_default"))
+        db.session.execute(text(self._partition_ddl(name, month)))
+        moved = db.session.execute(text(
+            f"WITH moved AS (DELETE FROM audit_logs_default WHERE created_at >= :start AND created_at < :end "
+            f"RETURNING *) INSERT INTO {name} SELECT * FROM moved"
+        ), {'start': month, 'end': _add_months(month, 1)}).rowcount
+        db.session.execute(text("ALTER TABLE audit_logs ATTACH PARTITION audit_logs_default DEFAULT"))
+        logger.info(f"Moved {moved} audit log entries from audit_logs_default into {name}")
+
+    def _archive_table(self, month: datetime, create: bool = False) -> Table:
+        name = f"{ARCHIVE_TABLE_PREFIX}{month:%Y%m}"
+        table = _table_like(name, Index(f"ix_{name}_created_at_id", 'created_at', 'id'))
+        if create:
+            table.create(db.session.connection(), checkfirst=True)
+        return table
+
+    def _archive_months(self) -> List[datetime]:
+        months = []
+        for name in inspect(db.session.connection()).get_table_names():
+            match = _ARCHIVE_TABLE_NAME.match(name)
+            if match:
+                months.append(datetime(int(match.group(1)), int(match.group(2)), 1))
+        return sorted(months)
+
+    def _pg_partitions(self):
+        rows = db.session.execute(text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(:name)"
+        ), {'name': AuditLog.__tablename__}).scalars()
+        partitions = []
+        for name in rows:
+            match = _PARTITION_NAME.match(name)
+            if match:
+                month = datetime(int(match.group(1)), int(match.group(2)), 1)
+                partitions.append((month, _table_like(name)))
+        return sorted(partitions, key=lambda partition: partition[0])
+
+    def _export(self, table: Table, month: datetime) -> str:
+        path = os.path.join(self.archive_dir, f"audit_logs_{month:%Y%m}.jsonl.gz")
+        sequence = 1
+        while os.path.exists(path):
+            # Late rows for an already archived month get their own file
+            sequence += 1
+            path = os.path.join(self.archive_dir, f"audit_logs_{month:%Y%m}.{sequence}.jsonl.gz")
+        partial_path = f"{path}.partial"
+        statement = select(table).order_by(table.c.created_at, table.c.id).execution_options(yield_per=5000)
+        with gzip.open(partial_path, 'wt', encoding='utf-8') as archive_file:
+            for row in db.session.execute(statement):
+                archive_file.write(json.dumps(dict(row._mapping), default=_encode_datetime) + '\n')
+        # Readers never see a half-written archive
+        os.replace(partial_path, path)
+        return path
+
+    def _invalidate_table_cache(self) -> None:
+        with self._lock:
+            self._archive_tables = None
+
+
+audit_storage = AuditStorage(
+    archive_dir=os.getenv('AUDIT_ARCHIVE_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'audit_archive')),
+    retention_months=int(os.getenv('AUDIT_RETENTION_MONTHS', '12')),
+    hot_months=int(os.getenv('AUDIT_HOT_MONTHS', '1')),
+    months_ahead=int(os.getenv('AUDIT_PARTITIONS_AHEAD', '2'))
+)
@@ -2,6 +2,7 @@ from sib_api_v3_sdk import Configuration, ApiClient, TransactionalEmailsApi
 from sib_api_v3_sdk.rest import ApiException
 from typing import Optional
 import os
+import threading
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -10,14 +11,21 @@ load_dotenv(dotenv_path=os.path.join(os.path.dirname(os.path.dirname(__file__)),
 
 
 class BrevoService:
+    """
+    Lazily configured Brevo client. Nothing is read or contacted until the
+    first get_api_instance() call, so importing this module is free.
+    """
     def __init__(self):
         self.configuration = None
         self.api_instance = None
-        self.initialize_brevo()
+        self._lock = threading.Lock()
 
-    def initialize_brevo(self) -> None:
+    def initialize_brevo(self, validate: bool = False) -> None:
         """
         Initialize Brevo API configuration using API key from environment variables
+
+        Args:
+            validate (bool): Also check the key against the API, which costs a network round trip
         """
         api_key = os.getenv('BREVO_API_KEY')
         if not api_key:
@@ -41,7 +49,9 @@ class BrevoService:
             # Create an instance of the API class
             api_client = ApiClient(self.configuration)
             self.api_instance = TransactionalEmailsApi(api_client)
-            
+            if not validate:
+                return
+
             # Validate API key with better error handling
             try:
                 print("Attempting to validate API key...")
@@ -67,6 +77,10 @@ class BrevoService:
         Returns:
             TransactionalEmailsApi: Initialized Brevo API instance
         """
+        if self.api_instance is None:
+            with self._lock:
+                if self.api_instance is None:
+                    self.initialize_brevo()
         return self.api_instance
 
 # Create a singleton instance
@@ -0,0 +1,151 @@
+from sqlalchemy import func, select, asc, desc
+from sqlalchemy.orm import Session, contains_eager
+from typing import Dict, List, Optional
+from models.user import User, CoachClient, UserTrainingPlan
+from models.body_metrics import BodyMetrics
+
+# Every key a roster entry can carry; `fields` projections must be a subset of these
+ROSTER_FIELDS = [
+    'id', 'client_id', 'first_name', 'last_name', 'full_name', 'email',
+    'profile_image_url', 'assigned_at', 'status', 'profile',
+    'assigned_plan_id', 'latest_metrics'
+]
+
+# Sortable keys mapped to the SQL columns that implement them
+ROSTER_SORT_COLUMNS = {
+    'full_name': (User.first_name, User.last_name),
+    'first_name': (User.first_name, User.last_name),
+    'last_name': (User.last_name, User.first_name),
+    'email': (User.email,),
+    'assigned_at': (CoachClient.assigned_at,),
+}
+
+
+class CoachRosterService:
+    """
+    Builds the coach dashboard client roster in a constant number of queries,
+    independent of how many clients the coach has:
+
+    1. a COUNT of the coach's matching relationships
+    2. one page of CoachClient rows joined to their User
+    3. the clients' profiles (selectin load, only when requested)
+    4. the clients' in-progress plan assignments (only when requested)
+    5. the latest BodyMetrics row per client via ROW_NUMBER() (only when requested)
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get_roster(self, coach_profile_id: int, status: str = 'active',
+                   sort_by: str = 'full_name', sort_order: str = 'asc',
+                   page: int = 1, per_page: Optional[int] = None,
+                   fields: Optional[List[str]] = None) -> Dict:
+        """
+        Get a page of the coach's clients.
+
+        Args:
+            coach_profile_id (int): The coach's CoachProfile.profile_id
+            status (str): Relationship status to include
+            sort_by (str): One of ROSTER_SORT_COLUMNS
+            sort_order (str): 'asc' or 'desc'
+            page (int): 1-based page number, only used with per_page
+            per_page (int, optional): Page size; all clients are returned when omitted
+            fields (List[str], optional): Subset of ROSTER_FIELDS to return
+
+        Returns:
+            Dict: {'clients': [...], 'total_count': int}
+        """
+        if sort_by not in ROSTER_SORT_COLUMNS:
+            raise ValueError(f"Invalid sort field. Must be one of: {', '.join(ROSTER_SORT_COLUMNS)}")
+        if sort_order not in ('asc', 'desc'):
+            raise ValueError("Invalid sort order. Must be 'asc' or 'desc'")
+        if fields:
+            unknown = [field for field in fields if field not in ROSTER_FIELDS]
+            if unknown:
+                raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+            fields = ['client_id'] + [field for field in fields if field != 'client_id']
+        else:
+            fields = list(ROSTER_FIELDS)
+        if per_page is not None and (per_page < 1 or page < 1):
+            raise ValueError("page and per_page must be positive integers")
+
+        base_query = self.db.query(CoachClient).join(
+            User, CoachClient.client_id == User.user_id
+        ).filter(
+            CoachClient.coach_id == coach_profile_id,
+            CoachClient.status == status
+        )
+
+        total_count = base_query.with_entities(func.count(CoachClient.id)).scalar()
+
+        direction = asc if sort_order == 'asc' else desc
+        order_by = [direction(column) for column in ROSTER_SORT_COLUMNS[sort_by]]
+        client_loader = contains_eager(CoachClient.client)
+        if 'profile' in fields:
+            client_loader = client_loader.selectinload(User.profile)
+        query = base_query.options(client_loader).order_by(*order_by, CoachClient.id)
+        if per_page is not None:
+            query = query.offset((page - 1) * per_page).limit(per_page)
+
+        relationships = query.all()
+        client_ids = [rel.client_id for rel in relationships]
+
+        assigned_plans = self._assigned_plans(client_ids) if 'assigned_plan_id' in fields else {}
+        latest_metrics = self._latest_metrics(client_ids) if 'latest_metrics' in fields else {}
+
+        clients = []
+        for rel in relationships:
+            client = rel.client
+            row = {
+                'id': rel.id,
+                'client_id': client.user_id,
+                'first_name': client.first_name,
+                'last_name': client.last_name,
+                'full_name': f"{client.first_name} {client.last_name}",
+                'email': client.email,
+                'profile_image_url': client.profile_image_url,
+                'assigned_at': rel.assigned_at.isoformat() if rel.assigned_at else None,
+                'status': rel.status,
+            }
+            if 'profile' in fields:
+                row['profile'] = client.profile.to_dict() if client.profile else None
+            if 'assigned_plan_id' in fields:
+                row['assigned_plan_id'] = assigned_plans.get(client.user_id)
+            if 'latest_metrics' in fields:
+                metric = latest_metrics.get(client.user_id)
+                row['latest_metrics'] = metric.to_dict() if metric else None
+            clients.append({field: row[field] for field in fields})
+
+        return {
+            'clients': clients,
+            'total_count': total_count
+        }
+
+    def _assigned_plans(self, client_ids: List[int]) -> Dict[int, int]:
+        if not client_ids:
+            return {}
+        rows = self.db.query(UserTrainingPlan.user_id, UserTrainingPlan.plan_id).filter(
+            UserTrainingPlan.user_id.in_(client_ids),
+            UserTrainingPlan.status == 'in_progress'
+        ).order_by(UserTrainingPlan.assignment_id).all()
+
+        plans = {}
+        for user_id, plan_id in rows:
+            plans.setdefault(user_id, plan_id)
+        return plans
+
+    def _latest_metrics(self, client_ids: List[int]) -> Dict[int, BodyMetrics]:
+        if not client_ids:
+            return {}
+        ranked = select(
+            BodyMetrics.metric_id,
+            func.row_number().over(
+                partition_by=BodyMetrics.user_id,
+                order_by=(BodyMetrics.date.desc(), BodyMetrics.metric_id.desc())
+            ).label('row_number')
+        ).where(BodyMetrics.user_id.in_(client_ids)).subquery()
+
+        metrics = self.db.query(BodyMetrics).join(
+            ranked, BodyMetrics.metric_id == ranked.c.metric_id
+        ).filter(ranked.c.row_number == 1).all()
+        return {metric.user_id: metric for metric in metrics}
@@ -0,0 +1,169 @@
+import hashlib
+import logging
+from datetime import datetime, timezone
+from functools import wraps
+from typing import Callable, Dict, Iterable, Optional, Tuple
+from flask import current_app, make_response, request
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import event, func, inspect, select, update
+from sqlalchemy.orm import Session
+from database import db, utc_now
+from models.training_plan import TrainingPlan, PlanExercise
+from models.meal_plan import MealPlan, Meal
+
+logger = logging.getLogger(__name__)
+
+# Child rows that are embedded in their parent's responses: writing one must
+# move the parent's updated_at, or the parent's validators would not change
+PARENT_OF = {
+    PlanExercise: (TrainingPlan, 'plan_id'),
+    Meal: (MealPlan, 'meal_plan_id')
+}
+
+_TOUCHED = 'conditional_get_touched'
+
+
+def _timestamp(model):
+    if not hasattr(model, 'updated_at'):
+        return None
+    if hasattr(model, 'created_at'):
+        return func.coalesce(model.updated_at, model.created_at)
+    return model.updated_at
+
+
+def collection_version(model, *criteria, joined: Iterable = ()) -> Tuple:
+    """
+    A cheap version of the rows matching `criteria`: their count, newest
+    timestamp and highest key, in one aggregate query (models without
+    updated_at give only the count and key). `joined` names many-to-one
+    relationships (e.g. TrainingPlan.coach) whose rows are embedded in the
+    response; their newest timestamp is included too.
+
+    Also used for single resources, with a primary key criterion.
+    """
+    primary_key = inspect(model).primary_key[0]
+    columns = [func.count(primary_key), func.max(primary_key)]
+    if _timestamp(model) is not None:
+        columns.append(func.max(_timestamp(model)))
+    statement = select(model)
+    for relationship in joined:
+        columns.append(func.max(_timestamp(relationship.property.mapper.class_)))
+        statement = statement.outerjoin(relationship)
+    statement = statement.with_only_columns(*columns).where(*criteria)
+    return tuple(db.session.execute(statement).one())
+
+
+def version_key(version: Tuple) -> str:
+    """A short digest of a version tuple, for keying cached copies of the response it versions."""
+    return hashlib.sha1(repr(version).encode()).hexdigest()[:16]
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite returns naive datetimes; every timestamp here is stored in UTC
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).replace(microsecond=0)
+
+
+def _validators(version: Tuple) -> Tuple[str, Optional[datetime]]:
+    """The weak ETag and Last-Modified for a version in the context of this request."""
+    timestamps = [_as_utc(part) for part in version if isinstance(part, datetime)]
+    # Responses differ per user and per query string (fields, include, filters)
+    identity = f"{get_jwt_identity()}|{request.full_path}|{version!r}"
+    etag = hashlib.sha1(identity.encode()).hexdigest()
+    return etag, max(timestamps) if timestamps else None
+
+
+def _not_modified(etag: str) -> bool:
+    # Only the ETag covers the whole version. If-Modified-Since compares the
+    # newest timestamp alone and would miss a deleted row, whose count and key
+    # the client cannot send back, so it always gets a full response
+    return bool(request.if_none_match) and request.if_none_match.contains_weak(etag)
+
+
+def _set_validators(response, etag: str, last_modified: Optional[datetime]):
+    response.set_etag(etag, weak=True)
+    if last_modified:
+        response.last_modified = last_modified
+    # Cached copies must be revalidated, and only by the browser that fetched them
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add('Authorization')
+    return response
+
+
+def conditional_get(version: Callable[..., Tuple]):
+    """
+    Give a GET view a weak ETag and Last-Modified, and answer 304 Not Modified
+    without running the view when If-None-Match shows the client's copy is
+    current.
+
+    `version` is called with the view's arguments and returns a tuple that
+    changes whenever the response would, usually from collection_version().
+    Place this below jwt_required so the ETag is scoped to the caller, who
+    can only hold it after being served the resource.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            try:
+                etag, last_modified = _validators(version(*args, **kwargs))
+            except Exception as e:
+                # Validators are an optimisation; never fail the request over them
+                logger.warning(f"Could not compute validators for {request.path}: {str(e)}")
+                db.session.rollback()
+                return fn(*args, **kwargs)
+
+            if _not_modified(etag):
+                return _set_validators(current_app.response_class(status=304), etag, last_modified)
+
+            response = make_response(fn(*args, **kwargs))
+            if response.status_code == 200:
+                _set_validators(response, etag, last_modified)
+            return response
+        return wrapper
+    return decorator
+
+
+def _before_flush(session, flush_context, instances):
+    touched: Dict = session.info.setdefault(_TOUCHED, {})
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        parent = PARENT_OF.get(type(obj))
+        if parent is None or (obj in session.dirty and not session.is_modified(obj, include_collections=False)):
+            continue
+        parent_model, key = parent
+        history = inspect(obj).attrs[key].history
+        # A row moved to another parent changes both
+        for parent_id in list(history.deleted) + [getattr(obj, key)]:
+            if parent_id is not None:
+                touched.setdefault(parent_model, set()).add(parent_id)
+
+
+def _after_flush(session, flush_context):
+    for parent_model, parent_ids in session.info.get(_TOUCHED, {}).items():
+        primary_key = inspect(parent_model).primary_key[0]
+        session.connection().execute(
+            update(parent_model).where(primary_key.in_(parent_ids)).values(updated_at=utc_now())
+        )
+
+
+def _after_flush_postexec(session, flush_context):
+    # Reload updated_at of parents already in the session on next access
+    for parent_model, parent_ids in session.info.pop(_TOUCHED, {}).items():
+        for parent_id in parent_ids:
+            parent = session.identity_map.get(session.identity_key(parent_model, parent_id))
+            if parent is not None:
+                session.expire(parent, ['updated_at'])
+
+
+def _after_soft_rollback(session, previous_transaction):
+    session.info.pop(_TOUCHED, None)
+
+
+def register_touch_hooks() -> None:
+    """Move a plan's updated_at whenever one of its exercises or meals is written through the ORM."""
+    if not event.contains(Session, 'before_flush', _before_flush):
+        event.listen(Session, 'before_flush', _before_flush)
+        event.listen(Session, 'after_flush', _after_flush)
+        event.listen(Session, 'after_flush_postexec', _after_flush_postexec)
+        event.listen(Session, 'after_soft_rollback', _after_soft_rollback)
@@ -1,6 +1,6 @@
 from flask import jsonify, request
-from services.brevo_init import brevo_service
-from sib_api_v3_sdk.rest import ApiException
+from database import db
+from services.email_outbox import EmailOutboxService
 import logging
 import json
 import traceback
@@ -21,7 +21,7 @@ class ContactFormService:
     @staticmethod
     def send_contact_form_email(contact_data):
         """
-        Send contact form email using Brevo service
+        Queue the contact form emails (auto-reply and support notification) in the outbox
         Args:
             contact_data (dict): Dictionary containing contact form data
                 - name: sender's name
@@ -31,10 +31,6 @@ class ContactFormService:
         Returns:
             tuple: (response dict, status code)
         """
-        support_email_success = False
-        auto_reply_success = False
-        error_message = None
-        
         try:
             # Log the incoming data
             logger.info(f"Contact form data received: {json.dumps(contact_data, default=str)}")
@@ -49,123 +45,55 @@ class ContactFormService:
                         "message": f"Missing required field: {field}"
                     }), 400
 
-            # Get the API instance
-            api_instance = brevo_service.get_api_instance()
-            if not api_instance:
-                logger.error("Brevo API instance is not initialized")
-                return jsonify({
-                    "status": "error",
-                    "message": "Email service is not properly configured"
-                }), 500
+            outbox = EmailOutboxService(db.session)
 
-            # First, try to send the auto-reply email since we know it's working
-            try:
-                auto_reply = {
-                    "sender": {
-                        "email": "support@train-sync.com",
-                        "name": "Train-Sync Support"
-                    },
-                    "to": [{
-                        "email": contact_data["email"],
-                        "name": contact_data["name"]
-                    }],
-                    "subject": "Thank you for contacting Train-Sync",
-                    "htmlContent": f"""
-                        <h3>Thank you for contacting Train-Sync</h3>
-                        <p>Dear {contact_data['name']},</p>
-                        <p>We have received your message and will get back to you as soon as possible.</p>
-                        <p>Your message details:</p>
-                        <p><strong>Subject:</strong> {contact_data['subject']}</p>
-                        <p><strong>Message:</strong></p>
-                        <p>{contact_data['message']}</p>
-                        <br>
-                        <p>Best regards,<br>Train-Sync Support Team</p>
-                    """
-                }
-                
-                logger.info("Sending auto-reply email...")
-                auto_response = api_instance.send_transac_email(auto_reply)
-                logger.info(f"Auto-reply email sent successfully to {contact_data['email']}")
-                auto_reply_success = True
-                
-            except Exception as auto_reply_err:
-                logger.error(f"Error sending auto-reply email: {str(auto_reply_err)}")
-                error_message = f"Auto-reply failed: {str(auto_reply_err)}"
-            
-            # Now try to send the support email
-            try:
-                # Try a slightly different configuration for the support email
-                support_email = {
-                    "sender": {
-                        "email": "support@train-sync.com", 
-                        "name": "Train-Sync Form"
-                    },
-                    "to": [{
-                        "email": "support@train-sync.com",
-                        "name": "Train-Sync Support"
-                    }],
-                    # Set replyTo to the user's email
-                    "replyTo": {
-                        "email": contact_data["email"],
-                        "name": contact_data["name"]
-                    },
-                    "subject": f"New Contact Form Message: {contact_data['subject']}",
-                    "htmlContent": f"""
-                        <h3>New Contact Form Submission</h3>
-                        <p><strong>From:</strong> {contact_data['name']} ({contact_data['email']})</p>
-                        <p><strong>Subject:</strong> {contact_data['subject']}</p>
-                        <p><strong>Message:</strong></p>
-                        <p>{contact_data['message']}</p>
-                    """
-                }
+            # Auto-reply to the sender
+            outbox.enqueue(
+                to_email=contact_data["email"],
+                to_name=contact_data["name"],
+                sender_email="support@train-sync.com",
+                sender_name="Train-Sync Support",
+                subject="Thank you for contacting Train-Sync",
+                html_content=f"""
+                    <h3>Thank you for contacting Train-Sync</h3>
+                    <p>Dear {contact_data['name']},</p>
+                    <p>We have received your message and will get back to you as soon as possible.</p>
+                    <p>Your message details:</p>
+                    <p><strong>Subject:</strong> {contact_data['subject']}</p>
+                    <p><strong>Message:</strong></p>
+                    <p>{contact_data['message']}</p>
+                    <br>
+                    <p>Best regards,<br>Train-Sync Support Team</p>
+                """
+            )
 
-                logger.debug(f"Support email configuration: {json.dumps(support_email, default=str)}")
-                logger.info("Sending email to support team...")
-                
-                support_response = api_instance.send_transac_email(support_email)
-                logger.info(f"Support email sent successfully to support@train-sync.com")
-                support_email_success = True
-                
-            except Exception as support_err:
-                logger.error(f"Error sending support email: {str(support_err)}", exc_info=True)
-                error_message = f"Support email failed: {str(support_err)}"
-            
-            # Determine the overall response
-            if support_email_success and auto_reply_success:
-                return jsonify({
-                    "status": "success",
-                    "message": "Contact form emails sent successfully"
-                }), 200
-            elif auto_reply_success:
-                # Auto-reply worked but support email failed
-                logger.warning("Only auto-reply email was sent successfully")
-                return jsonify({
-                    "status": "partial_success",
-                    "message": "Your message was received, but there may be a delay in our response"
-                }), 202
-            else:
-                # Neither worked
-                logger.error("Both email sending attempts failed")
-                return jsonify({
-                    "status": "error",
-                    "message": error_message or "Failed to send emails"
-                }), 500
+            # Notification to the support team, replying straight to the user
+            outbox.enqueue(
+                to_email="support@train-sync.com",
+                to_name="Train-Sync Support",
+                sender_email="support@train-sync.com",
+                sender_name="Train-Sync Form",
+                reply_to_email=contact_data["email"],
+                reply_to_name=contact_data["name"],
+                subject=f"New Contact Form Message: {contact_data['subject']}",
+                html_content=f"""
+                    <h3>New Contact Form Submission</h3>
+                    <p><strong>From:</strong> {contact_data['name']} ({contact_data['email']})</p>
+                    <p><strong>Subject:</strong> {contact_data['subject']}</p>
+                    <p><strong>Message:</strong></p>
+                    <p>{contact_data['message']}</p>
+                """
+            )
+            db.session.commit()
+            logger.info(f"Queued contact form emails for {contact_data['email']}")
 
-        except ApiException as e:
-            error_details = {
-                "status_code": e.status if hasattr(e, 'status') else "unknown",
-                "reason": e.reason if hasattr(e, 'reason') else "unknown",
-                "body": e.body if hasattr(e, 'body') else "unknown"
-            }
-            
-            logger.error(f"Brevo API error details: {json.dumps(error_details, default=str)}")
-            
             return jsonify({
-                "status": "error",
-                "message": f"Failed to send email: {str(e)}"
-            }), 500
-            
+                "status": "success",
+                "message": "Contact form received"
+            }), 200
+
         except Exception as e:
+            db.session.rollback()
             logger.error(f"Unexpected error in contact form service: {str(e)}")
             logger.error(traceback.format_exc())
             
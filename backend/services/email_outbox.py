@@ -0,0 +1,460 @@
+import os
+import random
+import smtplib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from email.utils import formataddr
+from typing import Dict, List, Optional
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.orm import Session
+from database import db
+from models.email_outbox import EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SENDER_EMAIL = 'no-reply@train-sync.com'
+DEFAULT_SENDER_NAME = 'TrainSync - System'
+
+STATUS_PENDING = 'pending'
+STATUS_SENDING = 'sending'
+STATUS_SENT = 'sent'
+STATUS_DEAD = 'dead'
+
+# Columns the worker hands to a backend; backends never see ORM objects
+_MESSAGE_COLUMNS = (
+    EmailOutbox.email_id, EmailOutbox.provider, EmailOutbox.attempts, EmailOutbox.max_attempts,
+    EmailOutbox.to_email, EmailOutbox.to_name, EmailOutbox.sender_email, EmailOutbox.sender_name,
+    EmailOutbox.reply_to_email, EmailOutbox.reply_to_name, EmailOutbox.subject, EmailOutbox.html_content
+)
+
+
+class PermanentEmailError(Exception):
+    """Delivery can never succeed (e.g. the provider rejected the message); it is dead-lettered at once."""
+
+
+class EmailBackend:
+    """
+    Delivers one message, a dict of EmailOutbox column values. Raising
+    retries the message later; PermanentEmailError dead-letters it.
+    Backends are shared by the provider's sending threads.
+    """
+    name = None
+
+    def send(self, message: Dict) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+def _mime_message(message: Dict) -> EmailMessage:
+    mime = EmailMessage()
+    mime['Subject'] = message['subject']
+    mime['From'] = formataddr((message['sender_name'] or '', message['sender_email']))
+    mime['To'] = formataddr((message['to_name'] or '', message['to_email']))
+    if message['reply_to_email']:
+        mime['Reply-To'] = formataddr((message['reply_to_name'] or '', message['reply_to_email']))
+    # Stable per outbox row, so a retried delivery can be recognised as a duplicate
+    mime['Message-ID'] = f"<outbox-{message['email_id']}@train-sync.com>"
+    mime.set_content(message['html_content'], subtype='html')
+    return mime
+
+
+class BrevoBackend(EmailBackend):
+    name = 'brevo'
+
+    def send(self, message: Dict) -> None:
+        from sib_api_v3_sdk import SendSmtpEmail
+        from sib_api_v3_sdk.rest import ApiException
+        from services.brevo_init import brevo_service
+
+        to = {'email': message['to_email']}
+        if message['to_name']:
+            to['name'] = message['to_name']
+        email = SendSmtpEmail(
+            sender={'name': message['sender_name'], 'email': message['sender_email']},
+            to=[to],
+            subject=message['subject'],
+            html_content=message['html_content']
+        )
+        if message['reply_to_email']:
+            email.reply_to = {'email': message['reply_to_email'], 'name': message['reply_to_name']}
+        try:
+            brevo_service.get_api_instance().send_transac_email(email)
+        except ApiException as e:
+            # 400 means the message itself is invalid; auth, rate limit and server errors can recover
+            if e.status == 400:
+                raise PermanentEmailError(f"Brevo rejected the message: {e.body}") from e
+            raise
+
+
+class SmtpBackend(EmailBackend):
+    """
+    Sends over SMTP, keeping one open connection per sending thread instead
+    of connecting for every message. For testing, point it at a local sink
+    such as Mailpit (SMTP_HOST=localhost, SMTP_PORT=1025, SMTP_SSL=false).
+    """
+    name = 'smtp'
+
+    def __init__(self, host: str, port: int, username: Optional[str] = None,
+                 password: Optional[str] = None, use_ssl: bool = True, timeout: float = 30.0):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_ssl = use_ssl
+        self.timeout = timeout
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def send(self, message: Dict) -> None:
+        connection = self._connection()
+        try:
+            refused = connection.send_message(_mime_message(message))
+        except smtplib.SMTPRecipientsRefused as e:
+            raise PermanentEmailError(f"Recipient refused: {e.recipients}") from e
+        except Exception:
+            # The connection may be half-broken; the retry opens a fresh one
+            self._discard(connection)
+            raise
+        if refused:
+            raise PermanentEmailError(f"Recipient refused: {refused}")
+
+    def close(self) -> None:
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            self._quit(connection)
+
+    def _connection(self) -> smtplib.SMTP:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            if self.use_ssl:
+                connection = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+            else:
+                connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.username:
+                connection.login(self.username, self.password)
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def _discard(self, connection: smtplib.SMTP) -> None:
+        self._local.connection = None
+        with self._lock:
+            if connection in self._connections:
+                self._connections.remove(connection)
+        self._quit(connection)
+
+    @staticmethod
+    def _quit(connection: smtplib.SMTP) -> None:
+        try:
+            connection.quit()
+        except Exception:
+            connection.close()
+
+
+class FileBackend(EmailBackend):
+    """Writes each message to `directory` as an .eml file; for development and tests."""
+    name = 'file'
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def send(self, message: Dict) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{message['email_id']}.eml")
+        partial_path = f"{path}.partial"
+        with open(partial_path, 'wb') as eml_file:
+            eml_file.write(bytes(_mime_message(message)))
+        os.replace(partial_path, path)
+
+
+def create_backend(name: str) -> EmailBackend:
+    """Create the backend for a provider name, configured by environment variables."""
+    if name == BrevoBackend.name:
+        return BrevoBackend()
+    if name == SmtpBackend.name:
+        return SmtpBackend(
+            host=os.getenv('SMTP_HOST', 'smtp.gmail.com'),
+            port=int(os.getenv('SMTP_PORT', '465')),
+            username=os.getenv('EMAIL_USER'),
+            password=os.getenv('EMAIL_PASSWORD'),
+            use_ssl=os.getenv('SMTP_SSL', 'true').lower() == 'true'
+        )
+    if name == FileBackend.name:
+        return FileBackend(os.getenv(
+            'EMAIL_FILE_DIR',
+            os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'mail_outbox')
+        ))
+    raise ValueError(f"Unsupported email backend: {name}")
+
+
+PROVIDERS = (BrevoBackend.name, SmtpBackend.name, FileBackend.name)
+
+
+class EmailOutboxService:
+    """
+    Queues transactional emails in the email_outbox table.
+
+    enqueue() only adds the row to the session; the caller's commit makes it
+    visible to the worker, so an email is sent only if the change that
+    triggered it was saved.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def enqueue(self, to_email: str, subject: str, html_content: str,
+                to_name: Optional[str] = None,
+                sender_email: str = DEFAULT_SENDER_EMAIL,
+                sender_name: str = DEFAULT_SENDER_NAME,
+                reply_to_email: Optional[str] = None,
+                reply_to_name: Optional[str] = None,
+                provider: Optional[str] = None) -> EmailOutbox:
+        """
+        Add an email to the outbox.
+
+        Args:
+            provider (str, optional): Backend to send with; defaults to EMAIL_BACKEND
+
+        Returns:
+            EmailOutbox: The pending row, flushed on the caller's commit
+        """
+        provider = provider or os.getenv('EMAIL_BACKEND', BrevoBackend.name).lower()
+        if provider not in PROVIDERS:
+            raise ValueError(f"Unsupported email backend: {provider}")
+        email = EmailOutbox(
+            provider=provider,
+            status=STATUS_PENDING,
+            to_email=to_email,
+            to_name=to_name,
+            sender_email=sender_email,
+            sender_name=sender_name,
+            reply_to_email=reply_to_email,
+            reply_to_name=reply_to_name,
+            subject=subject[:255],
+            html_content=html_content,
+            attempts=0,
+            max_attempts=int(os.getenv('EMAIL_MAX_ATTEMPTS', '8')),
+            next_attempt_at=datetime.utcnow()
+        )
+        self.db.add(email)
+        return email
+
+    def stats(self, now: Optional[datetime] = None) -> Dict:
+        now = now or datetime.utcnow()
+        counts = dict(self.db.query(EmailOutbox.status, func.count(EmailOutbox.email_id))
+                      .group_by(EmailOutbox.status).all())
+        oldest_due = self.db.query(func.min(EmailOutbox.next_attempt_at))\
+            .filter(EmailOutbox.status == STATUS_PENDING, EmailOutbox.next_attempt_at <= now).scalar()
+        return {
+            'counts': {status: counts.get(status, 0) for status in (STATUS_PENDING, STATUS_SENDING, STATUS_SENT, STATUS_DEAD)},
+            # How long the most overdue email has been waiting for the worker
+            'oldest_due_seconds': round((now - oldest_due).total_seconds(), 1) if oldest_due else 0.0
+        }
+
+    def get_dead(self, limit: int = 50) -> List[EmailOutbox]:
+        return self.db.query(EmailOutbox).filter(EmailOutbox.status == STATUS_DEAD)\
+            .order_by(EmailOutbox.email_id.desc()).limit(limit).all()
+
+    def retry(self, email_id: int) -> EmailOutbox:
+        """Put a dead-lettered email back in the queue with a fresh set of attempts."""
+        email = self.db.get(EmailOutbox, email_id)
+        if not email:
+            raise ValueError("Email not found")
+        if email.status != STATUS_DEAD:
+            raise ValueError("Only dead-lettered emails can be retried")
+        email.status = STATUS_PENDING
+        email.attempts = 0
+        email.next_attempt_at = datetime.utcnow()
+        email.last_error = None
+        self.db.commit()
+        return email
+
+
+class OutboxWorker:
+    """
+    Delivers due outbox emails from a dedicated process (`flask --app server email-worker`).
+
+    Each provider has its own thread pool sized by `concurrency`, and the
+    worker never claims more of a provider's emails than it has free threads.
+    Claiming marks rows as 'sending' with a lease, using UPDATE ... RETURNING
+    so several workers can poll the same table; rows whose lease expires
+    (the worker died mid-send) become due again.
+
+    A failed send is retried after an exponential backoff with jitter,
+    `base_delay` * 2^(attempts - 1) capped at `max_delay`. Emails that exhaust
+    max_attempts or fail permanently are dead-lettered with their last error.
+    """
+
+    def __init__(self, concurrency: Dict[str, int], batch_size: int = 50,
+                 poll_interval: float = 1.0, base_delay: float = 30.0,
+                 max_delay: float = 3600.0, lease_seconds: float = 300.0):
+        self.concurrency = {provider: limit for provider, limit in concurrency.items() if limit > 0}
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.lease_seconds = lease_seconds
+
+        self._backends = {}
+        self._executors = {}
+        self._in_flight = {}  # future -> message
+        self._stop = threading.Event()
+
+    def run(self, once: bool = False) -> None:
+        """
+        Deliver emails until stop() is called. Must run inside an app context.
+
+        Args:
+            once (bool): Exit as soon as nothing is due or in flight
+        """
+        logger.info(f"Email worker started with concurrency {self.concurrency}")
+        try:
+            while not self._stop.is_set():
+                for message in self._claim():
+                    future = self._executor(message['provider']).submit(self._backend(message['provider']).send, message)
+                    self._in_flight[future] = message
+                if self._in_flight:
+                    done, _ = wait(list(self._in_flight), timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                    self._record(done)
+                elif once:
+                    break
+                else:
+                    self._stop.wait(self.poll_interval)
+        finally:
+            # Let in-flight sends finish so their outcome is recorded rather than left to the lease
+            if self._in_flight:
+                done, _ = wait(list(self._in_flight))
+                self._record(done)
+            for executor in self._executors.values():
+                executor.shutdown(wait=True)
+            for backend in self._backends.values():
+                backend.close()
+            logger.info("Email worker stopped")
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def backoff(self, attempts: int) -> float:
+        """Seconds to wait before the next try after `attempts` failures."""
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+        # Jitter spreads retries of a burst that failed together
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def _claim(self) -> List[Dict]:
+        free = {}
+        for provider, limit in self.concurrency.items():
+            busy = sum(1 for message in self._in_flight.values() if message['provider'] == provider)
+            if limit > busy:
+                free[provider] = limit - busy
+        if not free:
+            return []
+
+        now = datetime.utcnow()
+        due = and_(
+            EmailOutbox.provider.in_(list(free)),
+            or_(
+                and_(EmailOutbox.status == STATUS_PENDING, EmailOutbox.next_attempt_at <= now),
+                and_(EmailOutbox.status == STATUS_SENDING, EmailOutbox.locked_until < now)
+            )
+        )
+        candidates = db.session.execute(
+            select(EmailOutbox.email_id, EmailOutbox.provider).where(due)
+            .order_by(EmailOutbox.next_attempt_at, EmailOutbox.email_id)
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+        ).all()
+
+        email_ids = []
+        for email_id, provider in candidates:
+            if free[provider]:
+                free[provider] -= 1
+                email_ids.append(email_id)
+        if not email_ids:
+            db.session.rollback()
+            return []
+
+        # Re-checking `due` means a row another worker claimed in the meantime is not returned
+        claimed = db.session.execute(
+            update(EmailOutbox)
+            .where(EmailOutbox.email_id.in_(email_ids), due)
+            .values(status=STATUS_SENDING, locked_until=now + timedelta(seconds=self.lease_seconds))
+            .returning(*_MESSAGE_COLUMNS, EmailOutbox.locked_until)
+        ).mappings().all()
+        db.session.commit()
+        return [dict(message) for message in claimed]
+
+    def _record(self, futures) -> None:
+        now = datetime.utcnow()
+        for future in futures:
+            message = self._in_flight.pop(future)
+            attempts = message['attempts'] + 1
+            error = future.exception()
+            values = {'attempts': attempts, 'locked_until': None}
+            if error is None:
+                values.update(status=STATUS_SENT, sent_at=now, last_error=None)
+                logger.info(f"Sent email {message['email_id']} to {message['to_email']} via {message['provider']}")
+            elif isinstance(error, PermanentEmailError) or attempts >= message['max_attempts']:
+                values.update(status=STATUS_DEAD, last_error=str(error)[:500])
+                logger.error(f"Dead-lettered email {message['email_id']} after {attempts} attempts: {str(error)}")
+            else:
+                delay = self.backoff(attempts)
+                values.update(status=STATUS_PENDING, next_attempt_at=now + timedelta(seconds=delay), last_error=str(error)[:500])
+                logger.warning(f"Email {message['email_id']} failed (attempt {attempts}), retrying in {delay:.0f}s: {str(error)}")
+            # Only while our claim stands. Once the lease expires another worker can
+            # claim the row, which moves locked_until, so the lease we were given
+            # identifies our claim; status alone cannot tell the two apart
+            result = db.session.execute(
+                update(EmailOutbox)
+                .where(EmailOutbox.email_id == message['email_id'], EmailOutbox.status == STATUS_SENDING,
+                       EmailOutbox.locked_until == message['locked_until'])
+                .values(**values)
+            )
+            if result.rowcount == 0:
+                logger.warning(f"Lease on email {message['email_id']} expired before its result was recorded; left to its new claim")
+        db.session.commit()
+
+    def _backend(self, provider: str) -> EmailBackend:
+        if provider not in self._backends:
+            self._backends[provider] = create_backend(provider)
+        return self._backends[provider]
+
+    def _executor(self, provider: str) -> ThreadPoolExecutor:
+        if provider not in self._executors:
+            self._executors[provider] = ThreadPoolExecutor(
+                max_workers=self.concurrency[provider], thread_name_prefix=f"email-{provider}"
+            )
+        return self._executors[provider]
+
+
+def parse_concurrency(value: str) -> Dict[str, int]:
+    """Parse 'brevo=4,smtp=2' into per-provider thread limits."""
+    limits = {}
+    for part in value.split(','):
+        if not part.strip():
+            continue
+        provider, _, limit = part.partition('=')
+        provider = provider.strip().lower()
+        if provider not in PROVIDERS:
+            raise ValueError(f"Unsupported email backend: {provider}")
+        limits[provider] = int(limit)
+    return limits
+
+
+def create_outbox_worker() -> OutboxWorker:
+    """Create a worker configured by the EMAIL_WORKER_* environment variables."""
+    return OutboxWorker(
+        concurrency=parse_concurrency(os.getenv('EMAIL_WORKER_CONCURRENCY', 'brevo=4,smtp=2,file=1')),
+        batch_size=int(os.getenv('EMAIL_WORKER_BATCH_SIZE', '50')),
+        poll_interval=float(os.getenv('EMAIL_WORKER_POLL_INTERVAL', '1.0')),
+        base_delay=float(os.getenv('EMAIL_RETRY_BASE_DELAY', '30')),
+        max_delay=float(os.getenv('EMAIL_RETRY_MAX_DELAY', '3600')),
+        lease_seconds=float(os.getenv('EMAIL_WORKER_LEASE_SECONDS', '300'))
+    )
@@ -0,0 +1,150 @@
+import os
+import time
+import logging
+from typing import Optional
+from flask import g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+)
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.multiprocess import MultiProcessCollector
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+from database import db
+from services.email_outbox import EmailOutboxService, STATUS_PENDING, STATUS_SENDING, STATUS_SENT, STATUS_DEAD
+from services.query_tracker import request_queries
+
+logger = logging.getLogger(__name__)
+
+# Set by gunicorn.conf.py before workers start: every worker then writes its
+# samples to files in this directory and /metrics sums them. Without it (the
+# dev server, CLI commands) metrics live in the process that serves /metrics.
+MULTIPROCESS = bool(os.getenv('PROMETHEUS_MULTIPROC_DIR'))
+
+CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+OPENAI_BUCKETS = (0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Time spent handling a request, by route',
+    ['method', 'route'], buckets=LATENCY_BUCKETS
+)
+REQUESTS = Counter('http_requests', 'Responses sent, by route and status', ['method', 'route', 'status'])
+REQUEST_QUERIES = Histogram(
+    'http_request_db_queries', 'Database queries run while handling a request, by route',
+    ['route'], buckets=QUERY_COUNT_BUCKETS
+)
+REQUEST_QUERY_TIME = Histogram(
+    'http_request_db_seconds', 'Time spent in database queries while handling a request, by route',
+    ['route'], buckets=LATENCY_BUCKETS
+)
+
+# Gauges are summed over the workers that are alive
+POOL_IN_USE = Gauge('db_pool_connections_in_use', 'Connections checked out of the pool',
+                    ['bind'], multiprocess_mode='livesum')
+POOL_CAPACITY = Gauge('db_pool_capacity', 'Connections the pool may open (size plus overflow)',
+                      ['bind'], multiprocess_mode='livesum')
+AUDIT_QUEUE_DEPTH = Gauge('audit_queue_depth', 'Audit entries waiting for the background writer',
+                          multiprocess_mode='livesum')
+
+OPENAI_LATENCY = Histogram(
+    'openai_request_duration_seconds', 'Time spent waiting for OpenAI, by model and outcome',
+    ['model', 'outcome'], buckets=OPENAI_BUCKETS
+)
+OPENAI_TOKENS = Counter('openai_tokens', 'Tokens used by OpenAI calls, by model and kind', ['model', 'kind'])
+
+
+class OutboxCollector:
+    """
+    Email outbox backlog, read from the database when /metrics is scraped.
+    The outbox is shared by every worker, so it is not aggregated per process.
+    """
+
+    def collect(self):
+        try:
+            stats = EmailOutboxService(db.session).stats()
+        except Exception as e:
+            logger.warning(f"Could not read email outbox stats for metrics: {str(e)}")
+            db.session.rollback()
+            return
+        lag = GaugeMetricFamily('email_outbox_lag_seconds',
+                                'How long the most overdue pending email has been waiting')
+        lag.add_metric([], stats['oldest_due_seconds'])
+        yield lag
+        emails = GaugeMetricFamily('email_outbox_emails', 'Emails in the outbox, by status', labels=['status'])
+        for status in (STATUS_PENDING, STATUS_SENDING, STATUS_SENT, STATUS_DEAD):
+            emails.add_metric([status], stats['counts'].get(status, 0))
+        yield emails
+
+
+_scrape_registry = CollectorRegistry()
+_scrape_registry.register(OutboxCollector())
+
+
+def render_metrics() -> bytes:
+    """The exposition text for /metrics. Needs an app context for the outbox query."""
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry) + generate_latest(_scrape_registry)
+
+
+def record_openai_call(model: str, seconds: float, usage=None) -> None:
+    """Record one OpenAI call; `usage` is the response's usage object, or None when the call failed."""
+    OPENAI_LATENCY.labels(model, 'ok' if usage is not None else 'error').observe(seconds)
+    if usage is not None:
+        OPENAI_TOKENS.labels(model, 'prompt').inc(usage.prompt_tokens or 0)
+        OPENAI_TOKENS.labels(model, 'completion').inc(usage.completion_tokens or 0)
+
+
+def _route() -> str:
+    # The rule, not the path, so /api/training-plans/<int:plan_id> is one series
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
+def _watch_pool(bind: str, engine) -> None:
+    pool = engine.pool
+    if isinstance(pool, QueuePool):
+        # QueuePool has no public accessor for max_overflow
+        POOL_CAPACITY.labels(bind).set(pool.size() + max(pool._max_overflow, 0))
+    in_use = POOL_IN_USE.labels(bind)
+    event.listen(pool, 'checkout', lambda dbapi_connection, record, proxy: in_use.inc())
+    event.listen(pool, 'checkin', lambda dbapi_connection, record: in_use.dec())
+
+
+def init_metrics(app) -> None:
+    """
+    Record request latency, status codes, per-request query counts and pool
+    usage for /metrics. Query counts come from init_query_tracking(), which
+    must be set up first. Call before the other before_request hooks so
+    requests they answer early (e.g. maintenance mode) are timed too.
+    """
+    with app.app_context():
+        for bind_key, engine in db.engines.items():
+            _watch_pool(bind_key or 'primary', engine)
+
+    @app.before_request
+    def start_request_metrics():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def record_request_metrics(response):
+        started: Optional[float] = g.pop('metrics_started', None)
+        if started is None:
+            return response
+        route = _route()
+        REQUEST_LATENCY.labels(request.method, route).observe(time.perf_counter() - started)
+        REQUESTS.labels(request.method, route, str(response.status_code)).inc()
+        queries = request_queries()
+        if queries is not None:
+            REQUEST_QUERIES.labels(route).observe(queries.count)
+            REQUEST_QUERY_TIME.labels(route).observe(queries.seconds)
+
+        depth = app.extensions['audit_sink'].stats().get('queue_depth') if 'audit_sink' in app.extensions else None
+        if depth is not None:
+            AUDIT_QUEUE_DEPTH.set(depth)
+        return response
@@ -1,8 +1,10 @@
 import os
-import openai
+import time
+import threading
 from dotenv import load_dotenv
 import logging
 from typing import Dict, Any, List, Optional
+from services.metrics import record_openai_call
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -11,17 +13,27 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
-# Initialize OpenAI client with better error handling
-api_key = os.getenv("OPENAI_API_KEY")
-if not api_key:
-    logger.error("OPENAI_API_KEY environment variable is not set")
-    raise ValueError("OPENAI_API_KEY environment variable is not set")
+_client = None
+_client_lock = threading.Lock()
 
-try:
-    client = openai.OpenAI(api_key=api_key)
-except Exception as e:
-    logger.error(f"Failed to initialize OpenAI client: {str(e)}")
-    raise
+
+def get_client() -> "openai.OpenAI":
+    """Create the OpenAI client on first use; the SDK is slow to import and needs an API key."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                api_key = os.getenv("OPENAI_API_KEY")
+                if not api_key:
+                    logger.error("OPENAI_API_KEY environment variable is not set")
+                    raise ValueError("OPENAI_API_KEY environment variable is not set")
+                try:
+                    import openai
+                    _client = openai.OpenAI(api_key=api_key)
+                except Exception as e:
+                    logger.error(f"Failed to initialize OpenAI client: {str(e)}")
+                    raise
+    return _client
 
 class OpenAIService:
     """
@@ -68,13 +80,19 @@ class OpenAIService:
             messages.append({"role": "user", "content": prompt})
             
             # Make the API call with timeout
-            response = client.chat.completions.create(
-                model=model,
-                messages=messages,
-                max_tokens=max_tokens,
-                temperature=temperature,
-                timeout=timeout
-            )
+            started = time.perf_counter()
+            try:
+                response = get_client().chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    timeout=timeout
+                )
+            except Exception:
+                record_openai_call(model, time.perf_counter() - started)
+                raise
+            record_openai_call(model, time.perf_counter() - started, response.usage)
             
             # Extract and return the response content
             result = {
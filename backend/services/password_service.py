@@ -0,0 +1,138 @@
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict
+import bcrypt
+
+
+class PasswordServiceBusy(Exception):
+    """Raised when too many hashes are already pending; callers should answer 429."""
+
+
+def _hashpw(password: bytes, rounds: int) -> bytes:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds=rounds))
+
+
+def _checkpw(password: bytes, hashed: bytes) -> bool:
+    return bcrypt.checkpw(password, hashed)
+
+
+class PasswordService:
+    """
+    Runs bcrypt in a dedicated, size-limited process pool so password hashing
+    cannot pin the CPU of the worker handling every other request.
+
+    At most `max_pending` hashes may be queued or running at once. A caller
+    that cannot get a slot within `admission_timeout` seconds gets a
+    PasswordServiceBusy instead of waiting behind the queue. With `workers`
+    set to 0, hashing runs inline but is still admission-controlled.
+    """
+
+    def __init__(self, workers: int = 2, max_pending: int = 16,
+                 admission_timeout: float = 0.1, rounds: int = 12):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.admission_timeout = admission_timeout
+        self.rounds = rounds
+
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pool = None
+        self._pid = None
+        self._pool_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+        self._pending = 0
+        self._completed = 0
+        self._rejected = 0
+
+    def hash(self, password: str) -> str:
+        """Hash a password with the configured cost factor."""
+        return self._run(_hashpw, password.encode('utf-8'), self.rounds).decode('utf-8')
+
+    def check(self, password: str, password_hash: str) -> bool:
+        """Check a password against a stored bcrypt hash."""
+        return self._run(_checkpw, password.encode('utf-8'), password_hash.encode('utf-8'))
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        """Whether a stored hash was made with a cost factor other than the configured one."""
+        # bcrypt hashes look like $2b$12$<salt+digest>
+        try:
+            return int(password_hash.split('$')[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            pending = self._pending
+            return {
+                'workers': self.workers,
+                'rounds': self.rounds,
+                'pending': pending,
+                'queue_depth': max(0, pending - self.workers) if self.workers else 0,
+                'max_pending': self.max_pending,
+                'completed': self._completed,
+                'rejected': self._rejected
+            }
+
+    def shutdown(self) -> None:
+        """Stop this process's hashing pool; the next call starts a new one."""
+        self._reset_pool()
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(timeout=self.admission_timeout):
+            with self._stats_lock:
+                self._rejected += 1
+            raise PasswordServiceBusy("Password hashing queue is full")
+
+        with self._stats_lock:
+            self._pending += 1
+        try:
+            if not self.workers:
+                return fn(*args)
+            try:
+                return self._get_pool().submit(fn, *args).result()
+            except BrokenProcessPool:
+                # A pool process died (e.g. OOM killed); start a fresh pool and retry once
+                self._reset_pool()
+                return self._get_pool().submit(fn, *args).result()
+        finally:
+            with self._stats_lock:
+                self._pending -= 1
+                self._completed += 1
+            self._slots.release()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        # Pools do not survive fork, so each gunicorn worker creates its own on first use
+        if self._pool is not None and self._pid == os.getpid():
+            return self._pool
+        with self._pool_lock:
+            if self._pool is None or self._pid != os.getpid():
+                # Not fork: this process already runs request, audit and metrics threads, and a
+                # forked child can inherit a lock one of them held. The children only need bcrypt
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context('forkserver')
+                )
+                self._pid = os.getpid()
+            return self._pool
+
+    def _reset_pool(self) -> None:
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None and self._pid == os.getpid():
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _default_workers() -> int:
+    return min(2, os.cpu_count() or 1)
+
+
+_workers = int(os.getenv('PASSWORD_HASH_WORKERS', str(_default_workers())))
+
+password_service = PasswordService(
+    workers=_workers,
+    max_pending=int(os.getenv('PASSWORD_HASH_MAX_PENDING', str(max(1, _workers) * 8))),
+    admission_timeout=float(os.getenv('PASSWORD_HASH_ADMISSION_TIMEOUT', '0.1')),
+    rounds=int(os.getenv('BCRYPT_ROUNDS', '12'))
+)
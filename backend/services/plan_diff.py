@@ -0,0 +1,267 @@
+import hashlib
+import logging
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+import orjson
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.orm import Session
+from database import utc_now
+from models.training_plan import TrainingPlan, PlanExercise
+from models.progress_tracking import ProgressTracking
+from models.progress_rollup import ProgressRollup
+from services.plan_overlay import GRID_ORDER, PlanOverlayService, visible_exercises
+
+logger = logging.getLogger(__name__)
+
+# The grid position of an exercise; at most one exercise per slot
+SLOT_FIELDS = ('week_number', 'day_number', 'order_in_day')
+TEXT_FIELDS = ('description', 'sets', 'reps', 'intensity', 'rest_period',
+               'special_instructions', 'video_url', 'image_url')
+# Every column a client sets; omitted ones are cleared, since a row is the exercise's full state
+EXERCISE_FIELDS = ('name',) + TEXT_FIELDS + SLOT_FIELDS
+# Plan columns that count towards its version alongside the exercises
+PLAN_VERSION_FIELDS = ('title', 'description', 'difficulty_level', 'duration_weeks', 'training_frequency',
+                       'training_objective', 'focus_areas', 'exercise_types', 'specific_instructions')
+MAX_EXERCISES = 2000
+
+
+class PlanVersionConflict(Exception):
+    """The plan changed since the client read the version it sent."""
+
+    def __init__(self, current_version: str):
+        super().__init__("The plan was changed by someone else; reload it and try again")
+        self.current_version = current_version
+
+
+@dataclass
+class ExerciseDiff:
+    inserts: List[Dict] = field(default_factory=list)
+    updates: List[Dict] = field(default_factory=list)  # full rows, with exercise_id
+    deletes: List[int] = field(default_factory=list)
+    unchanged: int = 0
+    # The columns each updated exercise changed, by exercise_id
+    changed_fields: Dict[int, List[str]] = field(default_factory=dict)
+    # Template exercises an overlay plan shows, by exercise_id; they are copied or hidden, never written
+    shared: Dict[int, PlanExercise] = field(default_factory=dict)
+
+    @property
+    def empty(self) -> bool:
+        return not (self.inserts or self.updates or self.deletes)
+
+    def summary(self) -> Dict:
+        return {'created': len(self.inserts), 'updated': len(self.updates),
+                'deleted': len(self.deletes), 'unchanged': self.unchanged}
+
+    def report(self) -> Dict:
+        """What changed, exercise by exercise: new rows, the changed fields of updated ones, and removed ids."""
+        return {
+            'created': [row['name'] for row in self.inserts],
+            'updated': {exercise_id: fields for exercise_id, fields in self.changed_fields.items()},
+            'deleted': self.deletes,
+            'unchanged': self.unchanged
+        }
+
+
+def _row(exercise: PlanExercise) -> Dict:
+    return {name: getattr(exercise, name) for name in EXERCISE_FIELDS}
+
+
+def plan_version(plan: TrainingPlan, exercises: Iterable[PlanExercise]) -> str:
+    """
+    A token that changes whenever the plan's details or any of its exercises
+    do. It is derived from the content, so it needs no column and survives
+    writes from any path.
+    """
+    content = [
+        [getattr(plan, name) for name in PLAN_VERSION_FIELDS],
+        sorted([exercise.exercise_id, *_row(exercise).values()] for exercise in exercises)
+    ]
+    return hashlib.sha1(orjson.dumps(content, default=str)).hexdigest()[:16]
+
+
+def normalize_rows(rows) -> List[Dict]:
+    """
+    Validate the requested exercises and coerce them to column values.
+
+    Raises:
+        ValueError: When a row is malformed or two rows share a slot
+    """
+    if not isinstance(rows, list):
+        raise ValueError("exercises must be a list")
+    if len(rows) > MAX_EXERCISES:
+        raise ValueError(f"A plan can have at most {MAX_EXERCISES} exercises")
+
+    normalized, slots, ids = [], set(), set()
+    for index, row in enumerate(rows):
+        if not isinstance(row, dict):
+            raise ValueError(f"Exercise {index} must be an object")
+        name = row.get('name')
+        if not isinstance(name, str) or not name.strip():
+            raise ValueError(f"Exercise {index} needs a name")
+        values = {'name': name.strip()}
+        for column in TEXT_FIELDS:
+            value = row.get(column)
+            values[column] = str(value) if value is not None else None
+        for column in SLOT_FIELDS:
+            try:
+                values[column] = int(row[column])
+            except (KeyError, TypeError, ValueError):
+                raise ValueError(f"Exercise {index} needs an integer {column}")
+            if values[column] < 0:
+                raise ValueError(f"Exercise {index} has a negative {column}")
+
+        slot = tuple(values[column] for column in SLOT_FIELDS)
+        if slot in slots:
+            raise ValueError(f"Two exercises are in week {slot[0]}, day {slot[1]}, position {slot[2]}")
+        slots.add(slot)
+
+        exercise_id = row.get('exercise_id')
+        if exercise_id is not None:
+            if not isinstance(exercise_id, int) or exercise_id in ids:
+                raise ValueError(f"Exercise {index} has an invalid or repeated exercise_id")
+            ids.add(exercise_id)
+            values['exercise_id'] = exercise_id
+        normalized.append(values)
+    return normalized
+
+
+# Ways a row without an exercise_id is recognised as an existing exercise, tried
+# in order: unchanged, moved within its day, or edited in place
+MATCH_KEYS = (
+    ('name',) + SLOT_FIELDS,
+    ('name', 'week_number', 'day_number'),
+    SLOT_FIELDS,
+)
+
+
+def diff_exercises(existing: Iterable[PlanExercise], rows: List[Dict]) -> ExerciseDiff:
+    """
+    Match requested rows to the plan's current exercises and work out the
+    fewest inserts, updates and deletes that turn one into the other. A row
+    is matched by its exercise_id, or else by MATCH_KEYS, so exercises keep
+    their ids (and their clients' progress history) when they are edited,
+    reordered or moved.
+    """
+    current = {exercise.exercise_id: exercise for exercise in existing}
+    claimed = {row['exercise_id'] for row in rows if 'exercise_id' in row}
+    unknown = claimed - current.keys()
+    if unknown:
+        raise ValueError(f"Exercises {sorted(unknown)} are not part of this plan")
+
+    matches = {index: current[row['exercise_id']] for index, row in enumerate(rows) if 'exercise_id' in row}
+    free = [exercise for exercise_id, exercise in sorted(current.items()) if exercise_id not in claimed]
+    for key in MATCH_KEYS:
+        candidates = defaultdict(list)
+        for exercise in free:
+            candidates[tuple(getattr(exercise, column) for column in key)].append(exercise)
+        for index, row in enumerate(rows):
+            bucket = candidates.get(tuple(row[column] for column in key))
+            if index not in matches and bucket:
+                matches[index] = bucket.pop(0)
+        taken = {exercise.exercise_id for exercise in matches.values()}
+        free = [exercise for exercise in free if exercise.exercise_id not in taken]
+
+    diff = ExerciseDiff()
+    for index, row in enumerate(rows):
+        values = {column: row[column] for column in EXERCISE_FIELDS}
+        exercise = matches.get(index)
+        if exercise is None:
+            diff.inserts.append(values)
+            continue
+        changed = [column for column in EXERCISE_FIELDS if getattr(exercise, column) != values[column]]
+        if changed:
+            diff.updates.append({'exercise_id': exercise.exercise_id, **values})
+            diff.changed_fields[exercise.exercise_id] = changed
+        else:
+            diff.unchanged += 1
+    diff.deletes = sorted(current.keys() - {exercise.exercise_id for exercise in matches.values()})
+    return diff
+
+
+class PlanDiffService:
+    """
+    Replaces a plan's exercise grid in one transaction with a fixed number of
+    statements, however many exercises change:
+
+    1. the plan's current exercises (the plan row itself is loaded FOR UPDATE by the caller)
+    2. deletes: progress records are detached and the removed exercises' rollups dropped,
+       as the ORM delete path does, then one DELETE ... IN
+    3. one executemany UPDATE by primary key for changed exercises
+    4. one multi-row INSERT for new ones
+    5. the plan's updated_at
+
+    On an overlay plan, template exercises that change are copied into the
+    plan and hidden, and removed ones are hidden (see PlanOverlayService).
+
+    These are bulk statements, so the ORM flush hooks do not see them; the
+    caller must invalidate the plan's cached payloads after commit.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def exercises(self, plan_id: int) -> List[PlanExercise]:
+        """The exercises the plan shows, in grid order."""
+        return self.db.scalars(select(PlanExercise).where(visible_exercises(plan_id)).order_by(*GRID_ORDER)).all()
+
+    def diff(self, plan_id: int, rows: List[Dict]) -> Tuple[List[PlanExercise], ExerciseDiff]:
+        """The plan's current exercises, and the diff turning them into the normalized `rows`."""
+        existing = self.exercises(plan_id)
+        diff = diff_exercises(existing, rows)
+        diff.shared = {exercise.exercise_id: exercise for exercise in existing if exercise.plan_id != plan_id}
+        return existing, diff
+
+    def replace_exercises(self, plan: TrainingPlan, rows, expected_version: Optional[str] = None
+                          ) -> Tuple[ExerciseDiff, str, List[PlanExercise]]:
+        """
+        Make `rows` the plan's exercises. Commits unless nothing changed.
+
+        Returns:
+            Tuple[ExerciseDiff, str, List[PlanExercise]]: What changed, and the plan's
+            version and exercises afterwards
+
+        Raises:
+            ValueError: When the rows are invalid
+            PlanVersionConflict: When `expected_version` is not the current version
+        """
+        existing, diff = self.diff(plan.plan_id, normalize_rows(rows))
+        if expected_version is not None:
+            current_version = plan_version(plan, existing)
+            if expected_version != current_version:
+                raise PlanVersionConflict(current_version)
+
+        if diff.empty:
+            return diff, plan_version(plan, existing), existing
+
+        self.apply(plan.plan_id, diff)
+        self.db.commit()
+        logger.info(f"Replaced exercises of plan {plan.plan_id}: {diff.summary()}")
+        exercises = self.exercises(plan.plan_id)
+        return diff, plan_version(plan, exercises), exercises
+
+    def apply(self, plan_id: int, diff: ExerciseDiff) -> None:
+        """Write `diff` in the current transaction, without committing."""
+        deletes = [exercise_id for exercise_id in diff.deletes if exercise_id not in diff.shared]
+        updates = [row for row in diff.updates if row['exercise_id'] not in diff.shared]
+        overrides = {row['exercise_id']: row for row in diff.updates if row['exercise_id'] in diff.shared}
+        if deletes:
+            self.db.execute(
+                update(ProgressTracking).where(ProgressTracking.exercise_id.in_(deletes))
+                .values(exercise_id=None)
+            )
+            self.db.execute(delete(ProgressRollup).where(ProgressRollup.exercise_id.in_(deletes)))
+            self.db.execute(delete(PlanExercise).where(PlanExercise.exercise_id.in_(deletes)))
+        if updates:
+            self.db.execute(update(PlanExercise), updates)
+        if overrides or len(deletes) < len(diff.deletes):
+            overlays = PlanOverlayService(self.db)
+            copies = overlays.copy_into(
+                plan_id, [diff.shared[exercise_id] for exercise_id in overrides],
+                changes={exercise_id: {column: row[column] for column in EXERCISE_FIELDS}
+                         for exercise_id, row in overrides.items()}
+            )
+            overlays.hide(plan_id, list(copies) + [exercise_id for exercise_id in diff.deletes if exercise_id in diff.shared])
+        if diff.inserts:
+            self.db.execute(insert(PlanExercise), [{'plan_id': plan_id, **row} for row in diff.inserts])
+        self.db.execute(update(TrainingPlan).where(TrainingPlan.plan_id == plan_id).values(updated_at=utc_now()))
@@ -0,0 +1,228 @@
+import logging
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import Integer, and_, bindparam, delete, insert, literal, or_, select, update
+from sqlalchemy.orm import Session
+from database import utc_now
+from models.training_plan import TrainingPlan, PlanExercise
+from models.plan_overlay import PlanOverlay, PlanExerciseOverride
+from models.progress_tracking import ProgressTracking
+from models.progress_rollup import ProgressRollup
+from models.user import UserTrainingPlan
+from services.response_cache import invalidate_on_commit
+
+logger = logging.getLogger(__name__)
+
+# Plan columns a clone takes from its source
+CLONED_PLAN_FIELDS = ('description', 'difficulty_level', 'duration_weeks', 'training_frequency',
+                      'training_objective', 'focus_areas', 'exercise_types', 'specific_instructions')
+# Exercise columns copied into clones and overlays
+COPIED_EXERCISE_FIELDS = tuple(
+    column.key for column in PlanExercise.__table__.columns if column.key not in ('exercise_id', 'plan_id')
+)
+GRID_ORDER = (PlanExercise.week_number, PlanExercise.day_number, PlanExercise.order_in_day, PlanExercise.exercise_id)
+
+
+def _template_of(plan_id: int):
+    return select(PlanOverlay.template_id).where(PlanOverlay.plan_id == plan_id).scalar_subquery()
+
+
+def visible_exercises(plan_id: int):
+    """
+    Criterion on PlanExercise for the exercises a plan shows: its own and, for
+    an overlay, its template's that it does not hide. Read a plan's exercises
+    with this rather than PlanExercise.plan_id == plan_id.
+    """
+    hidden = select(PlanExerciseOverride.exercise_id).where(PlanExerciseOverride.plan_id == plan_id)
+    return or_(
+        PlanExercise.plan_id == plan_id,
+        and_(PlanExercise.plan_id == _template_of(plan_id), PlanExercise.exercise_id.not_in(hidden))
+    )
+
+
+def with_templates(plan_ids):
+    """Criterion on TrainingPlan for `plan_ids` (a list or a select) and their templates, for validators."""
+    templates = select(PlanOverlay.template_id).where(PlanOverlay.plan_id.in_(plan_ids))
+    return or_(TrainingPlan.plan_id.in_(plan_ids), TrainingPlan.plan_id.in_(templates))
+
+
+class PlanOverlayService:
+    """
+    Copy-on-write plan clones.
+
+    An overlay references its template's exercises instead of copying them
+    and stores only what differs: editing a template exercise copies that one
+    row into the overlay and hides the original, removing one hides it, and
+    new exercises are the overlay's own rows. Edits to the template show up
+    in every overlay that has not overridden them. Overlays are one level
+    deep; cloning an overlay overlays the same template.
+
+    Clients' progress follows an exercise when their plan copies it, so their
+    history stays on the exercise the plan shows. Nothing here commits except
+    clone().
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def template_id(self, plan_id: int) -> Optional[int]:
+        """The template of overlay `plan_id`, or None for plans that are not overlays."""
+        return self.db.scalar(select(PlanOverlay.template_id).where(PlanOverlay.plan_id == plan_id))
+
+    def exercises_by_plan(self, plan_ids: Iterable[int]) -> Dict[int, List[PlanExercise]]:
+        """The exercises each overlay among `plan_ids` shows, in grid order; other plans are left out."""
+        overlays = dict(self.db.execute(
+            select(PlanOverlay.plan_id, PlanOverlay.template_id).where(PlanOverlay.plan_id.in_(list(plan_ids)))
+        ).all())
+        if not overlays:
+            return {}
+        hidden = set(self.db.execute(
+            select(PlanExerciseOverride.plan_id, PlanExerciseOverride.exercise_id)
+            .where(PlanExerciseOverride.plan_id.in_(list(overlays)))
+        ).all())
+        overlays_of = defaultdict(list)
+        for plan_id, template_id in overlays.items():
+            overlays_of[template_id].append(plan_id)
+
+        shown = {plan_id: [] for plan_id in overlays}
+        rows = self.db.scalars(
+            select(PlanExercise).where(PlanExercise.plan_id.in_(set(overlays) | set(overlays_of))).order_by(*GRID_ORDER)
+        ).all()
+        for exercise in rows:
+            if exercise.plan_id in shown:
+                shown[exercise.plan_id].append(exercise)
+            for plan_id in overlays_of.get(exercise.plan_id, ()):
+                if (plan_id, exercise.exercise_id) not in hidden:
+                    shown[plan_id].append(exercise)
+        for exercises in shown.values():
+            exercises.sort(key=lambda exercise: tuple(getattr(exercise, column.key) or 0 for column in GRID_ORDER))
+        return shown
+
+    def clone(self, plan: TrainingPlan, title: str, overlay: bool = False) -> TrainingPlan:
+        """
+        Clone `plan` for its coach and commit. An overlay costs two INSERTs
+        however many exercises the plan has; a full copy copies the exercises
+        it shows with one INSERT ... SELECT.
+        """
+        clone = TrainingPlan(coach_id=plan.coach_id, title=title,
+                             **{name: getattr(plan, name) for name in CLONED_PLAN_FIELDS})
+        self.db.add(clone)
+        self.db.flush()
+
+        template_id = self.template_id(plan.plan_id) if overlay else None
+        if not overlay:
+            self._copy_exercises(visible_exercises(plan.plan_id), clone.plan_id)
+        elif template_id is None:
+            self.db.add(PlanOverlay(plan_id=clone.plan_id, template_id=plan.plan_id))
+        else:
+            # Keep overlays one level deep: overlay the same template, with the overlay's own rows and hides
+            self.db.add(PlanOverlay(plan_id=clone.plan_id, template_id=template_id))
+            self._copy_exercises(PlanExercise.plan_id == plan.plan_id, clone.plan_id)
+            self.db.execute(insert(PlanExerciseOverride).from_select(
+                ['plan_id', 'exercise_id'],
+                select(literal(clone.plan_id, Integer), PlanExerciseOverride.exercise_id)
+                .where(PlanExerciseOverride.plan_id == plan.plan_id)
+            ))
+        self.db.commit()
+        logger.info(f"Cloned plan {plan.plan_id} into {clone.plan_id} ({'overlay' if overlay else 'copy'})")
+        return clone
+
+    def override(self, plan_id: int, exercise: PlanExercise) -> PlanExercise:
+        """Copy template `exercise` into overlay `plan_id` so it can be edited there, and hide the original."""
+        copies = self.copy_into(plan_id, [exercise])
+        self.hide(plan_id, copies.keys())
+        return self.db.get(PlanExercise, copies[exercise.exercise_id])
+
+    def copy_into(self, plan_id: int, exercises: List[PlanExercise],
+                  changes: Optional[Dict[int, Dict]] = None) -> Dict[int, int]:
+        """
+        Copy template `exercises` into overlay `plan_id` with one executemany
+        INSERT, applying `changes` (column values by template exercise id), and
+        move the plan's clients' progress onto the copies. The originals stay
+        visible until hidden.
+
+        Returns:
+            Dict[int, int]: The copies' ids by template exercise id
+        """
+        if not exercises:
+            return {}
+        changes = changes or {}
+        table = PlanExercise.__table__
+        rows = [
+            {**{name: getattr(exercise, name) for name in COPIED_EXERCISE_FIELDS},
+             **changes.get(exercise.exercise_id, {}), 'plan_id': plan_id}
+            for exercise in exercises
+        ]
+        # Batched RETURNING does not keep parameter order on every backend, so
+        # copies are matched to their sources by content; identical rows are interchangeable
+        sources = defaultdict(list)
+        for exercise, row in zip(exercises, rows):
+            sources[tuple(row[name] for name in COPIED_EXERCISE_FIELDS)].append(exercise.exercise_id)
+        returned = self.db.execute(
+            insert(table).returning(table.c.exercise_id, *(table.c[name] for name in COPIED_EXERCISE_FIELDS)), rows
+        ).all()
+        copies = {sources[tuple(values)].pop(): new_id for new_id, *values in returned}
+        self._move_progress(plan_id, copies)
+        return copies
+
+    def hide(self, plan_id: int, exercise_ids: Iterable[int]) -> None:
+        """Stop overlay `plan_id` showing the template's `exercise_ids`."""
+        exercise_ids = list(exercise_ids)
+        if not exercise_ids:
+            return
+        self.db.execute(insert(PlanExerciseOverride), [
+            {'plan_id': plan_id, 'exercise_id': exercise_id} for exercise_id in exercise_ids
+        ])
+        self.db.execute(update(TrainingPlan).where(TrainingPlan.plan_id == plan_id).values(updated_at=utc_now()))
+        coach_id = self.db.scalar(select(TrainingPlan.coach_id).where(TrainingPlan.plan_id == plan_id))
+        invalidate_on_commit(self.db, [f'plan:{plan_id}', f'coach:{coach_id}'])
+
+    def materialize(self, plan_id: int) -> Dict[int, int]:
+        """
+        Give overlay `plan_id` its own copy of every template exercise it shows
+        and make it an ordinary plan. Its clients' progress moves to the copies.
+
+        Returns:
+            Dict[int, int]: The copies' ids by template exercise id; empty for plans that are not overlays
+        """
+        template_id = self.template_id(plan_id)
+        if template_id is None:
+            return {}
+        shown = self.db.scalars(
+            select(PlanExercise).where(PlanExercise.plan_id == template_id, visible_exercises(plan_id))
+            .order_by(*GRID_ORDER)
+        ).all()
+        copies = self.copy_into(plan_id, shown)
+        self.db.execute(delete(PlanExerciseOverride).where(PlanExerciseOverride.plan_id == plan_id))
+        self.db.execute(delete(PlanOverlay).where(PlanOverlay.plan_id == plan_id))
+        coach_id = self.db.scalar(select(TrainingPlan.coach_id).where(TrainingPlan.plan_id == plan_id))
+        # Same exercises, new ids
+        invalidate_on_commit(self.db, [f'plan:{plan_id}', f'coach:{coach_id}'])
+        logger.info(f"Materialized overlay {plan_id} of plan {template_id}: copied {len(copies)} exercises")
+        return copies
+
+    def release(self, plan_id: int) -> None:
+        """Prepare `plan_id` for deletion: its overlays are materialized and its own overlay rows removed."""
+        for overlay_id in self.db.scalars(select(PlanOverlay.plan_id).where(PlanOverlay.template_id == plan_id)).all():
+            self.materialize(overlay_id)
+        self.db.execute(delete(PlanExerciseOverride).where(PlanExerciseOverride.plan_id == plan_id))
+        self.db.execute(delete(PlanOverlay).where(PlanOverlay.plan_id == plan_id))
+
+    def _copy_exercises(self, criterion, plan_id: int) -> None:
+        self.db.execute(insert(PlanExercise).from_select(
+            ['plan_id', *COPIED_EXERCISE_FIELDS],
+            select(literal(plan_id, Integer), *(getattr(PlanExercise, name) for name in COPIED_EXERCISE_FIELDS))
+            .where(criterion).order_by(*GRID_ORDER)
+        ))
+
+    def _move_progress(self, plan_id: int, copies: Dict[int, int]) -> None:
+        # Only the plan's own clients: others following the template keep logging against the original
+        clients = select(UserTrainingPlan.user_id).where(UserTrainingPlan.plan_id == plan_id)
+        moves = [{'old_id': old_id, 'new_id': new_id} for old_id, new_id in copies.items()]
+        for table in (ProgressTracking.__table__, ProgressRollup.__table__):
+            self.db.execute(
+                update(table)
+                .where(table.c.exercise_id == bindparam('old_id'), table.c.user_id.in_(clients))
+                .values(exercise_id=bindparam('new_id')),
+                moves
+            )
@@ -0,0 +1,255 @@
+import logging
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import and_, delete, event, insert, inspect, or_, select
+from sqlalchemy.orm import Session
+from models.progress_tracking import ProgressTracking
+from models.progress_rollup import ProgressRollup
+
+logger = logging.getLogger(__name__)
+
+PERIODS = ('day', 'week')
+
+_tracking = ProgressTracking.__table__
+_rollups = ProgressRollup.__table__
+_ROW_COLUMNS = (_tracking.c.date, _tracking.c.sets_completed, _tracking.c.reps_completed,
+                _tracking.c.weight_used, _tracking.c.rating)
+
+
+def week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+
+def estimated_1rm(weight: float, reps: int) -> float:
+    """Epley estimate of the one-rep max; a single rep is its own max."""
+    return weight if reps <= 1 else weight * (1 + reps / 30.0)
+
+
+def aggregate(rows: Iterable) -> Dict:
+    """
+    Aggregate (date, sets, reps, weight, rating) rows into rollup values.
+
+    Weightless records count towards sessions and ratings but add no volume.
+    """
+    totals = {'volume': 0.0, 'max_weight': None, 'est_1rm': None,
+              'session_count': 0, 'rating_sum': 0, 'rating_count': 0}
+    for _, sets, reps, weight, rating in rows:
+        totals['session_count'] += 1
+        if rating is not None:
+            totals['rating_sum'] += rating
+            totals['rating_count'] += 1
+        if weight is None:
+            continue
+        weight = float(weight)
+        totals['volume'] += (sets or 0) * (reps or 0) * weight
+        totals['max_weight'] = weight if totals['max_weight'] is None else max(totals['max_weight'], weight)
+        if reps:
+            one_rep_max = estimated_1rm(weight, reps)
+            totals['est_1rm'] = one_rep_max if totals['est_1rm'] is None else max(totals['est_1rm'], one_rep_max)
+    return totals
+
+
+def _rollup_rows(user_id: int, exercise_id: int, rows: List) -> List[Dict]:
+    """Day and week rollup rows for one user and exercise."""
+    buckets = defaultdict(list)
+    for row in rows:
+        day = row[0].date()
+        buckets[('day', day)].append(row)
+        buckets[('week', week_start(day))].append(row)
+
+    now = datetime.utcnow()
+    return [
+        dict(user_id=user_id, exercise_id=exercise_id, period=period,
+             period_start=period_start, updated_at=now, **aggregate(bucket_rows))
+        for (period, period_start), bucket_rows in buckets.items()
+    ]
+
+
+def refresh_buckets(connection, keys: Iterable) -> None:
+    """
+    Recompute the day and week rollups containing each (user_id, exercise_id, day) key.
+
+    Buckets are rebuilt from their source rows rather than adjusted by deltas,
+    because max weight and 1RM cannot be un-applied when a record is deleted.
+    One SELECT per affected week serves both the week and its days.
+    """
+    weeks = defaultdict(set)
+    for user_id, exercise_id, day in keys:
+        weeks[(user_id, exercise_id, week_start(day))].add(day)
+
+    for (user_id, exercise_id, monday), days in weeks.items():
+        start = datetime.combine(monday, datetime.min.time())
+        rows = connection.execute(
+            select(*_ROW_COLUMNS).where(
+                _tracking.c.user_id == user_id,
+                _tracking.c.exercise_id == exercise_id,
+                _tracking.c.date >= start,
+                _tracking.c.date < start + timedelta(days=7)
+            )
+        ).all()
+
+        connection.execute(delete(_rollups).where(
+            _rollups.c.user_id == user_id,
+            _rollups.c.exercise_id == exercise_id,
+            or_(
+                and_(_rollups.c.period == 'week', _rollups.c.period_start == monday),
+                and_(_rollups.c.period == 'day', _rollups.c.period_start.in_(days))
+            )
+        ))
+        new_rows = [
+            row for row in _rollup_rows(user_id, exercise_id, rows)
+            if row['period'] == 'week' or row['period_start'] in days
+        ]
+        if new_rows:
+            connection.execute(insert(_rollups), new_rows)
+
+
+def _committed_key(record: ProgressTracking):
+    # Where the record was before this flush changed it
+    values = []
+    for name in ('user_id', 'exercise_id', 'date'):
+        history = inspect(record).attrs[name].history
+        if history.deleted:
+            values.append(history.deleted[0])
+        else:
+            values.append(getattr(record, name))
+    if None in values:
+        return None
+    return values[0], values[1], values[2].date()
+
+
+def _before_flush(session, flush_context, instances):
+    keys = session.info.setdefault('progress_rollup_keys', set())
+    for record in list(session.dirty) + list(session.deleted):
+        if isinstance(record, ProgressTracking) and inspect(record).has_identity:
+            key = _committed_key(record)
+            if key:
+                keys.add(key)
+
+
+def _after_flush(session, flush_context):
+    keys = session.info.pop('progress_rollup_keys', set())
+    # Dates usually come from the server default, so read the flushed keys back
+    tracking_ids = [
+        record.tracking_id for record in list(session.new) + list(session.dirty)
+        if isinstance(record, ProgressTracking) and record not in session.deleted
+    ]
+    connection = session.connection()
+    if tracking_ids:
+        flushed = connection.execute(
+            select(_tracking.c.user_id, _tracking.c.exercise_id, _tracking.c.date)
+            .where(_tracking.c.tracking_id.in_(tracking_ids))
+        ).all()
+        # Records detached from a deleted exercise (exercise_id NULL) belong to no bucket
+        keys.update(
+            (user_id, exercise_id, day.date()) for user_id, exercise_id, day in flushed
+            if day and user_id is not None and exercise_id is not None
+        )
+    if keys:
+        refresh_buckets(connection, keys)
+
+
+def _after_soft_rollback(session, previous_transaction):
+    session.info.pop('progress_rollup_keys', None)
+
+
+def register_rollup_hooks() -> None:
+    """Keep progress_rollups in step with ORM inserts, updates and deletes of ProgressTracking."""
+    if not event.contains(Session, 'before_flush', _before_flush):
+        event.listen(Session, 'before_flush', _before_flush)
+        event.listen(Session, 'after_flush', _after_flush)
+        event.listen(Session, 'after_soft_rollback', _after_soft_rollback)
+
+
+class ProgressRollupService:
+    """
+    Reads and rebuilds the per-user, per-exercise daily and weekly progress rollups.
+
+    Bulk query deletes (Query.delete()) bypass the flush hooks; callers that use
+    them must call delete_for_user() or rebuild() themselves.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get_rollups(self, user_id: int, period: str = 'week',
+                    exercise_ids: Optional[List[int]] = None,
+                    start: Optional[date] = None, end: Optional[date] = None) -> List[ProgressRollup]:
+        """
+        Get a user's rollups ordered by exercise and period.
+
+        Args:
+            user_id (int): The user whose progress to read
+            period (str): 'day' or 'week'
+            exercise_ids (List[int], optional): Limit to these exercises
+            start (date, optional): First period_start to include
+            end (date, optional): Last period_start to include
+
+        Returns:
+            List[ProgressRollup]: Matching rollup rows
+        """
+        if period not in PERIODS:
+            raise ValueError(f"Invalid period. Must be one of: {', '.join(PERIODS)}")
+        query = self.db.query(ProgressRollup).filter(
+            ProgressRollup.user_id == user_id,
+            ProgressRollup.period == period
+        )
+        if exercise_ids:
+            query = query.filter(ProgressRollup.exercise_id.in_(exercise_ids))
+        if start:
+            query = query.filter(ProgressRollup.period_start >= start)
+        if end:
+            query = query.filter(ProgressRollup.period_start <= end)
+        return query.order_by(ProgressRollup.exercise_id, ProgressRollup.period_start).all()
+
+    def delete_for_user(self, user_id: int) -> None:
+        self.db.execute(delete(_rollups).where(_rollups.c.user_id == user_id))
+
+    def rebuild(self, user_id: Optional[int] = None, batch_size: int = 5000) -> int:
+        """
+        Recompute rollups from scratch, for one user or everyone.
+
+        Returns:
+            int: Number of rollup rows written
+        """
+        wipe = delete(_rollups)
+        source = select(_tracking.c.user_id, _tracking.c.exercise_id, *_ROW_COLUMNS).where(
+            _tracking.c.date.isnot(None),
+            _tracking.c.user_id.isnot(None),
+            _tracking.c.exercise_id.isnot(None)
+        )
+        if user_id is not None:
+            wipe = wipe.where(_rollups.c.user_id == user_id)
+            source = source.where(_tracking.c.user_id == user_id)
+        self.db.execute(wipe)
+
+        # Rows arrive grouped by user and exercise, so only one group is held in memory
+        source = source.order_by(_tracking.c.user_id, _tracking.c.exercise_id).execution_options(yield_per=batch_size)
+        written = 0
+        pending = []
+        group_key, group_rows = None, []
+
+        def flush_group():
+            nonlocal written, pending
+            if group_rows:
+                pending.extend(_rollup_rows(group_key[0], group_key[1], group_rows))
+            if len(pending) >= batch_size:
+                self.db.execute(insert(_rollups), pending)
+                written += len(pending)
+                pending = []
+
+        for row in self.db.execute(source):
+            key = (row[0], row[1])
+            if key != group_key:
+                flush_group()
+                group_key, group_rows = key, []
+            group_rows.append(row[2:])
+        flush_group()
+        if pending:
+            self.db.execute(insert(_rollups), pending)
+            written += len(pending)
+
+        self.db.commit()
+        logger.info(f"Rebuilt {written} progress rollups" + (f" for user {user_id}" if user_id is not None else ""))
+        return written
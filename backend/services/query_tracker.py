@@ -0,0 +1,164 @@
+import os
+import re
+import time
+import logging
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# A statement run this many times in one request is reported as a likely N+1
+REPEAT_THRESHOLD = int(os.getenv('QUERY_REPEAT_THRESHOLD', '5'))
+
+# Longest SQL timeline kept for one request
+MAX_TIMELINE = 2000
+
+# Trackers collecting the statements run in the current context (a request, a query_budget block)
+_active: ContextVar[Tuple['QueryTracker', ...]] = ContextVar('query_trackers', default=())
+
+_WHITESPACE = re.compile(r'\s+')
+# Bound parameters in any paramstyle: ?, :name, %(name)s, %s, $1
+_PARAMETER = r'(?:\?|:\w+|%\(\w+\)s|%s|\$\d+)'
+# Expanded IN lists differ in length from one call to the next
+_PARAMETER_LIST = re.compile(rf'\(\s*{_PARAMETER}(?:\s*,\s*{_PARAMETER})*\s*\)')
+_LITERAL = re.compile(r"'(?:[^']|'')*'|(?<![\w$])\d+(?:\.\d+)?\b")
+
+
+def fingerprint(statement: str) -> str:
+    """The statement with literals and parameter lists collapsed, so repeated lookups share one fingerprint."""
+    statement = _WHITESPACE.sub(' ', statement).strip()
+    statement = _LITERAL.sub('?', statement)
+    return _PARAMETER_LIST.sub('(?)', statement)
+
+
+class QueryTracker:
+    """
+    Statements executed while the tracker is active: how many, how long, and
+    which ones repeat. Set `timeline` to a list to also keep each statement
+    with its perf_counter() start and duration, in order.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.fingerprints = Counter()
+        self.timeline: Optional[List[Tuple[float, float, str]]] = None
+
+    def record(self, statement: str, seconds: float, started: float) -> None:
+        self.count += 1
+        self.seconds += seconds
+        self.fingerprints[fingerprint(statement)] += 1
+        if self.timeline is not None and len(self.timeline) < MAX_TIMELINE:
+            self.timeline.append((started, seconds, statement))
+
+    def repeated(self, threshold: int = REPEAT_THRESHOLD) -> List[Tuple[str, int]]:
+        """Fingerprints run at least `threshold` times, most frequent first."""
+        return [(statement, count) for statement, count in self.fingerprints.most_common() if count >= threshold]
+
+    def summary(self, limit: int = 3) -> str:
+        lines = [f"{self.count} queries in {self.seconds * 1000:.1f}ms"]
+        lines += [f"  {count}x {statement[:200]}" for statement, count in self.fingerprints.most_common(limit)]
+        return '\n'.join(lines)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@contextmanager
+def track_queries():
+    """Collect the statements run inside the block; trackers nest, and each sees every statement."""
+    tracker = QueryTracker()
+    token = _active.set(_active.get() + (tracker,))
+    try:
+        yield tracker
+    finally:
+        _active.reset(token)
+
+
+@contextmanager
+def query_budget(max_queries: int, max_repeats: Optional[int] = None):
+    """
+    Fail with QueryBudgetExceeded when the block runs more than `max_queries`
+    statements, or one statement more than `max_repeats` times. For tests:
+
+        with query_budget(5):
+            client.get('/api/coach/clients/3/progress', headers=headers)
+    """
+    with track_queries() as tracker:
+        yield tracker
+    if tracker.count > max_queries:
+        raise QueryBudgetExceeded(f"Query budget of {max_queries} exceeded: {tracker.summary()}")
+    if max_repeats is not None and tracker.repeated(max_repeats + 1):
+        raise QueryBudgetExceeded(f"A statement ran more than {max_repeats} times: {tracker.summary()}")
+
+
+def request_queries() -> Optional[QueryTracker]:
+    """The tracker for the current request, or None outside one."""
+    return g.get('query_tracker')
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info['query_started'] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop('query_started', None)
+    trackers = _active.get()
+    if started is None or not trackers:
+        return
+    elapsed = time.perf_counter() - started
+    for tracker in trackers:
+        tracker.record(statement, elapsed, started)
+
+
+def init_query_tracking(app, debug: bool = False) -> None:
+    """
+    Track the statements each request runs; /metrics reports the counts.
+
+    With `debug` every response carries X-Query-Count and a Server-Timing
+    entry for the database, and statements repeated REPEAT_THRESHOLD times
+    are logged as likely N+1s. When app.config['QUERY_BUDGET'] is set and the
+    app is testing, a request running more statements fails with
+    QueryBudgetExceeded, so CI catches endpoints that regress.
+    """
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    @app.before_request
+    def start_query_tracking():
+        tracker = QueryTracker()
+        g.query_tracker = tracker
+        g.query_tracker_token = _active.set(_active.get() + (tracker,))
+
+    @app.after_request
+    def report_queries(response):
+        tracker = request_queries()
+        if tracker is None:
+            return response
+        if debug:
+            response.headers['X-Query-Count'] = str(tracker.count)
+            response.headers.add('Server-Timing', f'db;dur={tracker.seconds * 1000:.1f};desc="{tracker.count} queries"')
+            repeated = tracker.repeated()
+            if repeated:
+                response.headers['X-Query-Repeated'] = str(repeated[0][1])
+                for statement, count in repeated:
+                    logger.warning(f"Possible N+1 in {request.method} {request.path}: {count}x {statement[:300]}")
+        budget = app.config.get('QUERY_BUDGET')
+        if app.testing and budget is not None and tracker.count > budget:
+            raise QueryBudgetExceeded(
+                f"{request.method} {request.path} exceeded the query budget of {budget}: {tracker.summary()}"
+            )
+        return response
+
+    @app.teardown_request
+    def stop_query_tracking(exc):
+        token = g.pop('query_tracker_token', None)
+        if token is not None:
+            _active.reset(token)
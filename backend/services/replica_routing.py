@@ -0,0 +1,229 @@
+import os
+import time
+import random
+import logging
+import threading
+from functools import wraps
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+from flask import current_app, request
+from flask_jwt_extended import get_jwt_identity
+from flask_sqlalchemy.session import Session
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# Replicas are configured as SQLALCHEMY_BINDS with these keys; models never name them
+REPLICA_BIND_PREFIX = 'replica_'
+# Seconds since the epoch until which this client's reads must go to the primary
+STICKY_COOKIE = 'db_primary_until'
+
+_USE_REPLICA = 'use_replica'
+_REPLICA_ENGINE = 'replica_engine'
+_WROTE = 'wrote'
+
+# Replay lag in seconds, or 0 when everything received has been replayed (an idle
+# primary leaves pg_last_xact_replay_timestamp() old without the replica being behind)
+_PG_LAG_QUERY = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+def replica_urls() -> List[str]:
+    return [url.strip() for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+
+
+def has_replicas(app) -> bool:
+    return any(str(key).startswith(REPLICA_BIND_PREFIX) for key in app.config.get('SQLALCHEMY_BINDS', {}))
+
+
+class RoutingSession(Session):
+    """
+    Session that can send reads to a replica.
+
+    Requests opt in through the read_replica decorator. Even then only
+    SELECTs go to the replica; flushes and DML always use the primary, and
+    once the session has written, its later reads use the primary too.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            if self._flushing or getattr(clause, 'is_dml', False):
+                self.info[_WROTE] = True
+            elif self.info.get(_USE_REPLICA) and not self.info.get(_WROTE) and (
+                clause is None or getattr(clause, 'is_select', False)
+            ):
+                engine = self._replica_engine()
+                if engine is not None:
+                    return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _replica_engine(self):
+        # One replica per session, so a request reads a single consistent snapshot
+        if _REPLICA_ENGINE not in self.info:
+            self.info[_REPLICA_ENGINE] = replica_router.choose(self._db.engines)
+        return self.info[_REPLICA_ENGINE]
+
+
+class ReplicaRouter:
+    """
+    Picks a healthy replica per request and remembers recent writers.
+
+    Replica lag is measured at most every `check_interval` seconds per
+    process; a replica more than `max_lag` seconds behind, or one that cannot
+    be reached, is skipped until a later check finds it caught up. With no
+    healthy replica, reads fall back to the primary. The lag query is given
+    `check_timeout` seconds, and connecting is bounded by the replica bind's
+    connect_timeout (database.replica_engine_options()), so a check stalls
+    the request that runs it for at most a few seconds.
+
+    A client that wrote is pinned to the primary for `sticky_seconds` so it
+    reads its own writes. The pin is kept in this worker's memory (keyed by
+    user) and in a cookie, so other workers honour it too.
+    """
+
+    def __init__(self, max_lag: float = 5.0, check_interval: float = 5.0, sticky_seconds: float = 10.0,
+                 check_timeout: float = 2.0):
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.check_timeout = check_timeout
+        self.sticky_seconds = sticky_seconds
+
+        self._health = {}  # bind key -> {'healthy', 'lag', 'checked_at', 'error'}
+        self._recent_writers = {}  # user id -> monotonic deadline
+        self._lock = threading.Lock()
+        self._checking = set()
+
+    def choose(self, engines: Dict) -> Optional[object]:
+        keys = [key for key in engines if isinstance(key, str) and key.startswith(REPLICA_BIND_PREFIX)]
+        healthy = [key for key in keys if self._is_healthy(key, engines[key])]
+        return engines[random.choice(healthy)] if healthy else None
+
+    def mark_write(self, user_id) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._recent_writers[user_id] = now + self.sticky_seconds
+            if len(self._recent_writers) > 10000:
+                self._recent_writers = {
+                    user: deadline for user, deadline in self._recent_writers.items() if deadline > now
+                }
+
+    def is_sticky(self, user_id, cookie_value: Optional[str] = None) -> bool:
+        if cookie_value:
+            try:
+                if float(cookie_value) > time.time():
+                    return True
+            except ValueError:
+                pass
+        if user_id is None:
+            return False
+        deadline = self._recent_writers.get(user_id)
+        return deadline is not None and deadline > time.monotonic()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'max_lag': self.max_lag,
+                'replicas': {key: dict(state) for key, state in self._health.items()},
+                'sticky_users': sum(1 for deadline in self._recent_writers.values() if deadline > time.monotonic())
+            }
+
+    def _is_healthy(self, key: str, engine) -> bool:
+        state = self._health.get(key)
+        if state is None or time.monotonic() - state['checked_at'] > self.check_interval:
+            # One thread refreshes while the others keep using the last result
+            with self._lock:
+                claimed = key not in self._checking
+                if claimed:
+                    self._checking.add(key)
+            if claimed:
+                try:
+                    state = self._check(key, engine)
+                finally:
+                    with self._lock:
+                        self._checking.discard(key)
+        return bool(state and state['healthy'])
+
+    def _check(self, key: str, engine) -> Dict:
+        try:
+            with engine.connect() as connection:
+                lag = 0.0
+                if engine.dialect.name == 'postgresql':
+                    connection.execute(text(f"SET LOCAL statement_timeout = {int(self.check_timeout * 1000)}"))
+                    lag = float(connection.execute(_PG_LAG_QUERY).scalar() or 0)
+            state = {'healthy': lag <= self.max_lag, 'lag': round(lag, 3), 'error': None}
+            if not state['healthy']:
+                logger.warning(f"Replica {key} is {lag:.1f}s behind; reading from the primary")
+        except Exception as e:
+            state = {'healthy': False, 'lag': None, 'error': str(e)[:200]}
+            logger.warning(f"Replica {key} unavailable; reading from the primary: {str(e)}")
+        state['checked_at'] = time.monotonic()
+        with self._lock:
+            self._health[key] = state
+        return state
+
+
+def _identity():
+    try:
+        return get_jwt_identity()
+    except RuntimeError:
+        # No JWT was verified for this request
+        return None
+
+
+def read_replica(fn):
+    """
+    Let a read-only view read from a replica. Place it below jwt_required /
+    admin_required so the caller is known and recent writers stay on the primary.
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        if has_replicas(current_app) and not replica_router.is_sticky(
+            _identity(), request.cookies.get(STICKY_COOKIE)
+        ):
+            current_app.extensions['sqlalchemy'].session.info[_USE_REPLICA] = True
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+@contextmanager
+def primary_reads(session=None):
+    """Send the reads inside the block to the primary, even in a @read_replica view."""
+    previous = session.info.pop(_USE_REPLICA, None) if session is not None else None
+    try:
+        yield
+    finally:
+        if previous:
+            session.info[_USE_REPLICA] = previous
+
+
+def init_replica_routing(app) -> None:
+    """Pin clients that wrote during a request to the primary for the sticky window."""
+    if not has_replicas(app):
+        return
+
+    @app.after_request
+    def remember_writes(response):
+        session = app.extensions['sqlalchemy'].session
+        if session.registry.has() and session.info.get(_WROTE):
+            user_id = _identity()
+            if user_id is not None:
+                replica_router.mark_write(user_id)
+            response.set_cookie(
+                STICKY_COOKIE,
+                str(int(time.time() + replica_router.sticky_seconds)),
+                max_age=int(replica_router.sticky_seconds),
+                httponly=True,
+                samesite='Lax',
+                secure=request.is_secure
+            )
+        return response
+
+
+replica_router = ReplicaRouter(
+    max_lag=float(os.getenv('DB_REPLICA_MAX_LAG', '5')),
+    check_interval=float(os.getenv('DB_REPLICA_CHECK_INTERVAL', '5')),
+    sticky_seconds=float(os.getenv('DB_REPLICA_STICKY_SECONDS', '10')),
+    check_timeout=float(os.getenv('DB_REPLICA_CHECK_TIMEOUT', '2'))
+)
@@ -0,0 +1,277 @@
+import os
+import re
+import sys
+import time
+import uuid
+import random
+import logging
+import tempfile
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional
+import orjson
+from flask import g, request
+from flask_jwt_extended import get_jwt, verify_jwt_in_request
+from services.query_tracker import request_queries
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Profile'
+_PROFILE_ID = re.compile(r'^[\w-]+$')
+# Deepest stack recorded; deeper frames (recursion) are cut at the root end
+MAX_STACK_DEPTH = 128
+
+
+class _Sampled:
+    """A request the sampler watches: `trigger` stays None until it is being profiled."""
+
+    __slots__ = ('thread_id', 'started', 'trigger', 'sampled_from', 'stacks')
+
+    def __init__(self, thread_id: int, started: float, trigger: Optional[str]):
+        self.thread_id = thread_id
+        self.started = started
+        self.trigger = trigger
+        self.sampled_from = started if trigger else None
+        self.stacks = Counter()
+
+
+def _stack(frame) -> str:
+    """The frame's call stack, root first, in the folded format flame graph tools read."""
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class RequestProfiler:
+    """
+    Opt-in sampling profiler for requests.
+
+    A request is profiled when an admin sends `X-Profile: 1`, when it is
+    picked at `sample_rate`, or once it has run longer than `slow_ms` (slow
+    requests are profiled from that point on). One background thread per
+    worker reads the stacks of the profiled request threads every
+    `interval` seconds; requests that are not profiled cost a dict insert
+    and a random() call.
+
+    Each profile stores the folded stack samples (flamegraph.pl, speedscope)
+    and the request's SQL timeline as a JSON file in `directory`, keeping
+    the newest `keep`. The directory is per host, shared by its workers.
+    """
+
+    def __init__(self, directory: str, sample_rate: float = 0.0, slow_ms: float = 0.0,
+                 interval: float = 0.005, keep: int = 200):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.slow = slow_ms / 1000 if slow_ms else None
+        self.interval = interval
+        self.keep = keep
+
+        self._watched: Dict[int, _Sampled] = {}
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def start(self, explicit: bool) -> None:
+        """Watch the current request; `explicit` profiles it from the start."""
+        if explicit:
+            trigger = 'header'
+        elif self.sample_rate and random.random() < self.sample_rate:
+            trigger = 'sampled'
+        elif self.slow is not None:
+            trigger = None
+        else:
+            return
+        entry = _Sampled(threading.get_ident(), time.perf_counter(), trigger)
+        g.profile_entry = entry
+        queries = request_queries()
+        if queries is not None:
+            queries.timeline = []
+        self._ensure_started()
+        self._watched[entry.thread_id] = entry
+        self._wakeup.set()
+
+    def finish(self, response) -> Optional[str]:
+        """Stop watching the current request and save its profile, if it was profiled. Returns the profile id."""
+        entry: Optional[_Sampled] = g.pop('profile_entry', None)
+        if entry is None:
+            return None
+        self._watched.pop(entry.thread_id, None)
+        if entry.trigger is None:
+            return None
+        try:
+            return self._save(entry, response)
+        except Exception as e:
+            logger.error(f"Could not save profile for {request.path}: {str(e)}")
+            return None
+
+    def discard(self) -> None:
+        """Stop watching the current request without saving; for requests that ended without a response."""
+        entry: Optional[_Sampled] = g.pop('profile_entry', None)
+        if entry is not None:
+            self._watched.pop(entry.thread_id, None)
+
+    def recent(self, limit: int = 50) -> List[Dict]:
+        """Summaries of the newest profiles, newest first."""
+        summaries = []
+        for name in self._files()[:limit]:
+            try:
+                with open(os.path.join(self.directory, name), 'rb') as profile_file:
+                    profile = orjson.loads(profile_file.read())
+            except (OSError, ValueError):
+                # Pruned by another worker, or still being written
+                continue
+            profile.pop('stacks', None)
+            profile['sql_statements'] = len(profile.pop('sql', []))
+            summaries.append(profile)
+        return summaries
+
+    def get(self, profile_id: str) -> Optional[Dict]:
+        if not _PROFILE_ID.match(profile_id):
+            return None
+        try:
+            with open(os.path.join(self.directory, f"{profile_id}.json"), 'rb') as profile_file:
+                return orjson.loads(profile_file.read())
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def folded(profile: Dict) -> str:
+        return ''.join(f"{stack} {count}\n" for stack, count in profile['stacks'].items())
+
+    def _save(self, entry: _Sampled, response) -> str:
+        finished = time.perf_counter()
+        profile_id = f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')}-{uuid.uuid4().hex[:8]}"
+        queries = request_queries()
+        timeline = queries.timeline if queries is not None and queries.timeline is not None else []
+        profile = {
+            'id': profile_id,
+            'created_at': datetime.utcnow().isoformat(),
+            'method': request.method,
+            'path': request.path,
+            'route': request.url_rule.rule if request.url_rule is not None else None,
+            'status': response.status_code,
+            'trigger': entry.trigger,
+            'pid': os.getpid(),
+            'duration_ms': round((finished - entry.started) * 1000, 2),
+            # Slow requests are only sampled once they pass the threshold
+            'sampled_from_ms': round((entry.sampled_from - entry.started) * 1000, 2),
+            'interval_ms': self.interval * 1000,
+            'samples': sum(entry.stacks.values()),
+            'stacks': dict(entry.stacks),
+            'sql': [
+                {
+                    'offset_ms': round((started - entry.started) * 1000, 2),
+                    'duration_ms': round(seconds * 1000, 2),
+                    'statement': statement
+                }
+                for started, seconds, statement in timeline
+            ]
+        }
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{profile_id}.json")
+        # Written under a temporary name so recent() never reads half a file
+        with open(f"{path}.tmp", 'wb') as profile_file:
+            profile_file.write(orjson.dumps(profile))
+        os.replace(f"{path}.tmp", path)
+        self._prune()
+        logger.info(f"Saved {entry.trigger} profile {profile_id} for {request.method} {request.path} "
+                    f"({profile['duration_ms']}ms, {profile['samples']} samples)")
+        return profile_id
+
+    def _files(self) -> List[str]:
+        try:
+            # Ids start with the UTC time, so names sort by age
+            return sorted((name for name in os.listdir(self.directory) if name.endswith('.json')), reverse=True)
+        except FileNotFoundError:
+            return []
+
+    def _prune(self) -> None:
+        for name in self._files()[self.keep:]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+    def _ensure_started(self) -> None:
+        # Threads do not survive fork, so each gunicorn worker starts its own sampler
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            if not self._watched:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+            time.sleep(self.interval)
+            now = time.perf_counter()
+            frames = sys._current_frames()
+            for entry in list(self._watched.values()):
+                if entry.trigger is None:
+                    if now - entry.started < self.slow:
+                        continue
+                    entry.trigger = 'slow'
+                    entry.sampled_from = now
+                frame = frames.get(entry.thread_id)
+                if frame is not None:
+                    entry.stacks[_stack(frame)] += 1
+
+
+def _is_admin() -> bool:
+    try:
+        verify_jwt_in_request(optional=True)
+        return get_jwt().get('user_type') == 'admin'
+    except Exception:
+        return False
+
+
+def init_profiler(app) -> None:
+    """
+    Profile requests when PROFILER_ENABLED is set; without it no hook is
+    installed. Needs init_query_tracking() first for the SQL timeline.
+
+    PROFILE_SAMPLE_RATE: share of requests profiled at random (default 0)
+    PROFILE_SLOW_MS: profile requests once they run this long (default 0, off)
+    PROFILE_INTERVAL_MS: time between stack samples (default 5)
+    PROFILE_DIR: where profiles are kept (default a temporary directory)
+    PROFILE_KEEP: how many profiles to keep (default 200)
+    """
+    if os.getenv('PROFILER_ENABLED', 'false').lower() != 'true':
+        return
+
+    @app.before_request
+    def start_profile():
+        # Only admins may ask; the token is not looked at unless the header is sent
+        explicit = request.headers.get(PROFILE_HEADER) == '1' and _is_admin()
+        request_profiler.start(explicit)
+
+    @app.after_request
+    def finish_profile(response):
+        profile_id = request_profiler.finish(response)
+        if profile_id and request.headers.get(PROFILE_HEADER) == '1':
+            response.headers['X-Profile-Id'] = profile_id
+        return response
+
+    @app.teardown_request
+    def discard_profile(exc):
+        request_profiler.discard()
+
+
+request_profiler = RequestProfiler(
+    os.getenv('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'fitnessapp-profiles')),
+    sample_rate=float(os.getenv('PROFILE_SAMPLE_RATE', '0')),
+    slow_ms=float(os.getenv('PROFILE_SLOW_MS', '0')),
+    interval=float(os.getenv('PROFILE_INTERVAL_MS', '5')) / 1000,
+    keep=int(os.getenv('PROFILE_KEEP', '200'))
+)
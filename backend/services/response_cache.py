@@ -0,0 +1,345 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional
+import orjson
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+from models.training_plan import TrainingPlan, PlanExercise
+from models.plan_overlay import PlanOverlay
+from models.meal_plan import MealPlan, Meal
+from models.user import User
+from services.replica_routing import primary_reads
+
+logger = logging.getLogger(__name__)
+
+CACHE_BACKENDS = ('local', 'redis', 'none')
+
+_PENDING_TAGS = 'response_cache_tags'
+
+
+class CacheBackend:
+    """Key-value store with expiry and counters, shared by the workers that use it."""
+
+    def get_many(self, keys: List[str]) -> List[Optional[object]]:
+        raise NotImplementedError
+
+    def set(self, key: str, value, ttl: float) -> None:
+        raise NotImplementedError
+
+    def incr(self, key: str) -> int:
+        raise NotImplementedError
+
+    def stats(self) -> Dict:
+        return {}
+
+
+class LocalBackend(CacheBackend):
+    """
+    In-process LRU with per-entry expiry. Used as the first-level cache in
+    front of a shared backend, and on its own as the stand-in for one in
+    development and tests. Values are stored as given; callers must not
+    mutate what they get back.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        # Counters are kept apart from the LRU: an evicted tag generation would
+        # restart at 0 and bring back entries stored under the old number
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        now = time.monotonic()
+        values = []
+        with self._lock:
+            for key in keys:
+                if key in self._counters:
+                    values.append(self._counters[key])
+                    continue
+                entry = self._entries.get(key)
+                if entry is None or (entry[0] is not None and entry[0] < now):
+                    values.append(None)
+                    continue
+                self._entries.move_to_end(key)
+                values.append(entry[1])
+        return values
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl if ttl else None, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'max_entries': self.max_entries, 'tags': len(self._counters)}
+
+
+class RedisBackend(CacheBackend):
+    """
+    Redis-backed store; values are kept as JSON, so cached payloads must be
+    JSON data. Tag generations are stored without expiry: give Redis a
+    volatile-* eviction policy so they are never evicted.
+    """
+
+    def __init__(self, url: str):
+        # redis is only needed when this backend is configured
+        import redis
+        self.client = redis.Redis.from_url(url, socket_timeout=0.25, socket_connect_timeout=0.25)
+
+    def get_many(self, keys):
+        return [orjson.loads(value) if value is not None else None for value in self.client.mget(keys)]
+
+    def set(self, key, value, ttl):
+        self.client.set(key, orjson.dumps(value), ex=max(1, int(ttl)))
+
+    def incr(self, key):
+        return self.client.incr(key)
+
+
+class ResponseCache:
+    """
+    Cache for computed read payloads, invalidated by tag.
+
+    Every entry is stored under its key plus the current generation of each
+    of its tags; invalidating a tag bumps its generation, so older entries
+    are never read again and simply age out. Generations live in the shared
+    backend, so an invalidation in one worker reaches all of them.
+
+    With a shared backend (Redis) a small in-process LRU sits in front of it.
+    That LRU is keyed by generation too, so it only saves the value fetch.
+    With the local backend alone, each worker has its own cache and only sees
+    its own invalidations; entries from other workers' writes are served
+    until they expire after `ttl` seconds. It is only for a single process,
+    and gunicorn.conf.py refuses it with more than one worker.
+    """
+
+    def __init__(self, shared: Optional[CacheBackend], local: Optional[LocalBackend] = None,
+                 ttl: float = 300.0, prefix: str = 'rc', retry_after: float = 30.0):
+        self.shared = shared
+        self.local = local
+        self.ttl = ttl
+        self.prefix = prefix
+        # After a backend error the cache is skipped for this long rather than timing out on every request
+        self.retry_after = retry_after
+        self._down_until = 0.0
+
+        self._counts = {'local_hits': 0, 'shared_hits': 0, 'misses': 0, 'bypassed': 0,
+                        'invalidations': 0, 'errors': 0}
+        self._counts_lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.shared is not None
+
+    def get_or_load(self, key: str, tags: Iterable[str], loader: Callable[[], object], session=None):
+        """
+        The cached value for `key`, or loader()'s result, which is cached
+        unless it is None. The loader always reads from the primary. Set
+        `session` to the request's session so a request that has written but
+        not yet committed neither reads nor fills the cache.
+        """
+        if not self.enabled or time.monotonic() < self._down_until or (
+            session is not None and session.info.get(_PENDING_TAGS)
+        ):
+            self._count('bypassed')
+            return loader()
+
+        try:
+            versioned_key = self._versioned_key(key, tags)
+            value = self._lookup(versioned_key)
+        except Exception as e:
+            self._backend_failed(f"Response cache unavailable, loading {key} directly: {str(e)}")
+            return loader()
+        if value is not None:
+            return value
+
+        self._count('misses')
+        with primary_reads(session):
+            # A lagging replica could otherwise fill the cache with data older than an invalidation
+            value = loader()
+        if value is not None:
+            self._store(versioned_key, value)
+        return value
+
+    def invalidate(self, tags: Iterable[str]) -> None:
+        if not self.enabled:
+            return
+        for tag in set(tags):
+            try:
+                self.shared.incr(self._tag_key(tag))
+                self._count('invalidations')
+            except Exception as e:
+                # The generation could not move; entries for this tag expire after ttl
+                self._backend_failed(f"Could not invalidate cache tag {tag}: {str(e)}")
+
+    def stats(self) -> Dict:
+        with self._counts_lock:
+            counts = dict(self._counts)
+        lookups = counts['local_hits'] + counts['shared_hits'] + counts['misses']
+        return {
+            'backend': type(self.shared).__name__ if self.shared else None,
+            'ttl': self.ttl,
+            **counts,
+            'hit_ratio': round((counts['local_hits'] + counts['shared_hits']) / lookups, 3) if lookups else None,
+            'local': self.local.stats() if self.local else None,
+            'shared': self.shared.stats() if self.shared else None
+        }
+
+    def _versioned_key(self, key: str, tags: Iterable[str]) -> str:
+        tags = sorted(set(tags))
+        generations = self.shared.get_many([self._tag_key(tag) for tag in tags]) if tags else []
+        return f"{self.prefix}:{key}|" + ','.join(str(generation or 0) for generation in generations)
+
+    def _lookup(self, versioned_key: str):
+        if self.local is not None:
+            value = self.local.get_many([versioned_key])[0]
+            if value is not None:
+                self._count('local_hits')
+                return value
+        value = self.shared.get_many([versioned_key])[0]
+        if value is not None:
+            self._count('shared_hits')
+            if self.local is not None:
+                self.local.set(versioned_key, value, self.ttl)
+        return value
+
+    def _store(self, versioned_key: str, value) -> None:
+        try:
+            self.shared.set(versioned_key, value, self.ttl)
+            if self.local is not None:
+                self.local.set(versioned_key, value, self.ttl)
+        except Exception as e:
+            self._backend_failed(f"Could not store {versioned_key} in the response cache: {str(e)}")
+
+    def _backend_failed(self, message: str) -> None:
+        logger.warning(message)
+        self._count('errors')
+        self._down_until = time.monotonic() + self.retry_after
+
+    def _tag_key(self, tag: str) -> str:
+        return f"{self.prefix}:tag:{tag}"
+
+    def _count(self, name: str) -> None:
+        with self._counts_lock:
+            self._counts[name] += 1
+
+
+def _tags_for(session, obj) -> List[str]:
+    """Cache tags touched by writing `obj`, from its current and previous foreign keys."""
+    def values(attribute):
+        history = inspect(obj).attrs[attribute].history
+        return [value for value in list(history.deleted) + [getattr(obj, attribute)] if value is not None]
+
+    def coach_of(parent_model, parent_ids):
+        parents = [session.get(parent_model, parent_id) for parent_id in parent_ids]
+        return [f'coach:{parent.coach_id}' for parent in parents if parent is not None]
+
+    if isinstance(obj, TrainingPlan):
+        return [f'plan:{value}' for value in values('plan_id')] + [f'coach:{value}' for value in values('coach_id')]
+    if isinstance(obj, PlanExercise):
+        plan_ids = values('plan_id')
+        return [f'plan:{value}' for value in plan_ids] + coach_of(TrainingPlan, plan_ids)
+    if isinstance(obj, MealPlan):
+        return [f'meal_plan:{value}' for value in values('id')] + [f'coach:{value}' for value in values('coach_id')]
+    if isinstance(obj, Meal):
+        meal_plan_ids = values('meal_plan_id')
+        return [f'meal_plan:{value}' for value in meal_plan_ids] + coach_of(MealPlan, meal_plan_ids)
+    if isinstance(obj, User) and (inspect(obj).attrs.first_name.history.has_changes() or
+                                  inspect(obj).attrs.last_name.history.has_changes()):
+        # Cached plans embed their coach's name
+        plan_ids = session.scalars(select(TrainingPlan.plan_id).where(TrainingPlan.coach_id == obj.user_id))
+        return [f'coach:{obj.user_id}'] + [f'plan:{plan_id}' for plan_id in plan_ids]
+    return []
+
+
+def overlay_tags(session, plan_ids: Iterable[int]) -> List[str]:
+    """Tags of the overlays of `plan_ids`, which show their template's exercises and go stale with it."""
+    plan_ids = list(plan_ids)
+    if not plan_ids:
+        return []
+    overlays = session.execute(
+        select(PlanOverlay.plan_id, TrainingPlan.coach_id)
+        .join(TrainingPlan, TrainingPlan.plan_id == PlanOverlay.plan_id)
+        .where(PlanOverlay.template_id.in_(plan_ids))
+    ).all()
+    return [f'plan:{plan_id}' for plan_id, _ in overlays] + [f'coach:{coach_id}' for _, coach_id in overlays]
+
+
+def invalidate_on_commit(session, tags: Iterable[str]) -> None:
+    """Invalidate `tags` once the session's transaction commits; for writes the flush hooks do not see."""
+    session.info.setdefault(_PENDING_TAGS, set()).update(tags)
+
+
+def _before_flush(session, flush_context, instances):
+    pending = session.info.setdefault(_PENDING_TAGS, set())
+    tags = set()
+    with session.no_autoflush:
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            if obj in session.dirty and not session.is_modified(obj, include_collections=False):
+                continue
+            tags.update(_tags_for(session, obj))
+        plan_ids = [int(tag.partition(':')[2]) for tag in tags if tag.startswith('plan:')]
+        tags.update(overlay_tags(session, plan_ids))
+    pending.update(tags)
+
+
+def _after_commit(session):
+    # Only after commit: an earlier invalidation could be refilled from the old rows
+    tags = session.info.pop(_PENDING_TAGS, None)
+    if tags:
+        response_cache.invalidate(tags)
+
+
+def _after_soft_rollback(session, previous_transaction):
+    session.info.pop(_PENDING_TAGS, None)
+
+
+def register_cache_hooks() -> None:
+    """
+    Invalidate cached plan payloads when plans, exercises, meal plans, meals
+    or coaches are written through the ORM; writing a template plan also
+    invalidates its overlays. Bulk query updates and deletes bypass the
+    hooks; callers that use them must call invalidate() or
+    invalidate_on_commit() themselves.
+    """
+    if not event.contains(Session, 'before_flush', _before_flush):
+        event.listen(Session, 'before_flush', _before_flush)
+        event.listen(Session, 'after_commit', _after_commit)
+        event.listen(Session, 'after_soft_rollback', _after_soft_rollback)
+
+
+def create_response_cache() -> ResponseCache:
+    """
+    Build the cache from the environment.
+
+    CACHE_BACKEND: none (default), redis, or local for a single process
+    CACHE_REDIS_URL: Redis URL for the redis backend
+    CACHE_TTL: seconds an entry lives (default 300)
+    CACHE_LOCAL_MAX_ENTRIES: size of the in-process LRU (default 1024)
+    """
+    backend = os.getenv('CACHE_BACKEND', 'none').lower()
+    if backend not in CACHE_BACKENDS:
+        raise ValueError(f"Unsupported CACHE_BACKEND: {backend}. Must be one of: {', '.join(CACHE_BACKENDS)}")
+    ttl = float(os.getenv('CACHE_TTL', '300'))
+    max_entries = int(os.getenv('CACHE_LOCAL_MAX_ENTRIES', '1024'))
+
+    if backend == 'none':
+        return ResponseCache(None, ttl=ttl)
+    if backend == 'redis':
+        return ResponseCache(RedisBackend(os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/0')),
+                             local=LocalBackend(max_entries), ttl=ttl)
+    return ResponseCache(LocalBackend(max_entries), ttl=ttl)
+
+
+response_cache = create_response_cache()
@@ -4,10 +4,11 @@ from sib_api_v3_sdk.rest import ApiException
 
 
 class EmailService:
-    def __init__(self):
-        self.api_instance = brevo_service.get_api_instance()
-        
-        
+    @property
+    def api_instance(self):
+        # Resolved per send so creating the service never touches Brevo
+        return brevo_service.get_api_instance()
+
 
     def send_email(self, to_email: str, subject: str, html_content: str, sender_name: str = "TrainSync - System") -> bool:
         """
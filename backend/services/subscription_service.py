@@ -1,16 +1,13 @@
 import os
 import logging
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+from database import db
+from services.email_outbox import EmailOutboxService
 
 logger = logging.getLogger(__name__)
 
 class SubscriptionService:
     def __init__(self, environment):
         self.environment = environment
-        self.sender_email = os.getenv('EMAIL_USER')
-        self.sender_password = os.getenv('EMAIL_PASSWORD')
         self.receiver_email = os.getenv('ADMIN_EMAIL')
 
     def process_subscription(self, name, email):
@@ -29,15 +26,10 @@ class SubscriptionService:
             return False, error_msg
 
     def _send_notification_email(self, name, email):
-        if not all([self.sender_email, self.sender_password, self.receiver_email]):
+        if not self.receiver_email:
             logger.error("Missing email configuration")
             return False, "Missing email configuration"
         
-        message = MIMEMultipart()
-        message["From"] = self.sender_email
-        message["To"] = self.receiver_email
-        message["Subject"] = f"New Subscription from Website ({self.environment})"
-        
         html = f"""
         <html>
             <body>
@@ -51,17 +43,21 @@ class SubscriptionService:
         </html>
         """
         
-        message.attach(MIMEText(html, "html"))
-        
         try:
-            logger.info(f"Attempting to send email to {self.receiver_email}")
-            server = smtplib.SMTP_SSL("smtp.gmail.com", 465)
-            server.login(self.sender_email, self.sender_password)
-            server.send_message(message)
-            server.quit()
-            logger.info("Email sent successfully")
-            return True, "Email sent successfully"
+            # Delivered by the email worker; the request only pays for an insert
+            EmailOutboxService(db.session).enqueue(
+                to_email=self.receiver_email,
+                subject=f"New Subscription from Website ({self.environment})",
+                html_content=html,
+                sender_name="TrainSync - Website",
+                reply_to_email=email,
+                reply_to_name=name
+            )
+            db.session.commit()
+            logger.info(f"Queued subscription notification for {self.receiver_email}")
+            return True, "Email queued successfully"
         except Exception as e:
-            error_msg = f"Error sending email: {str(e)}"
+            db.session.rollback()
+            error_msg = f"Error queueing email: {str(e)}"
             logger.error(error_msg)
-            return False, error_msg 
\ No newline at end of file
+            return False, error_msg
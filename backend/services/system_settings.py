@@ -0,0 +1,118 @@
+import os
+import time
+import logging
+import threading
+from dataclasses import dataclass, fields
+from datetime import datetime
+from typing import Optional
+from flask import jsonify, request
+from flask_jwt_extended import get_jwt, verify_jwt_in_request
+from sqlalchemy import select
+from database import db
+from models.settings import SystemSettings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class SettingsSnapshot:
+    """Read-only copy of the SystemSettings row; defaults match the model's when no row exists."""
+    site_name: str = 'FitnessApp'
+    site_description: Optional[str] = None
+    maintenance_mode: bool = False
+    allow_registrations: bool = True
+    max_users_per_trainer: int = 10
+    default_user_quota: int = 5
+    email_notifications: bool = True
+    auto_backup: bool = True
+    backup_frequency: str = 'daily'
+    analytics_enabled: bool = True
+    updated_at: Optional[datetime] = None
+
+    @classmethod
+    def from_row(cls, row: Optional[SystemSettings]) -> 'SettingsSnapshot':
+        if row is None:
+            return cls()
+        values = {field.name: getattr(row, field.name) for field in fields(cls)}
+        # Columns left NULL fall back to the defaults above
+        return cls(**{name: value for name, value in values.items() if value is not None})
+
+
+class SystemSettingsCache:
+    """
+    Process-local snapshot of the system settings for hot paths.
+
+    Reads cost nothing until the snapshot is `ttl` seconds old; then one
+    request re-reads updated_at (and the row only if it moved) while the
+    others keep using the current snapshot. invalidate() applies a change
+    immediately in this worker; every other worker sees it within `ttl`.
+    """
+
+    def __init__(self, ttl: float = 5.0):
+        self.ttl = ttl
+        self._snapshot: Optional[SettingsSnapshot] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self) -> SettingsSnapshot:
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._checked_at < self.ttl:
+            return snapshot
+        if not self._lock.acquire(blocking=snapshot is None):
+            # Another thread is refreshing; the current snapshot is at most a poll old
+            return snapshot
+        try:
+            return self._refresh()
+        finally:
+            self._lock.release()
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._snapshot = None
+
+    def _refresh(self) -> SettingsSnapshot:
+        try:
+            updated_at = db.session.execute(
+                select(SystemSettings.updated_at).order_by(SystemSettings.setting_id).limit(1)
+            ).scalar()
+            if self._snapshot is None or updated_at != self._snapshot.updated_at:
+                row = db.session.execute(
+                    select(SystemSettings).order_by(SystemSettings.setting_id).limit(1)
+                ).scalar()
+                self._snapshot = SettingsSnapshot.from_row(row)
+                logger.info(f"Loaded system settings (updated {updated_at})")
+        except Exception as e:
+            if self._snapshot is None:
+                raise
+            # Keep serving the last known settings; try again after ttl
+            logger.error(f"Could not refresh system settings: {str(e)}")
+        self._checked_at = time.monotonic()
+        return self._snapshot
+
+
+# Reachable while maintenance mode is on: health checks, metrics, logging in, and anything an admin does
+MAINTENANCE_EXEMPT_PATHS = ('/health', '/metrics', '/api/auth/login')
+
+
+def init_maintenance_mode(app) -> None:
+    """Answer 503 to everyone but admins while maintenance_mode is set."""
+
+    @app.before_request
+    def reject_during_maintenance():
+        if request.method == 'OPTIONS' or request.path in MAINTENANCE_EXEMPT_PATHS:
+            return None
+        if not system_settings.get().maintenance_mode:
+            return None
+        try:
+            verify_jwt_in_request(optional=True)
+            if get_jwt().get('user_type') == 'admin':
+                return None
+        except Exception:
+            # An invalid token gets the maintenance response like no token at all
+            pass
+        response = jsonify({'error': 'The service is down for maintenance', 'maintenance': True})
+        response.headers['Retry-After'] = '300'
+        return response, 503
+
+
+system_settings = SystemSettingsCache(ttl=float(os.getenv('SETTINGS_CACHE_TTL', '5')))
@@ -0,0 +1,139 @@
+"""
+Tests for the exercise grid diff: which rows keep their ids (and so their
+clients' progress history), and the fixed statement count of a grid PUT.
+
+Run from backend/: python -m pytest services/test_plan_diff.py
+"""
+import os
+import tempfile
+from types import SimpleNamespace
+import pytest
+from services.plan_diff import EXERCISE_FIELDS, diff_exercises, normalize_rows
+
+
+def _day(*names):
+    """Stand-ins for the exercises of week 1 day 1, in order, with ids 1, 2, 3...; the diff only reads attributes."""
+    return [
+        SimpleNamespace(**{**dict.fromkeys(EXERCISE_FIELDS), 'exercise_id': index + 1, 'plan_id': 1, 'name': name,
+                           'week_number': 1, 'day_number': 1, 'order_in_day': index})
+        for index, name in enumerate(names)
+    ]
+
+
+def _rows(*names, **extra):
+    return normalize_rows([
+        {'name': name, 'week_number': 1, 'day_number': 1, 'order_in_day': index, **extra}
+        for index, name in enumerate(names)
+    ])
+
+
+def test_unchanged_grid_writes_nothing():
+    diff = diff_exercises(_day('squat', 'bench', 'row'), _rows('squat', 'bench', 'row'))
+    assert diff.empty
+    assert diff.unchanged == 3
+
+
+def test_insert_at_top_of_day_keeps_ids_of_shifted_exercises():
+    diff = diff_exercises(_day('squat', 'bench', 'row'), _rows('warmup', 'squat', 'bench', 'row'))
+    assert [row['name'] for row in diff.inserts] == ['warmup']
+    assert diff.changed_fields == {1: ['order_in_day'], 2: ['order_in_day'], 3: ['order_in_day']}
+    assert diff.deletes == []
+
+
+def test_move_within_day_keeps_ids():
+    diff = diff_exercises(_day('squat', 'bench', 'row'), _rows('row', 'bench', 'squat'))
+    assert diff.inserts == []
+    assert diff.changed_fields == {3: ['order_in_day'], 1: ['order_in_day']}
+    assert diff.unchanged == 1
+
+
+def test_edit_in_place_keeps_id():
+    diff = diff_exercises(_day('squat', 'bench', 'row'), _rows('squat', 'press', 'row'))
+    assert diff.inserts == [] and diff.deletes == []
+    assert diff.changed_fields == {2: ['name']}
+
+
+def test_delete():
+    diff = diff_exercises(_day('squat', 'bench', 'row'), _rows('squat', 'bench'))
+    assert diff.deletes == [3]
+    assert diff.unchanged == 2
+
+
+def test_rows_matched_by_id_before_content():
+    # Exercise 3 is renamed into exercise 1's old slot; 1 must not be claimed by the name/slot passes
+    rows = normalize_rows([
+        {'exercise_id': 3, 'name': 'squat', 'week_number': 1, 'day_number': 1, 'order_in_day': 0},
+        {'name': 'bench', 'week_number': 1, 'day_number': 1, 'order_in_day': 1},
+    ])
+    diff = diff_exercises(_day('squat', 'bench', 'row'), rows)
+    assert diff.changed_fields == {3: ['name', 'order_in_day']}
+    assert diff.deletes == [1]
+
+
+def test_unknown_exercise_id_is_rejected():
+    rows = normalize_rows([{'exercise_id': 99, 'name': 'squat', 'week_number': 1, 'day_number': 1, 'order_in_day': 0}])
+    with pytest.raises(ValueError, match=r'\[99\]'):
+        diff_exercises(_day('squat'), rows)
+
+
+def test_duplicate_exercise_id_is_rejected():
+    with pytest.raises(ValueError, match='repeated exercise_id'):
+        normalize_rows([
+            {'exercise_id': 1, 'name': 'squat', 'week_number': 1, 'day_number': 1, 'order_in_day': 0},
+            {'exercise_id': 1, 'name': 'bench', 'week_number': 1, 'day_number': 1, 'order_in_day': 1},
+        ])
+
+
+def test_duplicate_slot_is_rejected():
+    with pytest.raises(ValueError, match='Two exercises'):
+        normalize_rows([
+            {'name': 'squat', 'week_number': 1, 'day_number': 1, 'order_in_day': 0},
+            {'name': 'bench', 'week_number': 1, 'day_number': 1, 'order_in_day': 0},
+        ])
+
+
+@pytest.fixture(scope='module')
+def grid():
+    """A coach's plan with three exercises, a test client and the coach's auth headers."""
+    os.environ.setdefault('SQLITE_PATH', f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}")
+    os.environ.setdefault('CACHE_BACKEND', 'none')
+    import server
+    from flask_jwt_extended import create_access_token
+    from database import db, create_schema
+    from models.user import User
+    from models.training_plan import TrainingPlan, PlanExercise
+    from services.token_versions import token_versions, build_token_claims
+
+    app = server.flask_app
+    create_schema(app)
+    with app.app_context():
+        coach = User(email='grid-coach@example.com', first_name='Grid', last_name='Coach',
+                     user_type='coach', password_hash='x')
+        db.session.add(coach)
+        db.session.flush()
+        plan = TrainingPlan(coach_id=coach.user_id, title='Grid')
+        db.session.add(plan)
+        db.session.flush()
+        db.session.add_all([
+            PlanExercise(plan_id=plan.plan_id, name=name, week_number=1, day_number=1, order_in_day=index)
+            for index, name in enumerate(('squat', 'bench', 'row'))
+        ])
+        db.session.commit()
+        token = create_access_token(identity=coach.user_id,
+                                    additional_claims=build_token_claims(coach, token_versions.get(coach.user_id)))
+        url = f'/api/training-plans/{plan.plan_id}/exercises'
+    return app.test_client(), url, {'Authorization': f'Bearer {token}'}
+
+
+def test_grid_put_runs_a_fixed_number_of_statements(grid):
+    from services.query_tracker import query_budget
+    client, url, headers = grid
+    current = client.get(url, headers=headers).json
+    rows = [dict(exercise, sets='5') for exercise in current['exercises'][1:]]
+    rows += [{'name': f'new {index}', 'week_number': 2, 'day_number': 1, 'order_in_day': index} for index in range(50)]
+
+    # Loading, one statement per kind of write, and the response; not one per exercise
+    with query_budget(12, max_repeats=2):
+        response = client.put(url, json={'exercises': rows, 'version': current['version']}, headers=headers)
+    assert response.status_code == 200
+    assert (response.json['created'], response.json['updated'], response.json['deleted']) == (50, 2, 1)
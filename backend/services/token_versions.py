@@ -0,0 +1,97 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict
+from sqlalchemy import select, update, insert
+from sqlalchemy.exc import IntegrityError
+from database import db
+from models.user import UserTokenVersion
+
+
+def build_token_claims(user, version: int) -> Dict:
+    """
+    Signed claims embedded in a user's access token so role checks do not
+    need to load the User row on every request.
+
+    Args:
+        user (User): The user the token is issued for
+        version (int): The user's current token version
+
+    Returns:
+        Dict: Additional claims for create_access_token
+    """
+    return {
+        'user_type': user.user_type,
+        'coach_profile_id': user.coach_profile.profile_id if user.coach_profile else None,
+        'is_active': user.is_active,
+        'ver': version
+    }
+
+
+class TokenVersionCache:
+    """
+    Small process-local LRU of user_id -> token version.
+
+    A token is accepted only while its 'ver' claim matches the user's stored
+    version. bump() changes the version in the database and in this worker's
+    cache, so the change applies immediately here and within `ttl` seconds
+    in every other worker.
+    """
+
+    def __init__(self, ttl: float = 10.0, max_entries: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> int:
+        user_id = int(user_id)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and entry[1] > now:
+                self._entries.move_to_end(user_id)
+                return entry[0]
+
+        version = db.session.execute(
+            select(UserTokenVersion.version).where(UserTokenVersion.user_id == user_id)
+        ).scalar() or 0
+        self._store(user_id, version)
+        return version
+
+    def bump(self, user_id: int) -> int:
+        """Increment and commit the user's token version, revoking older tokens."""
+        user_id = int(user_id)
+        result = db.session.execute(
+            update(UserTokenVersion)
+            .where(UserTokenVersion.user_id == user_id)
+            .values(version=UserTokenVersion.version + 1)
+        )
+        if result.rowcount == 0:
+            try:
+                db.session.execute(insert(UserTokenVersion).values(user_id=user_id, version=1))
+            except IntegrityError:
+                # Another worker created the row first
+                db.session.rollback()
+                return self.bump(user_id)
+        db.session.commit()
+
+        version = db.session.execute(
+            select(UserTokenVersion.version).where(UserTokenVersion.user_id == user_id)
+        ).scalar()
+        self._store(user_id, version)
+        return version
+
+    def _store(self, user_id: int, version: int) -> None:
+        with self._lock:
+            self._entries[user_id] = (version, time.monotonic() + self.ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+token_versions = TokenVersionCache(
+    ttl=float(os.getenv('TOKEN_VERSION_TTL', '10')),
+    max_entries=int(os.getenv('TOKEN_VERSION_CACHE_SIZE', '10000'))
+)
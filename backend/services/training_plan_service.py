@@ -1,8 +1,12 @@
-from sqlalchemy import func, desc
+from sqlalchemy import desc
 from sqlalchemy.orm import Session
-from typing import List, Dict
-from models.training_plan import TrainingPlan, PlanExercise, UserTrainingPlan
-from models.progress_tracking import ProgressTracking
+from typing import List, Dict, Tuple
+from models.training_plan import TrainingPlan, PlanExercise
+from models.user import UserTrainingPlan
+from services.plan_analytics import PlanAnalyticsEngine
+from services.plan_diff import ExerciseDiff, PlanDiffService, normalize_rows
+from services.plan_overlay import PlanOverlayService
+from services.response_cache import response_cache, overlay_tags
 
 class TrainingPlanService:
     def __init__(self, db: Session):
@@ -54,128 +58,66 @@ class TrainingPlanService:
 
         return query.order_by(desc(TrainingPlan.created_at)).all()
 
-    def clone_training_plan(self, plan_id: int, new_title: str) -> TrainingPlan:
+    def clone_training_plan(self, plan_id: int, new_title: str, overlay: bool = False) -> TrainingPlan:
+        """
+        Clone a plan. A full copy copies its exercises with one INSERT ... SELECT;
+        an overlay references them and stores only the exercises later changed
+        in it (see PlanOverlayService), so it costs the same for any plan size.
+        """
         original_plan = self.db.query(TrainingPlan).filter(TrainingPlan.plan_id == plan_id).first()
         if not original_plan:
             raise ValueError("Original plan not found")
 
-        # Clone the plan
-        new_plan = TrainingPlan(
-            coach_id=original_plan.coach_id,
-            title=new_title,
-            description=original_plan.description,
-            difficulty_level=original_plan.difficulty_level,
-            duration_weeks=original_plan.duration_weeks
-        )
-        self.db.add(new_plan)
-        self.db.flush()  # Get the new plan_id
-
-        # Clone exercises
-        for exercise in original_plan.exercises:
-            new_exercise = PlanExercise(
-                plan_id=new_plan.plan_id,
-                name=exercise.name,
-                description=exercise.description,
-                sets=exercise.sets,
-                reps=exercise.reps,
-                duration_minutes=exercise.duration_minutes,
-                day_number=exercise.day_number,
-                week_number=exercise.week_number,
-                order_in_day=exercise.order_in_day,
-                video_url=exercise.video_url,
-                image_url=exercise.image_url
-            )
-            self.db.add(new_exercise)
-
-        self.db.commit()
-        return new_plan
+        return PlanOverlayService(self.db).clone(original_plan, new_title, overlay=overlay)
 
     def get_plan_analytics(self, plan_id: int) -> Dict:
-        plan = self.db.query(TrainingPlan).filter(TrainingPlan.plan_id == plan_id).first()
-        if not plan:
-            raise ValueError("Plan not found")
-
-        # Get total assignments and active users
-        assignments = self.db.query(UserTrainingPlan).filter(
-            UserTrainingPlan.plan_id == plan_id
-        ).all()
-        
-        total_users = len(assignments)
-        active_users = len([a for a in assignments if a.status == 'in_progress'])
-        completed_users = len([a for a in assignments if a.status == 'completed'])
-
-        # Calculate average completion rate
-        avg_progress = self.db.query(func.avg(UserTrainingPlan.progress))\
-            .filter(UserTrainingPlan.plan_id == plan_id)\
-            .scalar() or 0
-
-        # Get exercise completion statistics
-        exercise_stats = self.db.query(
-            ProgressTracking.exercise_id,
-            func.avg(ProgressTracking.rating).label('avg_rating'),
-            func.count(ProgressTracking.tracking_id).label('completion_count')
-        ).join(PlanExercise)\
-         .filter(PlanExercise.plan_id == plan_id)\
-         .group_by(ProgressTracking.exercise_id)\
-         .all()
-
-        return {
-            'total_users': total_users,
-            'active_users': active_users,
-            'completed_users': completed_users,
-            'average_progress': float(avg_progress),
-            'completion_rate': (completed_users / total_users * 100) if total_users > 0 else 0,
-            'exercise_stats': [
-                {
-                    'exercise_id': stat.exercise_id,
-                    'avg_rating': float(stat.avg_rating or 0),
-                    'completion_count': stat.completion_count
-                }
-                for stat in exercise_stats
-            ]
-        }
-
-    def update_training_plan(self, plan_id: int, plan_data: dict) -> TrainingPlan:
-        plan = self.db.query(TrainingPlan).filter(TrainingPlan.plan_id == plan_id).first()
+        return PlanAnalyticsEngine(self.db).get_plan_analytics(plan_id)
+
+    def update_training_plan(self, plan_id: int, plan_data: dict) -> Tuple[TrainingPlan, Dict]:
+        """
+        Update a plan's details and, when `exercises` is given, make them the
+        plan's exercises. The exercises are diffed against the stored ones, so
+        only changed rows are written, and exercises that are kept keep their
+        ids and their clients' progress history.
+
+        Returns:
+            Tuple[TrainingPlan, Dict]: The plan, and what changed: the plan fields,
+            and the exercises created, updated (with their changed fields) and deleted
+
+        Raises:
+            ValueError: When the plan does not exist or the exercises are invalid
+        """
+        plan = self.db.query(TrainingPlan).filter(TrainingPlan.plan_id == plan_id).with_for_update().first()
         if not plan:
             raise ValueError("Plan not found")
 
         # Update plan details
+        changed_fields = []
         for key, value in plan_data.items():
-            if key != 'exercises' and hasattr(plan, key):
+            if key != 'exercises' and hasattr(plan, key) and getattr(plan, key) != value:
                 setattr(plan, key, value)
+                changed_fields.append(key)
 
-        # Update exercises if provided
+        diff = ExerciseDiff()
         if 'exercises' in plan_data:
-            # Remove existing exercises
-            self.db.query(PlanExercise).filter(PlanExercise.plan_id == plan_id).delete()
-            
-            # Add new exercises
-            for exercise_data in plan_data['exercises']:
-                exercise = PlanExercise(
-                    plan_id=plan_id,
-                    name=exercise_data['name'],
-                    description=exercise_data.get('description'),
-                    sets=exercise_data.get('sets'),
-                    reps=exercise_data.get('reps'),
-                    duration_minutes=exercise_data.get('duration_minutes'),
-                    day_number=exercise_data['day_number'],
-                    week_number=exercise_data['week_number'],
-                    order_in_day=exercise_data['order_in_day'],
-                    video_url=exercise_data.get('video_url'),
-                    image_url=exercise_data.get('image_url')
-                )
-                self.db.add(exercise)
+            plan_diff = PlanDiffService(self.db)
+            _, diff = plan_diff.diff(plan_id, normalize_rows(plan_data['exercises']))
+            if not diff.empty:
+                plan_diff.apply(plan_id, diff)
 
         self.db.commit()
+        if not diff.empty:
+            # The exercise writes are bulk statements, which the cache hooks do not see
+            response_cache.invalidate([f'plan:{plan_id}', f'coach:{plan.coach_id}'] + overlay_tags(self.db, [plan_id]))
         self.db.refresh(plan)
-        return plan
+        return plan, {'fields': changed_fields, 'exercises': diff.report()}
 
     def delete_training_plan(self, plan_id: int) -> bool:
         plan = self.db.query(TrainingPlan).filter(TrainingPlan.plan_id == plan_id).first()
         if not plan:
             raise ValueError("Plan not found")
 
+        PlanOverlayService(self.db).release(plan_id)
         self.db.delete(plan)
         self.db.commit()
         return True 
\ No newline at end of file
@@ -0,0 +1,74 @@
+"""
+Serving layer for the Flask app: worker and thread sizing shared by
+gunicorn.conf.py and asgi.py.
+
+Two modes, picked with SERVE_MODE:
+  wsgi  gunicorn gthread workers calling server:flask_app directly (default)
+  asgi  uvicorn workers running asgi:app, which bridges each request onto a
+        bounded thread pool
+
+Each request thread holds at most one database connection, so the thread
+count per worker defaults to what the SQLAlchemy pool can hand out
+(DB_POOL_SIZE + DB_MAX_OVERFLOW). More threads would only queue on the pool
+and time out; fewer would leave connections idle.
+"""
+import os
+from uvicorn.workers import UvicornWorker
+
+SERVE_MODES = ('wsgi', 'asgi')
+
+
+def serve_mode() -> str:
+    mode = os.getenv('SERVE_MODE', 'wsgi').lower()
+    if mode not in SERVE_MODES:
+        raise ValueError(f"Unsupported SERVE_MODE: {mode}. Must be one of: {', '.join(SERVE_MODES)}")
+    return mode
+
+
+def db_pool_capacity() -> int:
+    """Connections one worker's SQLAlchemy pool can open (SQLAlchemy's defaults are 5 + 10)."""
+    return int(os.getenv('DB_POOL_SIZE', '5')) + int(os.getenv('DB_MAX_OVERFLOW', '10'))
+
+
+def worker_count() -> int:
+    """
+    Processes to run. Python threads share one core per process, so the
+    default is one worker per core and at least two, so a worker being
+    recycled does not stop the service. DB_MAX_CONNECTIONS is applied last:
+    when the database cannot serve every worker's full pool the count is
+    lowered to what it can, down to a single worker.
+    """
+    if os.getenv('WORKERS'):
+        return int(os.getenv('WORKERS'))
+    workers = max(2, os.cpu_count() or 1)
+    max_connections = int(os.getenv('DB_MAX_CONNECTIONS', '0'))
+    if max_connections:
+        workers = min(workers, max(1, max_connections // db_pool_capacity()))
+    return workers
+
+
+def thread_count() -> int:
+    """Request threads per worker, in either mode."""
+    return int(os.getenv('THREADS', str(db_pool_capacity())))
+
+
+def concurrency_limit() -> int:
+    """
+    Connections a uvicorn worker accepts at once before answering 503.
+    Requests beyond the thread pool wait in the event loop, so allow a
+    short queue rather than unbounded buffering.
+    """
+    return int(os.getenv('ASGI_LIMIT_CONCURRENCY', str(thread_count() * 4)))
+
+
+class BridgeUvicornWorker(UvicornWorker):
+    """
+    gunicorn worker class for the asgi mode: uvicorn with lifespan off (the
+    WSGI app has no startup hooks) and a bounded number of open connections.
+    """
+    CONFIG_KWARGS = {
+        'loop': 'auto',
+        'http': 'auto',
+        'lifespan': 'off',
+        'limit_concurrency': concurrency_limit()
+    }
@@ -32,6 +32,8 @@ const Audit = () => {
     const [page, setPage] = useState(0);
     const [rowsPerPage, setRowsPerPage] = useState(10);
     const [totalCount, setTotalCount] = useState(0);
+    // cursors[n] is the keyset cursor that fetches page n; page 0 needs none
+    const [cursors, setCursors] = useState([null]);
     const [orderBy, setOrderBy] = useState('created_at');
     const [order, setOrder] = useState('desc');
     const [filters, setFilters] = useState({
@@ -49,12 +51,16 @@ const Audit = () => {
             const token = localStorage.getItem('token');
 
             const params = {
-                page: page + 1,
                 per_page: rowsPerPage,
                 sort_by: orderBy,
                 sort_order: order,
+                // Only the first page needs a total; later pages skip the COUNT
+                count: page === 0 ? 'exact' : 'none',
                 ...filters
             };
+            if (cursors[page]) {
+                params.cursor = cursors[page];
+            }
 
 
             // Remove 'Bearer ' prefix if it exists in the token
@@ -67,7 +73,14 @@ const Audit = () => {
                 params: params
             });
             setLogs(response.data.logs);
-            setTotalCount(response.data.total);
+            if (response.data.total !== null) {
+                setTotalCount(response.data.total);
+            }
+            setCursors(prev => {
+                const next = prev.slice(0, page + 1);
+                next[page + 1] = response.data.next_cursor;
+                return next;
+            });
             setError(null);
         } catch (error) {
             console.error('Error fetching audit logs:', error);
@@ -103,6 +116,7 @@ const Audit = () => {
 
     const handleChangeRowsPerPage = (event) => {
         setRowsPerPage(parseInt(event.target.value, 10));
+        setCursors([null]);
         setPage(0);
     };
 
@@ -116,6 +130,8 @@ const Audit = () => {
         const isAsc = orderBy === property && order === 'asc';
         setOrder(isAsc ? 'desc' : 'asc');
         setOrderBy(property);
+        setCursors([null]);
+        setPage(0);
     };
 
     const handleFilterChange = (event) => {
@@ -124,6 +140,7 @@ const Audit = () => {
             ...prev,
             [name]: value
         }));
+        setCursors([null]);
         setPage(0);
     };
 